@@ -0,0 +1,449 @@
+from collections import Counter
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from math import sqrt
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from dpdd.sketches import HyperLogLog, KLLSketch, SpaceSaving, top_k_items
+
+SECTIONS = ("numeric", "string", "datetime", "bool", "coercion")
+
+
+def _py_scalar(x: Any) -> Any:
+    # numpy-скаляры -> встроенные типы, иначе json.dumps падает на int64
+    return x.item() if hasattr(x, "item") else x
+
+
+def _percentile_key(p: float) -> str:
+    return f"p{p:g}"
+
+
+def _to_iso(dt: datetime) -> str:
+    return (dt
+            .astimezone(UTC)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", "Z")
+            )
+
+
+class NumericAcc:
+    """Sum, sum of squares, min/max and a quantile sketch of a numeric column.
+
+    With k=None only min/max are kept - state built from parquet footer
+    statistics. Merging such a state into a full one drops the moments
+    and the sketch, since they no longer describe all rows.
+    """
+
+    __slots__ = ("max", "min", "s", "s2", "sketch")
+
+    def __init__(self, k: int | None = 200) -> None:
+        # s, s2 и sketch либо все заданы, либо все None (состояние из футера)
+        self.s: float | None = 0.0 if k else None
+        self.s2: float | None = 0.0 if k else None
+        self.min: Any = float("inf")
+        self.max: Any = float("-inf")
+        self.sketch: KLLSketch | None = KLLSketch(k) if k else None
+
+    def blank(self) -> "NumericAcc":
+        return NumericAcc(self.sketch.k if self.sketch is not None else None)
+
+    def update(self, values: npt.NDArray[np.float64]) -> None:
+        if len(values) == 0:
+            return
+        if self.s is None or self.s2 is None or self.sketch is None:
+            raise ValueError("footer-only numeric state does not take rows")
+        self.s += float(values.sum())
+        self.s2 += float((values ** 2).sum())
+        # + 0: -0.0 -> 0.0, как в футере parquet и в hash_array
+        self.min = min(self.min, values.min() + 0)
+        self.max = max(self.max, values.max() + 0)
+        self.sketch.update(values)
+
+    def merge(self, other: "NumericAcc") -> None:
+        if other.s is None or other.s2 is None or other.sketch is None:
+            # моменты и квантили уже не описывают все строки
+            self.s = self.s2 = None
+            self.sketch = None
+        elif self.s is not None and self.s2 is not None and self.sketch is not None:
+            self.s += other.s
+            self.s2 += other.s2
+            self.sketch.merge(other.sketch)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def finalize(self, non_null: int, percentiles: tuple[float, ...]) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        if self.s is not None and self.s2 is not None:
+            mean = std = None
+            if non_null > 0:
+                mean = self.s / non_null
+                std = sqrt(max(self.s2 / non_null - mean**2, 0.0))
+            out["mean"] = mean
+            out["std"] = std
+        if non_null > 0:
+            out["min"] = _py_scalar(self.min)
+            out["max"] = _py_scalar(self.max)
+        else:
+            out["min"] = out["max"] = None
+        if self.sketch is not None:
+            qs = self.sketch.quantiles([p / 100 for p in percentiles])
+            for p, q in zip(percentiles, qs):
+                out[_percentile_key(p)] = q
+        return out
+
+
+class StringAcc:
+    """Length stats and frequent values of a string column.
+
+    Frequent values go to a SpaceSaving summary of `capacity` counters,
+    or to an exact Counter when `exact` is set.
+    """
+
+    __slots__ = ("counter", "max_len", "min_len", "sum_len")
+
+    def __init__(self, capacity: int = 1024, exact: bool = False) -> None:
+        self.sum_len = 0
+        self.min_len: Any = float("inf")
+        self.max_len: Any = float("-inf")
+        self.counter: Counter[Any] | SpaceSaving = Counter() if exact else SpaceSaving(capacity)
+
+    def blank(self) -> "StringAcc":
+        if isinstance(self.counter, Counter):
+            return StringAcc(exact=True)
+        return StringAcc(self.counter.capacity)
+
+    def update(self, counts: pd.Series, lengths: npt.NDArray[np.integer[Any]]) -> None:
+        # counts - value_counts чанка по убыванию, lengths - длины всех значений
+        if len(lengths) == 0:
+            return
+        self.sum_len += lengths.sum()
+        self.min_len = min(self.min_len, lengths.min())
+        self.max_len = max(self.max_len, lengths.max())
+        if isinstance(self.counter, Counter):
+            self.counter.update(counts.to_dict())
+        else:
+            self.counter.update(counts)
+
+    def update_distinct(self, counts: pd.Series, lengths: npt.NDArray[np.integer[Any]]) -> None:
+        # lengths - длины самих различных значений из counts, по одной на значение
+        if len(lengths) == 0:
+            return
+        self.sum_len += int(lengths @ counts.to_numpy())
+        self.min_len = min(self.min_len, lengths.min())
+        self.max_len = max(self.max_len, lengths.max())
+        if isinstance(self.counter, Counter):
+            self.counter.update(counts.to_dict())
+        else:
+            self.counter.update(counts)
+
+    def merge(self, other: "StringAcc") -> None:
+        self.sum_len += other.sum_len
+        self.min_len = min(self.min_len, other.min_len)
+        self.max_len = max(self.max_len, other.max_len)
+        # точный и приближённый счётчики не смешиваются: одни настройки на прогон
+        if isinstance(self.counter, Counter):
+            assert isinstance(other.counter, Counter)
+            self.counter.update(other.counter)
+        else:
+            assert isinstance(other.counter, SpaceSaving)
+            self.counter.merge(other.counter)
+
+    def finalize(self, non_null: int, k: int) -> dict[str, Any]:
+        out: dict[str, Any] = {"avg_len": None, "min_len": None, "max_len": None}
+        if non_null > 0:
+            out["avg_len"] = self.sum_len / non_null
+            out["min_len"] = _py_scalar(self.min_len)
+            out["max_len"] = _py_scalar(self.max_len)
+        if isinstance(self.counter, Counter):
+            top_k = top_k_items(self.counter.items(), k)
+        else:
+            top_k = self.counter.most_common(k)
+            out["top_k_max_error"] = self.counter.max_error(k)
+        out["top_k"] = top_k or None
+        return out
+
+
+class DatetimeAcc:
+    """UTC min/max of a datetime column, the string format detected for it
+    and the number of rows that did not match the format."""
+
+    __slots__ = ("fallback", "fmt", "max_dt", "min_dt")
+
+    def __init__(self, fmt: str | None = None) -> None:
+        self.min_dt = datetime.max.replace(tzinfo=UTC)
+        self.max_dt = datetime.min.replace(tzinfo=UTC)
+        self.fmt = fmt
+        self.fallback = 0
+
+    def blank(self) -> "DatetimeAcc":
+        return DatetimeAcc(self.fmt)
+
+    def update(self, lo: datetime | None, hi: datetime | None) -> None:
+        if lo is None or hi is None or pd.isna(lo):
+            return
+        self.min_dt = min(self.min_dt, lo)
+        self.max_dt = max(self.max_dt, hi)
+
+    def merge(self, other: "DatetimeAcc") -> None:
+        self.min_dt = min(self.min_dt, other.min_dt)
+        self.max_dt = max(self.max_dt, other.max_dt)
+        self.fmt = self.fmt or other.fmt
+        self.fallback += other.fallback
+
+    def finalize(self) -> dict[str, Any]:
+        return {"min": _to_iso(self.min_dt), "max": _to_iso(self.max_dt), "fallback_rows": self.fallback}
+
+
+class BoolAcc:
+    """True/false counts of a boolean column."""
+
+    __slots__ = ("false_count", "true_count")
+
+    def __init__(self) -> None:
+        self.true_count = 0
+        self.false_count = 0
+
+    def blank(self) -> "BoolAcc":
+        return BoolAcc()
+
+    def update(self, true_count: int, n: int) -> None:
+        self.true_count += true_count
+        self.false_count += n - true_count
+
+    def merge(self, other: "BoolAcc") -> None:
+        self.true_count += other.true_count
+        self.false_count += other.false_count
+
+    def finalize(self, non_null: int) -> dict[str, Any]:
+        return {"true_count": self.true_count,
+                "false_count": self.false_count,
+                "true_rate": self.true_count / non_null if non_null > 0 else None}
+
+
+class CoercionAcc:
+    """How many values of a string-encoded numeric column failed to parse."""
+
+    __slots__ = ("coerced_nulls", "total")
+
+    def __init__(self) -> None:
+        self.coerced_nulls = 0
+        self.total = 0
+
+    def blank(self) -> "CoercionAcc":
+        return CoercionAcc()
+
+    def update(self, failed: int, total: int) -> None:
+        self.coerced_nulls += failed
+        self.total += total
+
+    def merge(self, other: "CoercionAcc") -> None:
+        self.coerced_nulls += other.coerced_nulls
+        self.total += other.total
+
+    @property
+    def rate(self) -> float:
+        return (self.total - self.coerced_nulls) / self.total if self.total else 0.0
+
+    def finalize(self) -> dict[str, Any]:
+        return {"kind": "numeric",
+                "coerced_nulls": self.coerced_nulls,
+                "total": self.total,
+                "rate": self.rate}
+
+
+class CorrelationAcc:
+    """Pairwise-complete co-moments of numeric columns (covariance / Pearson).
+
+    For a pair (i, j) only rows where both values are present count:
+    `n[i, j]` of them, `sx[i, j]` / `sxx[i, j]` - sums of x_i and x_i**2
+    over those rows, `sxy[i, j]` - sum of x_i * x_j. Values are shifted by
+    a per-column constant (mean of the first chunk it appeared in) so the
+    sums stay small; `merge` re-shifts the other side, states merge in any
+    order.
+    """
+
+    __slots__ = ("index", "n", "names", "shift", "sx", "sxx", "sxy")
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.index: dict[str, int] = {}
+        self.shift = np.zeros(0)
+        self.n = np.zeros((0, 0), dtype=np.int64)
+        self.sx = np.zeros((0, 0))
+        self.sxx = np.zeros((0, 0))
+        self.sxy = np.zeros((0, 0))
+
+    def blank(self) -> "CorrelationAcc":
+        return CorrelationAcc()
+
+    def _grow(self, names: list[str], shifts: list[float]) -> None:
+        if not names:
+            return
+        for name in names:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        extra = len(names)
+        self.shift = np.concatenate([self.shift, shifts])
+        for attr in ("n", "sx", "sxx", "sxy"):
+            setattr(self, attr, np.pad(getattr(self, attr), ((0, extra), (0, extra))))
+
+    def _block(self, idx: npt.NDArray[np.intp]) -> Any:
+        # все колонки по порядку - без копирования через fancy indexing
+        if len(idx) == len(self.names) and (idx == np.arange(len(idx))).all():
+            return np.s_[:, :]
+        return np.ix_(idx, idx)
+
+    def update(self, columns: dict[str, npt.NDArray[np.float64]]) -> None:
+        # columns - значения чанка, выровненные по строкам, NaN - пропуск
+        if not columns:
+            return
+        names = list(columns)
+        x = np.column_stack([columns[name] for name in names]).astype(np.float64, copy=False)
+        new = [(j, name) for j, name in enumerate(names) if name not in self.index]
+        shifts = []
+        for j, _ in new:
+            finite = x[:, j][np.isfinite(x[:, j])]
+            shifts.append(float(finite.mean()) if len(finite) else 0.0)
+        self._grow([name for _, name in new], shifts)
+
+        idx = np.array([self.index[name] for name in names])
+        z = x - self.shift[idx]
+        valid = np.isfinite(z)
+        block = self._block(idx)
+        if valid.all():
+            self.n[block] += len(z)
+            self.sx[block] += z.sum(axis=0)[:, None]
+            self.sxx[block] += (z * z).sum(axis=0)[:, None]
+        else:
+            # маска присутствия: все попарные суммы - два матричных произведения
+            q = len(names)
+            m = valid.astype(np.float64)
+            z = np.where(valid, z, 0.0)
+            prod = np.hstack([z, z * z, m]).T @ m
+            self.sx[block] += prod[:q]
+            self.sxx[block] += prod[q:2 * q]
+            self.n[block] += np.rint(prod[2 * q:]).astype(np.int64)
+        self.sxy[block] += z.T @ z
+
+    def merge(self, other: "CorrelationAcc") -> None:
+        if not other.names:
+            return
+        new = [name for name in other.names if name not in self.index]
+        self._grow(new, [other.shift[other.index[name]] for name in new])
+        idx = np.array([self.index[name] for name in other.names])
+        # x - shift_self = (x - shift_other) + d
+        d = other.shift - self.shift[idx]
+        n = other.n
+        block = self._block(idx)
+        self.sxy[block] += other.sxy + d[:, None] * other.sx.T + d[None, :] * other.sx + np.outer(d, d) * n
+        self.sxx[block] += other.sxx + 2 * d[:, None] * other.sx + (d ** 2)[:, None] * n
+        self.sx[block] += other.sx + d[:, None] * n
+        self.n[block] += n
+
+    def finalize(self) -> dict[str, Any]:
+        n = self.n.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cxy = self.sxy - self.sx * self.sx.T / n
+            var = self.sxx - self.sx ** 2 / n
+            cov = np.where(n > 1, cxy / (n - 1), np.nan)
+            denom = var * var.T
+            pearson = np.where(denom > 0, np.clip(cxy / np.sqrt(denom), -1.0, 1.0), np.nan)
+
+        def rows(m: npt.NDArray[np.float64]) -> list[list[float | None]]:
+            return [[float(v) if np.isfinite(v) else None for v in row] for row in m]
+
+        return {"columns": list(self.names),
+                "n": self.n.tolist(),
+                "covariance": rows(cov),
+                "pearson": rows(pearson)}
+
+
+type Section = NumericAcc | StringAcc | DatetimeAcc | BoolAcc | CoercionAcc
+
+
+class ColumnState:
+    """Accumulated state of one column: the detection plan, counts, the
+    distinct-count sketch and one accumulator per section that applies.
+
+    `to_dict` is the only place that turns state into profile.json layout.
+    """
+
+    __slots__ = ("original_dtype", "type", "dtype_family", "non_null", "null",
+                 "hll", "dirty", "coerce_seen") + SECTIONS
+
+    def __init__(self, original_dtype: str, type: str,
+                 hll: HyperLogLog | None = None, dtype_family: str | None = None) -> None:
+        self.original_dtype = original_dtype
+        self.type = type
+        self.dtype_family = dtype_family
+        self.non_null = 0
+        self.null = 0
+        self.hll = hll
+        self.dirty = False
+        self.coerce_seen = False
+        self.numeric: NumericAcc | None = None
+        self.string: StringAcc | None = None
+        self.datetime: DatetimeAcc | None = None
+        self.bool: BoolAcc | None = None
+        self.coercion: CoercionAcc | None = None
+
+    def sections(self) -> Iterator[tuple[str, Section]]:
+        for name in SECTIONS:
+            acc = getattr(self, name)
+            if acc is not None:
+                yield name, acc
+
+    def blank(self) -> "ColumnState":
+        # то же решение о типе колонки, но с нулевыми аккумуляторами
+        blank = ColumnState(self.original_dtype, self.type,
+                            HyperLogLog(self.hll.p) if self.hll is not None else None,
+                            self.dtype_family)
+        blank.dirty = self.dirty
+        blank.coerce_seen = self.coerce_seen
+        for name, acc in self.sections():
+            setattr(blank, name, acc.blank())
+        return blank
+
+    def kind(self) -> tuple[str, str, tuple[str, ...], bool]:
+        kind = "numeric" if self.type in ("int", "float") else self.type
+        sections = tuple(name for name, _ in self.sections())
+        return self.original_dtype, kind, sections, self.dirty
+
+    def merge(self, other: "ColumnState") -> None:
+        if other.non_null + other.null > 0:
+            self.type = other.type
+            self.dtype_family = other.dtype_family
+        self.non_null += other.non_null
+        self.null += other.null
+        if other.hll is None:
+            self.hll = None
+        elif self.hll is not None:
+            self.hll.merge(other.hll)
+        self.dirty = self.dirty or other.dirty
+        self.coerce_seen = self.coerce_seen or other.coerce_seen
+        for name, acc in other.sections():
+            if getattr(self, name) is None:
+                setattr(self, name, acc.blank())
+            getattr(self, name).merge(acc)
+
+    def to_dict(self, k: int, percentiles: tuple[float, ...]) -> dict[str, Any]:
+        out: dict[str, Any] = {"type": self.type,
+                               "non_null": self.non_null,
+                               "null": self.null}
+        if self.hll is not None:
+            out["approx_distinct"] = self.hll.count()
+        if self.numeric is not None:
+            out["numeric"] = self.numeric.finalize(self.non_null, percentiles)
+        if self.string is not None:
+            out["string"] = self.string.finalize(self.non_null, k)
+        if self.datetime is not None:
+            out["datetime"] = self.datetime.finalize()
+        if self.bool is not None:
+            out["bool"] = self.bool.finalize(self.non_null)
+        if self.coercion is not None:
+            out["coercion"] = self.coercion.finalize()
+        return out
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .core_utils.atomic import atomic_write_text
+from .core_utils.io_helpers import iter_frames
+from .log_json import Emit, time_now_iso
+from .profiler import ProfileArgs, run_profile
+
+
+BENCH_VERSION = 1
+KINDS = ("int", "float", "string", "datetime", "bool", "dirty")
+DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Shape of a synthetic dataset; the same spec always gives the same files.
+
+    Columns cycle through `kinds` up to `width`. `cardinality` is the number
+    of distinct values of string columns, `null_rate` the share of missing
+    values everywhere. "dirty" columns hold numbers written as strings with
+    thousands separators and a `bad_rate` share of unparsable tokens;
+    datetime columns in CSV cycle through `datetime_formats`.
+    """
+
+    name: str
+    rows: int = 100_000
+    width: int = 12
+    files: int = 4
+    fmt: str = "csv"
+    kinds: tuple[str, ...] = KINDS
+    cardinality: int = 1_000
+    null_rate: float = 0.05
+    bad_rate: float = 0.01
+    datetime_formats: tuple[str, ...] = DATETIME_FORMATS
+    seed: int = 0
+
+    def key(self) -> str:
+        return hashlib.sha256(json.dumps(asdict(self), sort_keys=True).encode("utf8")).hexdigest()[:12]
+
+
+def _column(kind: str, n: int, rng: np.random.Generator, spec: DatasetSpec, i: int) -> pd.Series:
+    if kind == "int":
+        s = pd.Series(rng.integers(0, 1_000_000, n), dtype="Int64")
+    elif kind == "float":
+        s = pd.Series(rng.normal(100, 25, n))
+    elif kind == "string":
+        pool = np.array([f"v{j:07d}" for j in range(spec.cardinality)], dtype=object)
+        # частоты по Ципфу: есть и тяжёлые значения, и длинный хвост
+        s = pd.Series(pool[(rng.zipf(1.3, n) - 1) % spec.cardinality])
+    elif kind == "datetime":
+        seconds = rng.integers(0, 3 * 365 * 86_400, n)
+        s = pd.Series(pd.Timestamp("2022-01-01") + pd.to_timedelta(seconds, unit="s"))
+        if spec.fmt == "csv":
+            s = s.dt.strftime(spec.datetime_formats[i % len(spec.datetime_formats)])
+    elif kind == "bool":
+        s = pd.Series(rng.random(n) < 0.3)
+    elif kind == "dirty":
+        values = rng.normal(10_000, 5_000, n)
+        s = pd.Series([f"{v:,.2f}".replace(",", " ") for v in values], dtype=object)
+        s[rng.random(n) < spec.bad_rate] = "unknown"
+    else:
+        raise ValueError(f"unknown column kind {kind}")
+
+    if spec.null_rate > 0:
+        s = s.astype(object) if kind in ("bool", "datetime") else s
+        s[rng.random(n) < spec.null_rate] = None
+    return s
+
+
+def generate_dataset(spec: DatasetSpec, root: Path) -> Path:
+    """Write the dataset under `root/<name>-<spec hash>` unless it is already there."""
+    out = root / f"{spec.name}-{spec.key()}"
+    done = out / ".complete"
+    if done.exists():
+        return out
+    shutil.rmtree(out, ignore_errors=True)
+    out.mkdir(parents=True)
+
+    rng = np.random.default_rng(spec.seed)
+    per_file = -(-spec.rows // spec.files)
+    for f in range(spec.files):
+        n = min(per_file, spec.rows - f * per_file)
+        if n <= 0:
+            break
+        df = pd.DataFrame({f"{kind}_{i}": _column(kind, n, rng, spec, i)
+                           for i, kind in ((i, spec.kinds[i % len(spec.kinds)]) for i in range(spec.width))})
+        path = out / f"part-{f:04d}.{spec.fmt}"
+        if spec.fmt == "csv":
+            df.to_csv(path, index=False)
+        else:
+            df.to_parquet(path, index=False, row_group_size=50_000)
+    done.touch()
+    return out
+
+
+SUITES: dict[str, list[DatasetSpec]] = {
+    "quick": [
+        DatasetSpec("narrow_csv", rows=50_000, width=6, files=2),
+        DatasetSpec("narrow_parquet", rows=50_000, width=6, files=2, fmt="parquet"),
+    ],
+    "default": [
+        DatasetSpec("narrow_csv", rows=1_000_000, width=6),
+        DatasetSpec("wide_csv", rows=50_000, width=300),
+        DatasetSpec("high_cardinality_csv", rows=500_000, width=6, kinds=("string",), cardinality=1_000_000),
+        DatasetSpec("sparse_csv", rows=500_000, width=12, null_rate=0.6),
+        DatasetSpec("dirty_csv", rows=500_000, width=6, kinds=("dirty",), bad_rate=0.05),
+        DatasetSpec("narrow_parquet", rows=1_000_000, width=6, fmt="parquet"),
+        DatasetSpec("wide_parquet", rows=50_000, width=300, fmt="parquet"),
+    ],
+}
+
+# настройки run_profile поверх значений по умолчанию
+CONFIGS: dict[str, dict[str, Any]] = {
+    "pandas": {},
+    "pandas-chunk100k": {"chunksize": 100_000},
+    "pandas-mem256m": {"max_memory": 256 << 20},
+    "arrow": {"engine": "arrow", "csv_reader": "arrow"},
+    "pandas-noprefetch": {"prefetch": 0},
+    # медленное хранилище (сетевой диск): задержка на каждый прочитанный чанк
+    "pandas-slowio": {"read_latency_ms": 20},
+    "pandas-slowio-noprefetch": {"read_latency_ms": 20, "prefetch": 0},
+    "pandas-w4": {"workers": 4},
+    "arrow-w4": {"engine": "arrow", "csv_reader": "arrow", "workers": 4},
+}
+
+
+@dataclass
+class BenchCase:
+    dataset: str
+    config: str
+    src: Path
+    fmt: str
+    settings: dict[str, Any] = field(default_factory=dict)
+
+
+@contextmanager
+def _slow_storage(latency: float) -> Iterator[None]:
+    # имитация сетевого хранилища: чтение каждого чанка ждёт latency секунд без GIL,
+    # как ожидание ввода-вывода; чтение подменяется только внутри with
+    if latency <= 0:
+        yield
+        return
+    from . import profiler
+
+    def slow_iter_frames(*args: Any,
+                         **kwargs: Any) -> Iterator[tuple[Path, int, pd.DataFrame | pa.RecordBatch]]:
+        for item in iter_frames(*args, **kwargs):
+            time.sleep(latency)
+            yield item
+
+    setattr(profiler, "iter_frames", slow_iter_frames)
+    try:
+        yield
+    finally:
+        setattr(profiler, "iter_frames", iter_frames)
+
+
+def _run_case(case: BenchCase) -> dict[str, Any]:
+    # выполняется в отдельном процессе: пиковая память не наследуется от прошлых прогонов
+    events: list[dict[str, Any]] = []
+    settings = dict(case.settings)
+    latency_ms = settings.pop("read_latency_ms", 0)
+
+    def emit(**event: Any) -> None:
+        events.append(event)
+
+    with (tempfile.TemporaryDirectory(prefix="dprof-bench-") as dst,
+          _slow_storage(latency_ms / 1000)):
+        args = ProfileArgs(src=case.src, dst=Path(dst), fmt=case.fmt, sample=1.0,
+                           chunksize=settings.pop("chunksize", 10_000), topk=20, threshold=0.95,
+                           cache=False, checkpoint_seconds=0.0, **settings)
+        code = run_profile(args, emit)
+    if code != 0:
+        failed = next((e for e in events if e.get("event") == "profile_failed"), {})
+        raise RuntimeError(f"run_profile exited with {code}: {failed.get('exception_msg')}")
+    return next(e for e in events if e.get("event") == "profile_perf")
+
+
+def run_benchmarks(specs: list[DatasetSpec], configs: dict[str, dict[str, Any]],
+                   data_dir: Path, repeat: int, emit: Emit) -> dict[str, Any]:
+    ctx = get_context("spawn")
+    results = []
+    for spec in specs:
+        src = generate_dataset(spec, data_dir)
+        for config, settings in configs.items():
+            case = BenchCase(spec.name, config, src, spec.fmt, settings)
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(_run_case, case).result())
+            # лучший из повторов по времени, память - худшая
+            best = min(runs, key=lambda r: r["wall_s"])
+            result = {"dataset": spec.name,
+                      "config": config,
+                      "spec": asdict(spec),
+                      "settings": settings,
+                      "rows": best["rows"],
+                      "bytes": best["bytes_scanned"],
+                      "wall_s": best["wall_s"],
+                      "rows_per_s": best["rows_per_s"],
+                      "mb_per_s": best["mb_per_s"],
+                      "peak_rss_bytes": max(r["peak_rss_bytes"] for r in runs),
+                      "peak_rss_children_bytes": max(r["peak_rss_children_bytes"] for r in runs),
+                      "repeats": repeat}
+            results.append(result)
+            emit(level="INFO",
+                 event="bench_case",
+                 dataset=spec.name,
+                 config=config,
+                 wall_s=result["wall_s"],
+                 rows_per_s=result["rows_per_s"],
+                 mb_per_s=result["mb_per_s"],
+                 peak_rss_bytes=result["peak_rss_bytes"])
+    return {"meta": {"version": BENCH_VERSION,
+                     "generated_at": time_now_iso(),
+                     "python": sys.version.split()[0],
+                     "platform": platform.platform(),
+                     "cpu_count": os.cpu_count(),
+                     "pandas": pd.__version__},
+            "results": results}
+
+
+def write_results(path: Path, results: dict[str, Any]) -> None:
+    atomic_write_text(path, json.dumps(results, ensure_ascii=False, indent=1, sort_keys=True))
+
+
+def compare_results(baseline: dict[str, Any], current: dict[str, Any],
+                    tolerance: float = 0.10, memory_tolerance: float = 0.20) -> list[dict[str, Any]]:
+    """Cases slower or hungrier than the baseline beyond the tolerances.
+
+    Throughput regresses when rows/s drops by more than `tolerance`, memory
+    when peak RSS (process + workers) grows by more than `memory_tolerance`.
+    Only (dataset, config) pairs present in both files are compared.
+    """
+    base = {(r["dataset"], r["config"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["dataset"], r["config"]))
+        if b is None:
+            continue
+        if b["rows_per_s"] and r["rows_per_s"] < b["rows_per_s"] * (1 - tolerance):
+            regressions.append({"dataset": r["dataset"], "config": r["config"], "metric": "rows_per_s",
+                                "baseline": b["rows_per_s"], "current": r["rows_per_s"],
+                                "change": r["rows_per_s"] / b["rows_per_s"] - 1})
+        b_mem = b["peak_rss_bytes"] + b["peak_rss_children_bytes"]
+        r_mem = r["peak_rss_bytes"] + r["peak_rss_children_bytes"]
+        if b_mem and r_mem > b_mem * (1 + memory_tolerance):
+            regressions.append({"dataset": r["dataset"], "config": r["config"], "metric": "peak_rss_bytes",
+                                "baseline": b_mem, "current": r_mem,
+                                "change": r_mem / b_mem - 1})
+    return regressions
+
+
+@dataclass
+class BenchArgs:
+    out: Path
+    data_dir: Path
+    suite: str = "quick"
+    configs: tuple[str, ...] = tuple(CONFIGS)
+    repeat: int = 3
+
+
+def run_bench(args: BenchArgs, emit: Emit) -> int:
+    emit(level="INFO",
+         event="bench_started",
+         suite=args.suite,
+         configs=list(args.configs),
+         repeat=args.repeat,
+         out_path=str(args.out))
+    try:
+        results = run_benchmarks(SUITES[args.suite], {c: CONFIGS[c] for c in args.configs},
+                                 args.data_dir, args.repeat, emit)
+        write_results(args.out, results)
+    except Exception as e:
+        emit(level="ERROR",
+             event="bench_failed",
+             exception_type=type(e).__name__,
+             exception_msg=str(e))
+        return 4
+
+    emit(level="INFO",
+         event="bench_completed",
+         cases=len(results["results"]),
+         out_path=str(args.out))
+    return 0
+
+
+@dataclass
+class BenchCompareArgs:
+    baseline: Path
+    current: Path
+    tolerance: float = 0.10
+    memory_tolerance: float = 0.20
+
+
+def run_bench_compare(args: BenchCompareArgs, emit: Emit) -> int:
+    """Exit code 1 when any case regressed, 0 otherwise."""
+    try:
+        baseline = json.loads(args.baseline.read_text(encoding="utf8"))
+        current = json.loads(args.current.read_text(encoding="utf8"))
+        regressions = compare_results(baseline, current, args.tolerance, args.memory_tolerance)
+    except Exception as e:
+        emit(level="ERROR",
+             event="bench_compare_failed",
+             exception_type=type(e).__name__,
+             exception_msg=str(e))
+        return 4
+
+    for r in regressions:
+        emit(level="WARN", event="bench_regression", **r)
+    emit(level="INFO",
+         event="bench_compare_completed",
+         baseline_path=str(args.baseline),
+         current_path=str(args.current),
+         regressions_total=len(regressions))
+    return 1 if regressions else 0
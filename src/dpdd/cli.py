@@ -5,8 +5,12 @@ import uuid
 import sys
 
 
-from dpdd.profiler import run_profile, ProfileArgs
-from dpdd.log_json import get_json_logger, make_emit
+from dpdd.profiler import run_profile, run_merge, ProfileArgs, MergeArgs
+from dpdd.drift import run_compare, CompareArgs, drift_out_path
+from dpdd.state_file import STATE_NAME
+from dpdd.core_utils.row_filter import RowFilter
+from dpdd.bench import run_bench, run_bench_compare, BenchArgs, BenchCompareArgs, CONFIGS, SUITES
+from dpdd.log_json import get_json_logger, make_emit, throttle_emit
 
 
 app = typer.Typer(add_completion=False, rich_markup_mode="markdown")
@@ -17,8 +21,9 @@ class UXError(Exception):
     pass
 
 
-def dir_get_suffix(src: Path) -> set[str]:
-    return set(s.suffix[1:] for s in src.iterdir() if s.is_file())
+def dir_get_suffix(src: Path, recursive: bool = False) -> set[str]:
+    entries = src.rglob("*") if recursive else src.iterdir()
+    return set(s.suffix[1:] for s in entries if s.is_file())
 
 
 def detect_format(src: Path, fmt: str | None) -> str:
@@ -38,6 +43,36 @@ def detect_format(src: Path, fmt: str | None) -> str:
         raise UXError(f"ERR: src not found - {src}")
 
 
+def parse_percentiles(raw: str) -> tuple[float, ...]:
+    try:
+        return tuple(float(p) for p in raw.split(",") if p.strip())
+    except ValueError:
+        raise UXError(f"ERR: invalid percentiles - {raw}")
+
+
+def parse_patterns(raw: str | None) -> tuple[str, ...]:
+    if not raw:
+        return ()
+    return tuple(p.strip() for p in raw.split(",") if p.strip())
+
+
+def parse_size(raw: str | None) -> int | None:
+    # "512M", "2G", "1.5g"; число без суффикса - мегабайты
+    if not raw:
+        return None
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    value = raw.strip().upper().removesuffix("B")
+    mult = units.get(value[-1:], None)
+    try:
+        size = float(value[:-1] if mult else value) * (mult or units["M"])
+    except ValueError:
+        raise UXError(f"ERR: bad size - {raw}")
+    # nan, inf и доли байта тоже не размер
+    if not 1 <= size < float("inf"):
+        raise UXError(f"ERR: size must be > 0 - {raw}")
+    return int(size)
+
+
 def validate_profile_args(args: ProfileArgs) -> str:
     if not args.src.exists():
         raise UXError(f"ERR: src not found")
@@ -54,12 +89,18 @@ def validate_profile_args(args: ProfileArgs) -> str:
     if not 0 < args.sample <= 1:
         raise UXError(f"ERR: sample must be in (0; 1]")
 
+    if args.partitioning not in (None, "hive"):
+        raise UXError(f"ERR: partitioning must be hive")
+
+    if (args.partition_filter or args.per_partition) and args.partitioning is None:
+        raise UXError(f"ERR: partition-filter / per-partition require --partitioning")
+
     allowed_fmts = {"csv", "parquet"}
     fmt = detect_format(args.src, args.fmt)
     if fmt not in allowed_fmts:
         raise UXError(f"ERR: unsupported format - {fmt}")
     if args.src.is_dir():
-        src_fmts = dir_get_suffix(args.src)
+        src_fmts = dir_get_suffix(args.src, recursive=args.partitioning is not None)
         if fmt not in src_fmts:
             raise UXError(f"ERR: src does not contain files of format - {fmt}")
 
@@ -72,6 +113,66 @@ def validate_profile_args(args: ProfileArgs) -> str:
     if args.threshold <= 0 or args.threshold > 1:
         raise UXError(f"ERR: threshold must be >0 and <=1")
 
+    if args.topk_capacity < args.topk:
+        raise UXError(f"ERR: topk-capacity must be >=topk")
+
+    if args.quantile_k < 8:
+        raise UXError(f"ERR: quantile-k must be >=8")
+
+    if args.workers <= 0:
+        raise UXError(f"ERR: workers must be >0")
+
+    if args.max_memory is not None and args.max_memory <= 0:
+        raise UXError(f"ERR: max-memory must be >0")
+
+    if args.prefetch < 0:
+        raise UXError(f"ERR: prefetch must be >= 0")
+
+    if args.engine not in {"pandas", "arrow"}:
+        raise UXError(f"ERR: engine must be pandas|arrow")
+
+    if args.stats_only and fmt != "parquet":
+        raise UXError(f"ERR: stats-only requires parquet")
+
+    if args.stats_only and args.correlations:
+        raise UXError(f"ERR: correlations need all rows, not stats-only")
+
+    if args.row_filter:
+        try:
+            RowFilter(args.row_filter)
+        except ValueError as e:
+            raise UXError(f"ERR: {e}")
+
+    if args.partition_filter:
+        try:
+            RowFilter(args.partition_filter)
+        except ValueError as e:
+            raise UXError(f"ERR: {e}")
+
+    if not 4 <= args.hll_precision <= 18:
+        raise UXError(f"ERR: hll-precision must be in [4; 18]")
+
+    if args.csv_reader not in ("pandas", "arrow"):
+        raise UXError(f"ERR: csv-reader must be pandas or arrow")
+
+    if args.checkpoint_rows < 0 or args.checkpoint_seconds < 0:
+        raise UXError(f"ERR: checkpoint-rows / checkpoint-seconds must be >= 0")
+
+    if args.cache_max_mb <= 0:
+        raise UXError(f"ERR: cache-max-mb must be > 0")
+
+    if args.sample_mode not in ("block", "row"):
+        raise UXError(f"ERR: sample-mode must be block or row")
+
+    if args.detect_sample <= 0:
+        raise UXError(f"ERR: detect-sample must be > 0")
+
+    if args.trace is not None and (args.trace.is_dir() or not args.trace.parent.is_dir()):
+        raise UXError(f"ERR: trace must be a file path in an existing directory")
+
+    if not args.percentiles or any(not 0 <= p <= 100 for p in args.percentiles):
+        raise UXError(f"ERR: percentiles must be in [0; 100]")
+
     return fmt
 
 @app.command(name="profile")
@@ -80,26 +181,259 @@ def profile(
     dst: Path = typer.Option(..., "--dst", help="output directory"),
     fmt: Optional[str] = typer.Option(None, "--format", "-f", help="csv|parquet (required for dir)"),
     sample: float = typer.Option(1.0, "--sample", help="(0;1]"),
+    sample_mode: str = typer.Option("block", "--sample-mode", help="block|row (block: whole parquet row groups / csv byte ranges; row: per-row Bernoulli)"),
+    seed: int = typer.Option(0, "--seed", help="sampling seed"),
     chunksize: int = typer.Option(10_000, "--chunksize", help="rows per chunk/batch"),
     topk: int = typer.Option(20, "--topk", help="top-K frequent values"),
     threshold: float = typer.Option(0.95, "--threshold", help="coercion threshold"),
+    percentiles: str = typer.Option("50,95,99", "--percentiles", help="comma-separated, e.g. 50,95,99.9"),
+    quantile_k: int = typer.Option(200, "--quantile-k", help="quantile sketch size (higher = more accurate)"),
+    topk_capacity: int = typer.Option(1024, "--topk-capacity", help="heavy-hitter counters per string column"),
+    exact_topk: bool = typer.Option(False, "--exact-topk", help="exact top-K (memory grows with cardinality)"),
+    hll_precision: int = typer.Option(12, "--hll-precision", help="distinct-count registers = 2**p"),
+    workers: int = typer.Option(1, "--workers", help="processes profiling files in parallel"),
+    engine: str = typer.Option("pandas", "--engine", help="pandas|arrow (arrow: parquet / --csv-reader arrow batches are profiled without to_pandas)"),
+    csv_reader: str = typer.Option("pandas", "--csv-reader", help="pandas|arrow (arrow: newline-aligned byte ranges parsed by pyarrow in parallel threads)"),
+    stats_only: bool = typer.Option(False, "--stats-only", help="parquet: numeric/datetime null/min/max from footer, no moments/quantiles"),
+    columns: Optional[str] = typer.Option(None, "--columns", help="comma-separated column names/glob patterns to profile"),
+    exclude_columns: Optional[str] = typer.Option(None, "--exclude-columns", help="comma-separated column names/glob patterns to skip"),
+    row_filter: Optional[str] = typer.Option(None, "--filter", help="row filter, e.g. \"country in ['DE','FR'] and amount > 0\""),
+    no_cache: bool = typer.Option(False, "--no-cache", help="rescan every file, ignore and don't update the per-file state cache"),
+    cache_dir: Optional[Path] = typer.Option(None, "--cache-dir", help="per-file state cache (default: <dst>/.dprof-cache); entries are pickles, use a trusted directory only"),
+    cache_hash: bool = typer.Option(False, "--cache-hash", help="on mtime change compare file content hashes before rescanning"),
+    cache_max_mb: int = typer.Option(1024, "--cache-max-mb", help="cache size limit, least recently used entries are evicted"),
+    resume: bool = typer.Option(False, "--resume", help="continue from <dst>/profile.ckpt, skipping consumed files and chunks"),
+    checkpoint_rows: int = typer.Option(0, "--checkpoint-rows", help="checkpoint every N rows (0 = off)"),
+    checkpoint_seconds: float = typer.Option(300.0, "--checkpoint-seconds", help="checkpoint every N seconds (0 = off)"),
+    detect_sample: int = typer.Option(1_000, "--detect-sample", help="non-null values per column used for type detection"),
+    perf: bool = typer.Option(False, "--perf", help="embed phase timings, throughput and peak RSS in profile.json (dataset.perf)"),
+    trace: Optional[Path] = typer.Option(None, "--trace", help="write a Chrome trace (chrome://tracing, Perfetto) of files and chunks to this path"),
+    max_memory: Optional[str] = typer.Option(None, "--max-memory", help="memory budget for chunk data, e.g. 512M or 2G (split across workers); chunk sizes adapt per file and override --chunksize"),
+    prefetch: int = typer.Option(2, "--prefetch", help="chunks read and decoded ahead on a background thread (0 = off)"),
+    partitioning: Optional[str] = typer.Option(None, "--partitioning", help="hive: find files in key=value/ directories at any depth"),
+    partition_filter: Optional[str] = typer.Option(None, "--partition-filter", help="skip partitions by key, e.g. \"date >= '2026-10-01' and region == 'eu'\""),
+    per_partition: Optional[str] = typer.Option(None, "--per-partition", help="also write <dst>/partitions/<key>=<value>/profile.json for every value of this key"),
+    correlations: bool = typer.Option(False, "--correlations", help="pairwise-complete covariance / Pearson matrix of numeric columns, accumulated in the same pass"),
+    log_chunk_every: int = typer.Option(1, "--log-chunk-every", help="log every N-th profile_chunk_scanned per file (first one always)"),
+    log_chunk_seconds: float = typer.Option(0.0, "--log-chunk-seconds", help="at most one profile_chunk_scanned per file per N seconds"),
 ) -> None:
-    args = ProfileArgs(src=src, dst=dst, fmt=fmt,
-                       sample=sample, chunksize=chunksize,
-                       topk=topk, threshold=threshold)
     try:
+        args = ProfileArgs(src=src, dst=dst, fmt=fmt,
+                           sample=sample, chunksize=chunksize,
+                           topk=topk, threshold=threshold,
+                           percentiles=parse_percentiles(percentiles),
+                           quantile_k=quantile_k,
+                           topk_capacity=topk_capacity,
+                           exact_topk=exact_topk,
+                           hll_precision=hll_precision,
+                           workers=workers,
+                           engine=engine,
+                           stats_only=stats_only,
+                           columns=parse_patterns(columns),
+                           exclude_columns=parse_patterns(exclude_columns),
+                           row_filter=row_filter,
+                           detect_sample=detect_sample,
+                           sample_mode=sample_mode,
+                           seed=seed,
+                           csv_reader=csv_reader,
+                           cache=not no_cache,
+                           cache_dir=cache_dir,
+                           cache_hash=cache_hash,
+                           cache_max_mb=cache_max_mb,
+                           resume=resume,
+                           checkpoint_rows=checkpoint_rows,
+                           checkpoint_seconds=checkpoint_seconds,
+                           perf=perf,
+                           trace=trace,
+                           max_memory=parse_size(max_memory),
+                           prefetch=prefetch,
+                           partitioning=partitioning,
+                           partition_filter=partition_filter,
+                           per_partition=per_partition,
+                           correlations=correlations)
         args.fmt = validate_profile_args(args)
+        if log_chunk_every <= 0 or log_chunk_seconds < 0:
+            raise UXError(f"ERR: log-chunk-every must be >0 and log-chunk-seconds >=0")
     except UXError as e:
         typer.secho(f"Error: {e}", err=True)
         raise typer.Exit(2)
 
     run_id = str(uuid.uuid4())
     logger = get_json_logger("app")
-    emit = make_emit(logger, run_id, "profile")
+    emit = throttle_emit(make_emit(logger, run_id, "profile"),
+                         every=log_chunk_every, seconds=log_chunk_seconds)
 
     sys.exit(run_profile(args, emit))
 
 
+def expand_profiles(paths: list[Path]) -> tuple[Path, ...]:
+    # в каталоге берём бинарное состояние рядом с profile.json, если оно есть
+    out: list[Path] = []
+    for p in paths:
+        if p.is_dir():
+            for found in sorted(p.rglob("profile.json")):
+                state = found.with_name(STATE_NAME)
+                out.append(state if state.is_file() else found)
+        else:
+            out.append(p)
+    return tuple(out)
+
+
+def validate_compare_args(args: CompareArgs) -> None:
+    if not args.left.is_file():
+        raise UXError(f"ERR: left profile not found - {args.left}")
+
+    if not args.right:
+        raise UXError(f"ERR: no right profiles")
+    for p in args.right:
+        if not p.is_file():
+            raise UXError(f"ERR: right profile not found - {p}")
+
+    outs = [drift_out_path(args, p) for p in args.right]
+    if len(set(outs)) != len(outs):
+        raise UXError(f"ERR: right profiles map to the same drift file name")
+
+    if min(args.null_delta, args.mean_delta, args.p95_delta) < 0:
+        raise UXError(f"ERR: thresholds must be >= 0")
+
+    if args.dst.exists() and args.dst.is_file():
+        raise UXError(f"ERR: dst must be a directory")
+    try:
+        args.dst.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        raise UXError(f"ERR: could not create dst - {type(e).__name__}")
+
+
+@app.command(name="compare")
+def compare(
+    left: Path = typer.Option(..., "--left", help="baseline profile.json"),
+    right: list[Path] = typer.Option(..., "--right", help="profile.json to compare, or a directory of them; repeatable (batch: <dst>/<name>.drift.json each)"),
+    dst: Path = typer.Option(..., "--dst", help="output directory"),
+    null_delta: float = typer.Option(0.05, "--null-delta", help="alert when |null rate delta| exceeds this"),
+    mean_delta: float = typer.Option(2.0, "--mean-delta", help="alert when |mean delta| exceeds this"),
+    p95_delta: float = typer.Option(3.0, "--p95-delta", help="alert when |p95 delta| exceeds this"),
+) -> None:
+    try:
+        args = CompareArgs(left=left, right=expand_profiles(right), dst=dst,
+                           null_delta=null_delta,
+                           mean_delta=mean_delta,
+                           p95_delta=p95_delta)
+        validate_compare_args(args)
+    except UXError as e:
+        typer.secho(f"Error: {e}", err=True)
+        raise typer.Exit(2)
+
+    run_id = str(uuid.uuid4())
+    logger = get_json_logger("app")
+    emit = make_emit(logger, run_id, "compare")
+
+    sys.exit(run_compare(args, emit))
+
+
+def validate_merge_args(args: MergeArgs) -> None:
+    if not args.src:
+        raise UXError(f"ERR: no state files to merge")
+    for p in args.src:
+        if not p.is_file():
+            raise UXError(f"ERR: state file not found - {p}")
+        if p.suffix != ".arrow":
+            raise UXError(f"ERR: merge needs {STATE_NAME} files, got - {p.name}")
+
+    if args.dst.exists() and args.dst.is_file():
+        raise UXError(f"ERR: dst must be a directory")
+    try:
+        args.dst.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        raise UXError(f"ERR: could not create dst - {type(e).__name__}")
+
+
+@app.command(name="merge")
+def merge(
+    src: list[Path] = typer.Option(..., "--src", help=f"{STATE_NAME} to merge, or a directory of them; repeatable"),
+    dst: Path = typer.Option(..., "--dst", help="output directory"),
+    columns: Optional[str] = typer.Option(None, "--columns", help="comma-separated column names/glob patterns to keep"),
+    exclude_columns: Optional[str] = typer.Option(None, "--exclude-columns", help="comma-separated column names/glob patterns to drop"),
+) -> None:
+    try:
+        files = [found for p in src
+                 for found in (sorted(p.rglob(STATE_NAME)) if p.is_dir() else [p])]
+        args = MergeArgs(src=tuple(files), dst=dst,
+                         columns=parse_patterns(columns),
+                         exclude_columns=parse_patterns(exclude_columns))
+        validate_merge_args(args)
+    except UXError as e:
+        typer.secho(f"Error: {e}", err=True)
+        raise typer.Exit(2)
+
+    run_id = str(uuid.uuid4())
+    logger = get_json_logger("app")
+    emit = make_emit(logger, run_id, "merge")
+
+    sys.exit(run_merge(args, emit))
+
+
+def validate_bench_args(args: BenchArgs) -> None:
+    if args.suite not in SUITES:
+        raise UXError(f"ERR: unknown suite - {args.suite} (one of {', '.join(SUITES)})")
+    unknown = [c for c in args.configs if c not in CONFIGS]
+    if unknown or not args.configs:
+        raise UXError(f"ERR: unknown configs - {', '.join(unknown)} (one of {', '.join(CONFIGS)})")
+    if args.repeat < 1:
+        raise UXError(f"ERR: repeat must be >= 1")
+    if args.out.is_dir() or not args.out.parent.is_dir():
+        raise UXError(f"ERR: out must be a file in an existing directory")
+    try:
+        args.data_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        raise UXError(f"ERR: could not create data dir - {type(e).__name__}")
+
+
+@app.command(name="bench")
+def bench(
+    out: Path = typer.Option(..., "--out", help="results JSON"),
+    suite: str = typer.Option("quick", "--suite", help=f"dataset suite: {', '.join(SUITES)}"),
+    configs: Optional[str] = typer.Option(None, "--configs", help=f"comma-separated run settings, default all: {', '.join(CONFIGS)}"),
+    data_dir: Path = typer.Option(Path(".dprof-bench"), "--data-dir", help="where generated datasets are kept between runs"),
+    repeat: int = typer.Option(3, "--repeat", help="runs per case; the fastest is reported"),
+) -> None:
+    try:
+        args = BenchArgs(out=out, data_dir=data_dir, suite=suite,
+                         configs=parse_patterns(configs) or tuple(CONFIGS),
+                         repeat=repeat)
+        validate_bench_args(args)
+    except UXError as e:
+        typer.secho(f"Error: {e}", err=True)
+        raise typer.Exit(2)
+
+    run_id = str(uuid.uuid4())
+    logger = get_json_logger("app")
+    emit = make_emit(logger, run_id, "bench")
+
+    sys.exit(run_bench(args, emit))
+
+
+@app.command(name="bench-compare")
+def bench_compare(
+    baseline: Path = typer.Option(..., "--baseline", help="stored results JSON"),
+    current: Path = typer.Option(..., "--current", help="new results JSON"),
+    tolerance: float = typer.Option(0.10, "--tolerance", help="flag a rows/s drop larger than this share"),
+    memory_tolerance: float = typer.Option(0.20, "--memory-tolerance", help="flag a peak RSS growth larger than this share"),
+) -> None:
+    for p in (baseline, current):
+        if not p.is_file():
+            typer.secho(f"Error: ERR: results file not found - {p}", err=True)
+            raise typer.Exit(2)
+    if min(tolerance, memory_tolerance) < 0:
+        typer.secho(f"Error: ERR: tolerances must be >= 0", err=True)
+        raise typer.Exit(2)
+
+    run_id = str(uuid.uuid4())
+    logger = get_json_logger("app")
+    emit = make_emit(logger, run_id, "bench")
+
+    sys.exit(run_bench_compare(BenchCompareArgs(baseline, current, tolerance, memory_tolerance), emit))
+
+
 def main() -> None:
     app()
 
@@ -0,0 +1,45 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+
+_HASH_KEY = "dpdd-hash-key-01"
+
+
+def _mix64(x: npt.NDArray[np.uint64]) -> npt.NDArray[np.uint64]:
+    # splitmix64 finalizer, uint64 arithmetic wraps around as intended
+    x = x.copy()
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def hash_array(values: npt.ArrayLike) -> npt.NDArray[np.uint64]:
+    """64-bit hashes of a 1-d array, computed for the whole array at once.
+
+    Numbers are hashed by their bit pattern, so callers must pass one
+    canonical dtype per column (e.g. float64 for numeric columns). Strings
+    and other objects go through pandas' keyed SipHash, which unlike the
+    builtin `hash` is stable across processes.
+    """
+    arr = np.asarray(values)
+    if arr.dtype.kind == "f":
+        arr = arr.astype(np.float64) + 0.0  # -0.0 -> 0.0
+        return _mix64(arr.view(np.uint64))
+    if arr.dtype.kind in "iub":
+        return _mix64(arr.astype(np.int64).view(np.uint64))
+    if arr.dtype.kind == "M":
+        return _mix64(arr.astype("datetime64[ns]").view(np.uint64))
+    return pd.util.hash_array(arr.astype(object), encoding="utf8", hash_key=_HASH_KEY)
+
+
+def file_digest(path: Path) -> str:
+    # содержимое файла целиком, blake2b читает файл блоками
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
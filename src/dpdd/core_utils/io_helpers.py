@@ -1,27 +1,473 @@
+import csv
+import io
+import re
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal, Iterator
-import pandas as pd
+from typing import Any, BinaryIO, Literal
 
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
+from pandas.io.parsers import TextFileReader
 
+from .row_filter import RowFilter
+from .sampling import Sampler
 
 TRUE = {"true", "t", "1", "y", "yes"}
 FALSE = {"false", "f", "0", "n", "no"}
 
+CSV_BLOCK_BYTES = 1 << 20
+# сколько копий чанка живёт одновременно при разборе и обновлении состояния
+WORKING_SET_FACTOR = 4
+# накладные расходы на python-строку в object-колонке pandas
+PY_STR_BYTES = 56
+CSV_PROBE_BYTES = 256 << 10
+# шаг последовательного поиска границ блоков в csv с кавычками
+CSV_SCAN_BYTES = 4 << 20
+MIN_CHUNK_ROWS = 100
+MAX_CHUNK_ROWS = 1_000_000
+MAX_BLOCK_BYTES = 64 << 20
+# колонка читается словарём, если словарная страница не больше этой доли чанка
+DICTIONARY_MAX_SHARE = 0.1
+# каталог для пустого значения ключа, как в Hive/Spark
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
 
-def iter_frames(
-        src: Path,
-        fmt: Literal["csv", "parquet"],
-        chunksize: int
-) -> Iterator[tuple[Path, int, pd.DataFrame]]:
+
+def list_files(src: Path, fmt: Literal["csv", "parquet"]) -> list[Path]:
     if src.is_file():
         all_files = [src]
     elif src.is_dir():
         all_files = list(src.glob(f"*.{fmt}"))
 
-    all_files = sorted(all_files, key=lambda x: x.name)
-    for path in all_files:
+    return sorted(all_files, key=lambda x: x.name)
+
+
+@dataclass(frozen=True)
+class Partitions:
+    # файл и значения его ключей в том виде, как они записаны в пути
+    files: list[tuple[Path, dict[str, str]]]
+    keys: tuple[str, ...]
+    pruned: int
+
+
+def list_partitions(src: Path, fmt: Literal["csv", "parquet"],
+                    partition_filter: RowFilter | None = None) -> Partitions:
+    """Find data files under hive-style directories (`key=value/...`) at any depth.
+
+    Partition keys are parsed from the paths by pyarrow.dataset and are
+    always strings (`month=01` stays "01"); with `partition_filter` (over
+    partition keys only) fragments are pruned before any file is opened.
+    Hidden and `_`-prefixed entries are skipped.
+    """
+    if src.is_file():
+        files = [src]
+    else:
+        files = [p for p in src.rglob(f"*.{fmt}")
+                 if not any(part.startswith((".", "_")) for part in p.relative_to(src).parts)]
+    # пустые файлы не профилируются, а схему по ним pyarrow не выводит
+    files = sorted((p for p in files if p.stat().st_size > 0), key=str)
+    if not files:
+        return Partitions(files=[], keys=(), pruned=0)
+
+    base = src if src.is_dir() else src.parent
+    segments = {p: dict(part.split("=", 1) for part in p.relative_to(base).parent.parts if "=" in part)
+                for p in files}
+    keys = tuple(dict.fromkeys(key for values in segments.values() for key in values))
+    # без вывода типов: иначе month=01 становится int32 1, а фильтр по строке падает
+    partitioning = ds.partitioning(pa.schema([(key, pa.string()) for key in keys]), flavor="hive") if keys else None
+    dataset = ds.dataset([str(p) for p in files], format=fmt, partitioning=partitioning,
+                         partition_base_dir=str(base))
+    expr = None
+    if partition_filter is not None:
+        unknown = partition_filter.columns - set(keys)
+        if unknown:
+            raise ValueError(f"partition filter can use only partition keys {list(keys)} - {sorted(unknown)}")
+        expr = partition_filter.arrow_expression()
+    kept = [(Path(f.path), segments[Path(f.path)]) for f in dataset.get_fragments(filter=expr)]
+    return Partitions(files=sorted(kept, key=lambda x: str(x[0])), keys=keys, pruned=len(files) - len(kept))
+
+
+def _quoted_bounds(f: BinaryIO, start: int, size: int, block_bytes: int) -> tuple[list[int], bool]:
+    # последовательный проход с чётностью кавычек: граница - только после
+    # перевода строки вне кавычек ("" внутри поля чётность не меняет)
+    bounds = [start]
+    target = start + block_bytes
+    inside = 0
+    multiline = False
+    pos = start
+    f.seek(start)
+    while data := f.read(CSV_SCAN_BYTES):
+        arr = np.frombuffer(data, dtype=np.uint8)
+        # 1 - после этого байта мы внутри кавычек
+        state = np.bitwise_xor.accumulate((arr == ord('"')).view(np.uint8)) ^ inside
+        newlines = np.flatnonzero(arr == ord("\n"))
+        quoted = state[newlines] == 1
+        multiline = multiline or bool(quoted.any())
+        ends = pos + newlines[~quoted] + 1
+        while (k := int(np.searchsorted(ends, target))) < len(ends) and ends[k] < size:
+            bounds.append(int(ends[k]))
+            target = bounds[-1] + block_bytes
+        inside = int(state[-1])
+        pos += len(data)
+    return bounds, multiline
+
+
+def csv_blocks(path: Path, block_bytes: int = CSV_BLOCK_BYTES) -> tuple[bytes, list[tuple[int, int]], bool]:
+    """Split a CSV file into the header and byte ranges of ~`block_bytes`.
+
+    Ranges start at line starts and cover every data row exactly once. If
+    the first block contains quotes, the whole file is scanned so that no
+    range starts inside a quoted field; the flag tells whether some quoted
+    field spans lines (the parser then has to allow newlines in values).
+    Without quotes in the first block, boundaries are found by seeking.
+    """
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        header = f.readline()
+        bounds = [f.tell()]
+        if b'"' in f.read(block_bytes):
+            bounds, multiline = _quoted_bounds(f, bounds[0], size, block_bytes)
+            bounds.append(size)
+            return header, [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a], multiline
+        for nominal in range(block_bytes, size, block_bytes):
+            if nominal <= bounds[-1]:
+                continue
+            f.seek(nominal - 1)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return header, [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a], False
+
+
+def _read_block(path: Path, header: bytes, start: int, end: int) -> io.BytesIO:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return io.BytesIO(header + f.read(end - start))
+
+
+def _iter_csv_arrow(path: Path, header: bytes, blocks: Iterable[tuple[int, int]],
+                    usecols: Callable[[str], bool] | None, threads: int,
+                    multiline: bool = False, start: int = 0) -> Iterator[tuple[int, pa.Table]]:
+    # байтовые диапазоны разбираются pyarrow.csv параллельно в потоках, (начало блока, таблица)
+    # выдаются в порядке файла; типы колонок фиксируются по первому блоку;
+    # multiline - в полях в кавычках есть переводы строк (границы блоков их учитывают);
+    # блоки до start пропускаются, но первый всё равно разбирается ради типов
+    names = next(csv.reader([header.decode("utf-8-sig")]))
+    include = [n for n in names if usecols is None or usecols(n)]
+    parse_options = pacsv.ParseOptions(newlines_in_values=multiline)
+
+    def parse(block: tuple[int, int], column_types: pa.Schema | None) -> pa.Table:
+        # блок разбирается одним куском, чтобы вывод типов видел его целиком
+        read_options = pacsv.ReadOptions(use_threads=False,
+                                         block_size=len(header) + block[1] - block[0] + 1)
+        convert = pacsv.ConvertOptions(include_columns=include, column_types=column_types,
+                                       strings_can_be_null=True)
+        try:
+            return pacsv.read_csv(_read_block(path, header, *block), read_options=read_options,
+                                  parse_options=parse_options, convert_options=convert)
+        except pa.ArrowInvalid:
+            if column_types is None:
+                raise
+            # значение не влезло в тип первого блока - блок со своими типами,
+            # профайлер пересмотрит план колонки
+            return parse(block, None)
+
+    blocks = iter(blocks)
+    first = next(blocks, None)
+    if first is None:
+        return
+    table = parse(first, None)
+    # колонка из одних пропусков в первом блоке типа не задаёт
+    schema = pa.schema([f for f in table.schema if not pa.types.is_null(f.type)])
+    if first[0] >= start:
+        yield first[0], table
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending: deque[tuple[int, Future[pa.Table]]] = deque()
+        for block in blocks:
+            if block[0] < start:
+                continue
+            pending.append((block[0], pool.submit(parse, block, schema)))
+            if len(pending) >= 2 * threads:
+                a, table_future = pending.popleft()
+                yield a, table_future.result()
+        while pending:
+            a, table_future = pending.popleft()
+            yield a, table_future.result()
+
+
+@dataclass(frozen=True)
+class ChunkPlan:
+    rows: int
+    bytes_per_row: float
+    block_bytes: int = CSV_BLOCK_BYTES
+
+
+def _csv_probe(path: Path, engine: str, usecols: Callable[[str], bool] | None) -> tuple[float, float]:
+    # (байт в памяти, байт текста) на строку по первому блоку файла
+    with open(path, "rb") as f:
+        head = f.read(CSV_PROBE_BYTES)
+    if len(head) == CSV_PROBE_BYTES and b"\n" in head:
+        head = head[:head.rindex(b"\n") + 1]
+    if engine == "arrow":
+        table = pacsv.read_csv(io.BytesIO(head))
+        if usecols is not None:
+            table = table.select([n for n in table.column_names if usecols(n)])
+        rows, in_memory = table.num_rows, table.nbytes
+    else:
+        df = pd.read_csv(io.BytesIO(head), usecols=usecols)
+        rows, in_memory = len(df), int(df.memory_usage(deep=True, index=False).sum())
+    rows = max(rows, 1)
+    return in_memory / rows, len(head) / (rows + 1)
+
+
+def _parquet_bytes_per_row(path: Path, engine: str, columns: Callable[[str], bool] | None) -> float:
+    # несжатый размер выбранных колонок из метаданных row group'ов
+    md = pq.ParquetFile(path, memory_map=True).metadata
+    if md.num_rows == 0:
+        return 0.0
+    schema = md.schema
+    leaves = [i for i in range(md.num_columns)
+              if columns is None or columns(schema.column(i).path.split(".")[0])]
+    size = sum(md.row_group(rg).column(i).total_uncompressed_size
+               for rg in range(md.num_row_groups) for i in leaves)
+    per_row = size / md.num_rows
+    if engine == "pandas":
+        # строки становятся python-объектами
+        strings = sum(schema.column(i).physical_type == "BYTE_ARRAY" for i in leaves)
+        per_row += strings * PY_STR_BYTES
+    return float(per_row)
+
+
+def plan_chunks(path: Path, fmt: Literal["csv", "parquet"], budget: int,
+                engine: Literal["pandas", "arrow"] = "pandas",
+                columns: Callable[[str], bool] | None = None,
+                csv_reader: Literal["pandas", "arrow"] = "pandas",
+                threads: int = 1,
+                prefetch: int = 0) -> ChunkPlan:
+    """Rows per chunk so that the chunk working set stays within `budget` bytes.
+
+    Bytes per row are estimated from parquet metadata (uncompressed column
+    chunk sizes) or from parsing the first CSV block. The working set is
+    WORKING_SET_FACTOR copies of a chunk; the arrow CSV reader additionally
+    keeps 2 * threads parsed blocks in flight, so its blocks shrink with
+    the budget too; `prefetch` chunks queued ahead count as well. Depends
+    only on the file and the settings, so chunk boundaries are stable for
+    --resume.
+    """
+    if fmt == "parquet":
+        per_row = _parquet_bytes_per_row(path, engine, columns)
+        text_per_row = 0.0
+        in_flight = WORKING_SET_FACTOR
+    else:
+        per_row, text_per_row = _csv_probe(path, engine if csv_reader == "arrow" else "pandas", columns)
+        in_flight = WORKING_SET_FACTOR + (2 * threads if csv_reader == "arrow" else 0)
+
+    in_flight += prefetch
+    rows = int(budget / (max(per_row, 1.0) * in_flight))
+    rows = min(max(rows, MIN_CHUNK_ROWS), MAX_CHUNK_ROWS)
+    block_bytes = CSV_BLOCK_BYTES
+    if fmt == "csv" and csv_reader == "arrow":
+        # блок arrow-ридера - верхняя граница батча
+        block_bytes = min(max(int(rows * text_per_row), 64 << 10), MAX_BLOCK_BYTES)
+    return ChunkPlan(rows=rows, bytes_per_row=round(per_row, 1), block_bytes=block_bytes)
+
+
+def dictionary_columns(pf: pq.ParquetFile, names: list[str] | None = None) -> list[str]:
+    """String columns worth reading as dictionary arrays.
+
+    A column qualifies when every row group has a dictionary page that is
+    small next to the column chunk, i.e. the values repeat a lot; for
+    high-cardinality columns (or ones the writer fell back to PLAIN for)
+    a dictionary would only add a hashing pass.
+    """
+    md = pf.metadata
+    schema = pf.schema_arrow
+    leaf_idx = {md.schema.column(i).path: i for i in range(md.num_columns)}
+    out = []
+    for name in (schema.names if names is None else names):
+        typ = schema.field(name).type
+        if not (pa.types.is_string(typ) or pa.types.is_large_string(typ)) or name not in leaf_idx:
+            continue
+        i = leaf_idx[name]
+        chunks = [md.row_group(rg).column(i) for rg in range(md.num_row_groups)]
+        if chunks and all(c.has_dictionary_page and c.dictionary_page_offset is not None
+                          and c.data_page_offset - c.dictionary_page_offset
+                          <= DICTIONARY_MAX_SHARE * c.total_compressed_size
+                          for c in chunks):
+            out.append(name)
+    return out
+
+
+def _rebatch(batches: Iterator[pa.RecordBatch], size: int) -> Iterator[pa.RecordBatch]:
+    # словарные колонки обрывают батчи pyarrow на границах row group'ов;
+    # склеиваем обратно по size строк (словари объединяются), чтобы границы
+    # чанков не зависели от способа чтения
+    buf: list[pa.RecordBatch] = []
+    rows = 0
+    for batch in batches:
+        buf.append(batch)
+        rows += batch.num_rows
+        if rows < size:
+            continue
+        table = pa.Table.from_batches(buf).combine_chunks()
+        full = rows - rows % size
+        yield from table.slice(0, full).to_batches(max_chunksize=size)
+        buf = table.slice(full).to_batches() if rows > full else []
+        rows -= full
+    if rows:
+        yield from pa.Table.from_batches(buf).combine_chunks().to_batches()
+
+
+@dataclass(frozen=True)
+class ReadPosition:
+    """Where `iter_frames` resumes reading a file without decoding what came before.
+
+    `unit` is a parquet row group index or the byte offset of a CSV block
+    (a line start); `rows` is how many rows of that unit were already
+    consumed (for filtered parquet, rows that passed the filter). `sampler`
+    is the row sampler's generator state and total / kept counters;
+    block sampling needs none, its draws are replayed without reading.
+    """
+    unit: int
+    rows: int = 0
+    sampler: tuple[dict[str, Any], int, int] | None = None
+
+
+class _RecordOffsets:
+    # байтовые смещения записей csv так, как их считает pandas: переводы строк
+    # в кавычках записи не делят, пустые и пробельные строки пропускаются;
+    # файл читается один раз, вперёд, запросы - по неубыванию числа записей
+    def __init__(self, path: Path, start: int) -> None:
+        self.path = path
+        self.start = start
+        self.pos = start
+        self.inside = 0
+        # в незаконченной строке из прошлого куска уже есть не пробельный байт
+        self.open_line = False
+        self.done = 0
+        self.ends = np.empty(0, dtype=np.int64)
+
+    def offset(self, rows: int) -> int:
+        # смещение начала записи с номером rows (от start)
+        if rows == 0:
+            return self.start
+        while self.done + len(self.ends) < rows:
+            with open(self.path, "rb") as f:
+                f.seek(self.pos)
+                data = f.read(CSV_SCAN_BYTES)
+            if not data:
+                return self.pos
+            self.done += len(self.ends)
+            self.ends = self._scan(np.frombuffer(data, dtype=np.uint8))
+        return int(self.ends[rows - self.done - 1])
+
+    def _scan(self, arr: npt.NDArray[np.uint8]) -> npt.NDArray[np.int64]:
+        state = np.bitwise_xor.accumulate((arr == ord('"')).view(np.uint8)) ^ self.inside
+        newlines = np.flatnonzero(arr == ord("\n"))
+        newlines = newlines[state[newlines] == 0]
+        # не пробельные байты до каждого конца строки включительно
+        solid = np.cumsum(~np.isin(arr, (ord(" "), ord("\t"), ord("\r"), ord("\n"))))
+        before = np.concatenate(([0], solid[newlines[:-1]])) if len(newlines) else newlines
+        filled = solid[newlines] - before > 0
+        if len(newlines):
+            filled[0] |= self.open_line
+            self.open_line = bool(solid[-1] - solid[newlines[-1]] > 0)
+        else:
+            self.open_line = self.open_line or bool(solid[-1] > 0)
+        ends: npt.NDArray[np.int64] = self.pos + newlines[filled] + 1
+        self.inside = int(state[-1])
+        self.pos += len(arr)
+        return ends
+
+
+def _counted(unit: int, chunks: Iterable[Any], skip: int = 0) -> Iterator[tuple[int, Any, int]]:
+    # (unit, чанк, строк unit по конец чанка); первые skip строк уже учтены, а границы
+    # чанков внутри unit от запуска к запуску те же - пропускаются целые чанки
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        if rows > skip:
+            yield unit, chunk, rows
+
+
+def _drop_rows(batches: Iterable[pa.RecordBatch], n: int) -> Iterator[pa.RecordBatch]:
+    for batch in batches:
+        if n >= batch.num_rows:
+            n -= batch.num_rows
+            continue
+        yield batch.slice(n)
+        n = 0
+
+
+def _in_row_groups(batches: Iterable[pa.RecordBatch], sizes: list[tuple[int, int]],
+                   skip: int = 0) -> Iterator[tuple[int, pa.RecordBatch, int]]:
+    # батчи iter_batches идут через границы row group'ов; позиция после батча -
+    # row group и число строк в нём (на границе - следующий row group с нуля)
+    i, rows = 0, skip
+    for batch in batches:
+        rows += batch.num_rows
+        while i + 1 < len(sizes) and rows >= sizes[i][1]:
+            rows -= sizes[i][1]
+            i += 1
+        yield sizes[i][0], batch, rows
+
+
+def _read_csv_from(path: Path, offset: int, chunksize: int,
+                   usecols: Callable[[str], bool] | None) -> Iterator[pd.DataFrame]:
+    # чтение с начала записи: имена колонок - из заголовка, сами строки до offset не читаются
+    with open(path, "rb") as f:
+        names = list(pd.read_csv(io.BytesIO(f.readline()), nrows=0).columns)
+        f.seek(offset)
+        yield from pd.read_csv(f, header=None, names=names, chunksize=chunksize, usecols=usecols)
+
+
+def iter_frames(
+        src: Path,
+        fmt: Literal["csv", "parquet"],
+        chunksize: int,
+        engine: Literal["pandas", "arrow"] = "pandas",
+        columns: list[str] | Callable[[str], bool] | None = None,
+        row_filter: RowFilter | None = None,
+        sampler: Sampler | None = None,
+        block_bytes: int = CSV_BLOCK_BYTES,
+        csv_reader: Literal["pandas", "arrow"] = "pandas",
+        threads: int = 1,
+        start: ReadPosition | None = None,
+        positions: dict[int, ReadPosition] | None = None,
+) -> Iterator[tuple[Path, int, pd.DataFrame | pa.RecordBatch]]:
+    # columns: точный список или предикат по имени; невыбранные колонки не читаются
+    # sampler: один на файл; в режиме block невыбранные блоки не декодируются
+    # start: позиция в файле (src - один файл), с которой продолжить чтение;
+    # positions: сюда пишется позиция после каждого выданного чанка (по chunk_idx)
+    if columns is None or callable(columns):
+        selected = columns
+    else:
+        wanted = set(columns)
+        selected = wanted.__contains__
+    keep_block = sampler.keep_block if sampler is not None and sampler.mode == "block" else None
+    row_mask = sampler.row_mask if sampler is not None and sampler.mode == "row" else None
+    if start is not None and start.sampler is not None and sampler is not None:
+        sampler.rng.bit_generator.state, sampler.total, sampler.kept = start.sampler
+
+    def position(unit: int, rows: int) -> ReadPosition:
+        state = None
+        if row_mask is not None and sampler is not None:
+            state = (dict(sampler.rng.bit_generator.state), sampler.total, sampler.kept)
+        return ReadPosition(unit, rows, state)
+
+    for path in list_files(src, fmt):
 
         if path.stat().st_size == 0:
             continue
@@ -29,18 +475,72 @@ def iter_frames(
         chunk_idx = 0
         # csv
         if fmt == "csv":
-            try:
-                reader = pd.read_csv(filepath_or_buffer=path, chunksize=chunksize)
-            except (pd.errors.ParserError, ValueError):
-                raise
+            usecols = selected
+            if row_filter is not None and selected is not None:
+                # колонки фильтра читаем, даже если профилировать их не нужно
+                usecols = lambda c: selected(c) or c in row_filter.columns
+
+            # (unit, чанк, строк unit по конец чанка); unit - смещение блока в байтах
+            chunks: Iterator[tuple[int, Any, int]]
+            offsets = None
+            skip_to, skip = (start.unit, start.rows) if start is not None else (0, 0)
+            if csv_reader == "arrow":
+                header, blocks, multiline = csv_blocks(path, block_bytes)
+                if keep_block is not None:
+                    blocks = [(a, b) for a, b in blocks if keep_block(b - a)]
+                tables = _iter_csv_arrow(path, header, blocks, usecols, threads, multiline, start=skip_to)
+                chunks = (item for a, table in tables
+                          for item in _counted(a, table.to_batches(max_chunksize=chunksize),
+                                               skip if a == skip_to else 0))
+            elif keep_block is not None:
+                header, blocks, _ = csv_blocks(path, block_bytes)
+                # решения по блокам до start повторяются, чтобы генератор сэмплера дошёл до того же места
+                chunks = (item for a, b in blocks if keep_block(b - a) and a >= skip_to
+                          for item in _counted(a, pd.read_csv(_read_block(path, header, a, b),
+                                                              chunksize=chunksize, usecols=usecols),
+                                               skip if a == skip_to else 0))
+            else:
+                frames: TextFileReader | Iterator[pd.DataFrame]
+                if start is None:
+                    with open(path, "rb") as f:
+                        skip_to = len(f.readline())
+                    frames = pd.read_csv(filepath_or_buffer=path, chunksize=chunksize, usecols=usecols)
+                else:
+                    frames = _read_csv_from(path, skip_to, chunksize, usecols)
+                chunks = _counted(skip_to, frames, skip)
+                if positions is not None:
+                    # позиция - смещение следующей записи, его ищет отдельный проход по байтам
+                    offsets = _RecordOffsets(path, skip_to)
 
             try:
-                for chunk in reader:
-                    if chunk.empty or chunk.shape[1] == 0:
-                        continue
+                for unit, chunk, rows in chunks:
+                    if offsets is not None:
+                        unit, rows = offsets.offset(rows), 0
+                    if isinstance(chunk, pa.RecordBatch) and engine != "arrow":
+                        chunk = chunk.to_pandas()
+                    if isinstance(chunk, pa.RecordBatch):
+                        if row_mask is not None:
+                            chunk = chunk.filter(pa.array(row_mask(chunk.num_rows)))
+                        if row_filter is not None:
+                            chunk = chunk.filter(row_filter.arrow_expression())
+                            if selected is not None:
+                                chunk = chunk.select([c for c in chunk.schema.names if selected(c)])
+                        if chunk.num_rows == 0 or chunk.num_columns == 0:
+                            continue
+                    else:
+                        if row_mask is not None:
+                            chunk = chunk[row_mask(len(chunk))]
+                        if row_filter is not None:
+                            chunk = chunk[row_filter.pandas_mask(chunk)]
+                            if selected is not None:
+                                chunk = chunk[[c for c in chunk.columns if selected(c)]]
+                        if chunk.empty or chunk.shape[1] == 0:
+                            continue
+                    if positions is not None:
+                        positions[chunk_idx] = position(unit, rows)
                     yield path, chunk_idx, chunk
                     chunk_idx += 1
-            except (pd.errors.ParserError, ValueError):
+            except (pd.errors.ParserError, pa.ArrowInvalid, ValueError):
                 raise
 
         # parquet
@@ -53,66 +553,283 @@ def iter_frames(
             if pf.metadata.num_rows == 0:
                 continue
 
+            read_cols = None
+            if selected is not None:
+                read_cols = [c for c in pf.schema_arrow.names if selected(c)]
+                if not read_cols:
+                    continue
+
+            # строки с малым числом различных значений остаются словарём:
+            # в pandas это categorical, счётчики считаются по индексам
+            dict_cols = dictionary_columns(pf, read_cols)
+            if dict_cols:
+                pf = pq.ParquetFile(path, memory_map=True, read_dictionary=dict_cols)
+
+            row_groups = []
             for rg_idx in range(pf.metadata.num_row_groups):
                 rg_meta = pf.metadata.row_group(rg_idx)
                 if rg_meta.num_rows == 0:
                     continue
+                if keep_block is not None and not keep_block(rg_meta.num_rows):
+                    continue
+                row_groups.append(rg_idx)
+            skip_to, skip = (start.unit, start.rows) if start is not None else (0, 0)
+            row_groups = [rg for rg in row_groups if rg >= skip_to]
+            if not row_groups:
+                continue
+
+            # (row group, батч, строк row group'а по конец батча)
+            parquet_chunks: Iterator[tuple[int, pa.RecordBatch, int]]
+            if row_filter is None:
+                batches = pf.iter_batches(batch_size=chunksize, row_groups=row_groups,
+                                          columns=read_cols, use_threads=True)
+                if skip:
+                    # row group декодируется с начала, учтённые строки отрезаются
+                    batches = _drop_rows(batches, skip)
+                if dict_cols or skip:
+                    batches = _rebatch(batches, chunksize)
+                sizes = [(rg, pf.metadata.row_group(rg).num_rows) for rg in row_groups]
+                parquet_chunks = _in_row_groups(batches, sizes, skip)
+            else:
+                # фильтр через pyarrow.dataset: row group'ы отсекаются по статистикам;
+                # по одному row group'у, чтобы знать, откуда батч (батчи их границ не пересекают)
+                parquet_format = ds.ParquetFileFormat(
+                    read_options=ds.ParquetReadOptions(dictionary_columns=dict_cols))
+                fragment = next(ds.dataset(path, format=parquet_format).get_fragments())
+                expression = row_filter.arrow_expression()
+                parquet_chunks = (
+                    item for rg in row_groups
+                    for item in _counted(rg, fragment.subset(row_group_ids=[rg]).to_batches(
+                        columns=read_cols, filter=expression, batch_size=chunksize, use_threads=True),
+                        skip if rg == skip_to else 0))
 
             try:
-                for chunk in pf.iter_batches(batch_size=chunksize, use_threads=True):
+                for unit, chunk, rows in parquet_chunks:
+                    if row_mask is not None:
+                        chunk = chunk.filter(pa.array(row_mask(chunk.num_rows)))
                     if chunk.num_rows == 0:
                         continue
-                    yield path, chunk_idx, chunk.to_pandas(types_mapper=None)
+                    if positions is not None:
+                        positions[chunk_idx] = position(unit, rows)
+                    if engine == "arrow":
+                        yield path, chunk_idx, chunk
+                    else:
+                        yield path, chunk_idx, chunk.to_pandas(types_mapper=None)
                     chunk_idx += 1
             except (pa.ArrowInvalid, pa.ArrowIOError, ValueError):
                 raise
 
 
+def warm_file(path: Path, fmt: Literal["csv", "parquet"], nbytes: int = CSV_PROBE_BYTES) -> None:
+    # читает футер parquet / начало csv заранее, чтобы они были в кэше ОС
+    # (на сетевых ФС открытие следующего файла не ждёт round-trip'ов)
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        if fmt == "parquet" and size >= 8:
+            f.seek(size - 8)
+            footer = int.from_bytes(f.read(4), "little")
+            f.seek(max(size - 8 - footer, 0))
+            f.read(footer)
+        else:
+            f.read(nbytes)
+
+
+def parquet_footer_stats(path: Path) -> tuple[int, pa.Schema, dict[str, dict[str, Any]]]:
+    # null_count/min/max числовых и timestamp колонок из статистик row group'ов;
+    # колонка попадает в результат, только если статистики есть во всех row group'ах
+    try:
+        pf = pq.ParquetFile(path, memory_map=True)
+    except (pa.ArrowInvalid, pa.ArrowIOError, ValueError):
+        raise
+
+    md = pf.metadata
+    schema = pf.schema_arrow
+    leaf_idx = {md.schema.column(i).path: i for i in range(md.num_columns)}
+    stats: dict[str, dict[str, Any]] = {}
+    for field in schema:
+        typ = field.type
+        if not (pa.types.is_integer(typ) or pa.types.is_floating(typ) or pa.types.is_timestamp(typ)):
+            continue
+        if field.name not in leaf_idx:
+            continue
+
+        i = leaf_idx[field.name]
+        nulls = 0
+        lo = hi = None
+        complete = True
+        for rg_idx in range(md.num_row_groups):
+            rg_meta = md.row_group(rg_idx)
+            st = rg_meta.column(i).statistics
+            if st is None or not st.has_null_count:
+                complete = False
+                break
+            nulls += st.null_count
+            if st.has_min_max:
+                lo = st.min if lo is None else min(lo, st.min)
+                hi = st.max if hi is None else max(hi, st.max)
+            elif st.null_count != rg_meta.num_rows:
+                complete = False
+                break
+        if complete:
+            stats[field.name] = {"null": nulls, "min": lo, "max": hi}
+
+    return md.num_rows, schema, stats
+
+
 def is_bool_series(s: pd.Series, treshold: float = 0.95) -> bool:
     s_clean = s.dropna()
     if s_clean.empty:
         return False
     bool_rate = s_clean.isin(TRUE | FALSE).mean()
-    return bool_rate >= treshold
+    return bool(bool_rate >= treshold)
+
+
+# форматы строковых дат, проверяемые при определении типа; порядок решает ничьи
+# (месяц первым, как у pd.to_datetime); ISO8601 - разбор pandas, epoch_* - числа
+DATETIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d",
+    "%Y/%m/%d %H:%M:%S", "%Y/%m/%d",
+    "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+    "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d-%m-%Y",
+    "%d %b %Y", "%d %b %Y %H:%M:%S", "%b %d %Y",
+    "ISO8601", "epoch_s", "epoch_ms",
+)
+# правдоподобные метки epoch: 2000-01-01 .. 2100-01-01, в секундах
+_EPOCH_RANGE = (946_684_800, 4_102_444_800)
+# epoch - просто целые числа, id из того же диапазона от них не отличить;
+# такие форматы пробуются, только если в имени колонки есть одно из этих слов
+_TIME_WORDS = {"at", "created", "date", "datetime", "epoch", "modified", "time", "timestamp", "ts", "updated"}
+
+
+def _time_like_name(name: Any) -> bool:
+    # created_at, eventTime, ts_ms -> слова имени без учёта регистра
+    words = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(name)).lower()
+    return not _TIME_WORDS.isdisjoint(re.split(r"[^a-z]+", words))
+
+
+def _arrow_strings(s: pd.Series) -> pa.Array:
+    arr = pa.array(s.astype(str).to_numpy(dtype=object), type=pa.string())
+    return pc.utf8_trim_whitespace(arr)
+
+
+def _parse_fixed(arr: pa.Array, fmt: str) -> pa.Array:
+    # timestamp[ns] без зоны (UTC), null там, где строка не подходит под формат
+    if fmt in ("epoch_s", "epoch_ms"):
+        digits = pc.if_else(pc.match_substring_regex(arr, r"^\d{9,13}$"), arr, None)
+        seconds = pc.cast(digits, pa.int64())
+        if fmt == "epoch_ms":
+            seconds = pc.divide(seconds, 1_000)
+        ok = pc.and_(pc.greater_equal(seconds, _EPOCH_RANGE[0]), pc.less(seconds, _EPOCH_RANGE[1]))
+        unit = 1_000_000_000 if fmt == "epoch_s" else 1_000_000
+        ns = pc.multiply(pc.if_else(ok, pc.cast(digits, pa.int64()), None), unit)
+        return pc.cast(ns, pa.timestamp("ns"))
+    return pc.strptime(arr, format=fmt, unit="ns", error_is_null=True)
+
+
+def _match_rate(arr: pa.Array, fmt: str) -> float:
+    if fmt == "ISO8601":
+        parsed = pd.to_datetime(arr.to_pandas(), format="ISO8601", errors="coerce", utc=True)
+        return float(parsed.notna().mean())
+    return float(1 - _parse_fixed(arr, fmt).null_count / len(arr))
+
 
+def detect_datetime_format(s: pd.Series, threshold: float = 0.95) -> str | None:
+    """The DATETIME_FORMATS entry that parses the most of `s` (a detection
+    sample of non-null strings), if it parses at least `threshold` of it.
+    Epoch formats are only tried when the series name looks time-like.
 
-def is_datetime_series(s: pd.Series, threshold: float = 0.95) -> bool:
+    When no single format does, "mixed" if parsing each row on its own
+    (pandas format="mixed") reaches `threshold`, otherwise None.
+    """
     s_clean = s.dropna()
-    if s_clean.empty:
-        return False
-    dt_rate = pd.to_datetime(s_clean, errors="coerce").notna().mean()
-    return dt_rate >= threshold
+    if s_clean.empty or pd.api.types.is_numeric_dtype(s_clean.dtype):
+        return None
+    arr = _arrow_strings(s_clean)
+    epoch = _time_like_name(s.name)
+    best, best_rate = None, 0.0
+    for fmt in DATETIME_FORMATS:
+        if fmt.startswith("epoch_") and not epoch:
+            continue
+        rate = _match_rate(arr, fmt)
+        if rate > best_rate:
+            best, best_rate = fmt, rate
+            if rate == 1.0:
+                break
+    if best_rate >= threshold:
+        return best
+    # строки в разных форматах: разбор каждой по отдельности
+    mixed = pd.to_datetime(s_clean, errors="coerce", utc=True, format="mixed")
+    return "mixed" if mixed.notna().mean() >= threshold else None
+
+
+def parse_datetimes(s: pd.Series, fmt: str | None) -> tuple[pd.Series, int]:
+    """UTC timestamps of `s` (NaT where unparsable) and the number of rows
+    that needed the slow path.
+
+    With a detected format the whole series goes through the fixed-format
+    parser (pyarrow strptime, or pandas for ISO8601); only rows that do not
+    match it are parsed one by one with format inference. Without a format
+    (or with "mixed") every row is a fallback row.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return pd.to_datetime(s, utc=True), 0
+    if fmt is None or fmt == "mixed":
+        return pd.to_datetime(s, errors="coerce", utc=True, format="mixed"), len(s)
+
+    if fmt == "ISO8601":
+        parsed = pd.to_datetime(s, format="ISO8601", errors="coerce", utc=True)
+    else:
+        ts = _parse_fixed(_arrow_strings(s), fmt)
+        parsed = pd.Series(ts.to_numpy(zero_copy_only=False), index=s.index).dt.tz_localize("UTC")
+    bad = parsed.isna().to_numpy()
+    fallback = int(bad.sum())
+    if fallback:
+        # результат tz_localize может делить память с исходным массивом
+        parsed = parsed.copy()
+        parsed[bad] = pd.to_datetime(s[bad], errors="coerce", utc=True, format="mixed")
+    return parsed, fallback
 
 
-def normalize_numeric_strings(s: pd.Series) -> pd.Series:
-    def _norm(x: str) -> str:
-        x = x.replace(" ", "")
-        x = x.replace("_", "")
-        x = x.replace("\u00A0", "")
-        comas = x.count(",")
-        if comas > 1:
-            x = x.replace(",", "")
-        elif comas == 1:
-            x = x.replace(",", ".")
-        return x
-    return s.map(_norm)
+# то, что pd.to_numeric принимает за число (после нормализации разделителей)
+_NUMBER = r"(?i)^[+-]?(\d+\.?\d*(e[+-]?\d+)?|\.\d+(e[+-]?\d+)?|inf|infinity)$"
+
+
+def parse_numeric_strings(s: pd.Series) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """Parse numbers written as strings like "1 234,5" or "1_000".
+
+    Spaces, NBSP and underscores are dropped; a single comma is a decimal
+    separator, several commas are thousands separators. Runs as Arrow
+    string kernels over the whole series and returns float64 values plus
+    the mask of entries that could not be parsed (NaN in values).
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+        return values, np.isnan(values)
+
+    arr = pa.array(s.astype(str).to_numpy(dtype=object), type=pa.string())
+    arr = pc.utf8_trim_whitespace(arr)
+    for sep in (" ", "_", "\u00A0"):
+        arr = pc.replace_substring(arr, sep, "")
+    commas = pc.count_substring(arr, ",")
+    decimal = pc.replace_substring(arr, ",", ".")
+    if pc.any(pc.greater(commas, 1)).as_py():
+        arr = pc.if_else(pc.greater(commas, 1), pc.replace_substring(arr, ",", ""), decimal)
+    else:
+        arr = decimal
+
+    try:
+        parsed = pc.cast(arr, pa.float64())
+    except pa.ArrowInvalid:
+        parsed = pc.cast(pc.if_else(pc.match_substring_regex(arr, _NUMBER), arr, None), pa.float64())
+    values = parsed.to_numpy(zero_copy_only=False)
+    return values, np.isnan(values)
 
 
 def is_string_series_numeric(s: pd.Series, threshold: float = 0.95) -> bool:
-    s_clean = s.dropna().astype(str).str.strip()
+    s_clean = s.dropna()
     if s_clean.empty:
         return True
-    s_clean = normalize_numeric_strings(s_clean)
-    numeric_rate = pd.to_numeric(s_clean, errors="coerce").notna().mean()
-    return numeric_rate >= threshold
-
-
-def delete_overhead(profile) -> None:
-    for col in profile:
-        s = profile[col]
-        if "original_dtype" in s:
-            del profile[col]["original_dtype"]
-        if "dirty" in s:
-            del profile[col]["dirty"]
-        if "coerce_seen" in s:
-            del profile[col]["coerce_seen"]
+    _, failed = parse_numeric_strings(s_clean)
+    numeric_rate = 1 - failed.mean()
+    return bool(numeric_rate >= threshold)
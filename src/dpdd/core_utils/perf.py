@@ -0,0 +1,93 @@
+import json
+import os
+import resource
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any, TypeVar
+
+from .atomic import atomic_write_text
+
+
+T = TypeVar("T")
+
+
+def peak_rss_bytes(children: bool = False) -> int:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss: килобайты на Linux, байты на macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class PerfRecorder:
+    """Wall time per phase, scanned bytes and an optional chunk timeline.
+
+    Phases are free-form names ("read", "detect", "update.string", ...);
+    `add` sums seconds and calls per phase, and recorders from workers are
+    combined with `merge`, so phase times of a parallel run are summed
+    over processes. With `trace=True` `span` keeps Chrome trace events
+    ("ph": "X", microseconds since the epoch, pid of the process).
+    """
+
+    __slots__ = ("seconds", "calls", "bytes_scanned", "events")
+
+    def __init__(self, trace: bool = False) -> None:
+        self.seconds: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.bytes_scanned = 0
+        self.events: list[dict[str, Any]] | None = [] if trace else None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def timed(self, items: Iterable[T], phase: str) -> Iterator[T]:
+        # время ожидания каждого следующего элемента - например, чтения чанка
+        it = iter(items)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - t)
+                return
+            self.add(phase, time.perf_counter() - t)
+            yield item
+
+    @staticmethod
+    def now_us() -> int:
+        # общие для всех процессов часы, чтобы воркеры легли на одну шкалу
+        return time.time_ns() // 1_000
+
+    def span(self, name: str, start_us: int, cat: str, **args: Any) -> None:
+        if self.events is None:
+            return
+        self.events.append({"name": name, "cat": cat, "ph": "X",
+                            "ts": start_us, "dur": self.now_us() - start_us,
+                            "pid": os.getpid(), "tid": 0, "args": args})
+
+    def merge(self, other: "PerfRecorder") -> None:
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        self.bytes_scanned += other.bytes_scanned
+        if self.events is not None and other.events:
+            self.events.extend(other.events)
+
+    def summary(self, wall: float, rows: int) -> dict[str, Any]:
+        return {"wall_s": round(wall, 6),
+                "rows_per_s": round(rows / wall, 3) if wall > 0 else None,
+                "bytes_scanned": self.bytes_scanned,
+                "mb_per_s": round(self.bytes_scanned / wall / 1e6, 3) if wall > 0 else None,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "peak_rss_children_bytes": peak_rss_bytes(children=True),
+                "phases": {phase: {"seconds": round(seconds, 6), "calls": self.calls[phase]}
+                           for phase, seconds in sorted(self.seconds.items())}}
+
+    def write_trace(self, path: Path) -> None:
+        events = sorted(self.events or [], key=lambda e: (e["pid"], e["ts"]))
+        for pid in sorted({e["pid"] for e in events}):
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                           "args": {"name": "main" if pid == os.getpid() else f"worker {pid}"}})
+        atomic_write_text(path, json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}),
+                          fsync=False)
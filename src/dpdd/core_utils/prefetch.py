@@ -0,0 +1,96 @@
+import queue
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Any, TypeVar
+
+import pandas as pd
+import pyarrow as pa
+
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def frame_nbytes(item: Any) -> int:
+    # (path, chunk_idx, frame) из iter_frames или сам фрейм; object-колонки - по указателям
+    frame = item[-1] if isinstance(item, tuple) else item
+    if isinstance(frame, (pa.RecordBatch, pa.Table)):
+        return int(frame.nbytes)
+    if isinstance(frame, pd.DataFrame):
+        return int(frame.memory_usage(index=False, deep=False).sum())
+    return 0
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+def prefetch(items: Iterable[T], depth: int = 2, max_bytes: int | None = None) -> Iterator[T]:
+    """Produce `items` on a background thread, up to `depth` ahead of the consumer.
+
+    Decoding of chunk N+1 (pyarrow and the pandas C parser release the GIL)
+    overlaps with profiling of chunk N. With `max_bytes` the producer also
+    waits while the queued chunks hold more than that many bytes (at least
+    one chunk is always allowed). Exceptions are re-raised in the consumer;
+    closing the returned generator stops the producer and closes `items`.
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    q: queue.Queue[Any] = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    room = threading.Condition()
+    held = [0]
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        it = iter(items)
+        try:
+            for item in it:
+                size = frame_nbytes(item) if max_bytes is not None else 0
+                if max_bytes is not None:
+                    with room:
+                        while held[0] > 0 and held[0] + size > max_bytes and not stop.is_set():
+                            room.wait(0.1)
+                        held[0] += size
+                if not put((item, size)):
+                    return
+            put((_DONE, 0))
+        except BaseException as e:
+            put((_Failure(e), 0))
+        finally:
+            # генератор закрывается в том же потоке, где выполнялся
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="dprof-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, size = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            if max_bytes is not None:
+                with room:
+                    held[0] -= size
+                    room.notify()
+            yield item
+    finally:
+        stop.set()
+        thread.join()
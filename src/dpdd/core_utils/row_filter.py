@@ -0,0 +1,127 @@
+import ast
+from fnmatch import fnmatchcase
+from collections.abc import Callable
+from typing import Any
+
+import pandas as pd
+import pyarrow.compute as pc
+
+
+_CMP = {ast.Eq: "__eq__", ast.NotEq: "__ne__",
+        ast.Lt: "__lt__", ast.LtE: "__le__",
+        ast.Gt: "__gt__", ast.GtE: "__ge__"}
+
+
+def column_selector(include: tuple[str, ...], exclude: tuple[str, ...]) -> Callable[[str], bool] | None:
+    # glob-шаблоны (fnmatch); None - читать все колонки
+    if not include and not exclude:
+        return None
+
+    def selected(name: str) -> bool:
+        if include and not any(fnmatchcase(str(name), p) for p in include):
+            return False
+        return not any(fnmatchcase(str(name), p) for p in exclude)
+
+    return selected
+
+
+class RowFilter:
+    """Row filter written as a Python-like expression over column names.
+
+    Supports comparisons (== != < <= > >=), `in` / `not in` with a list,
+    `is None` / `is not None`, and `and` / `or` / `not`, e.g.
+    `country in ['DE', 'FR'] and amount > 0`. Columns with names that are not
+    identifiers can be referenced as `col('my column')`.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        try:
+            self.tree = ast.parse(text, mode="eval").body
+        except SyntaxError as e:
+            raise ValueError(f"invalid filter expression - {e.msg}")
+        self.columns: set[str] = set()
+        self._check(self.tree)
+
+    def _column(self, node: ast.AST) -> str | None:
+        if isinstance(node, ast.Name):
+            return node.id
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "col"
+                and len(node.args) == 1 and isinstance(node.args[0], ast.Constant)):
+            return str(node.args[0].value)
+        return None
+
+    def _check(self, node: ast.AST) -> None:
+        if isinstance(node, ast.BoolOp):
+            for v in node.values:
+                self._check(v)
+            return
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            self._check(node.operand)
+            return
+        if not (isinstance(node, ast.Compare) and len(node.ops) == 1):
+            raise ValueError(f"unsupported filter expression - {ast.unparse(node)}")
+
+        name = self._column(node.left)
+        if name is None:
+            raise ValueError(f"left side must be a column - {ast.unparse(node.left)}")
+        self.columns.add(name)
+        op = node.ops[0]
+        try:
+            value = ast.literal_eval(node.comparators[0])
+        except ValueError:
+            raise ValueError(f"unsupported filter operand - {ast.unparse(node.comparators[0])}")
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(value, (list, tuple, set)):
+                raise ValueError("`in` needs a list of values")
+        elif isinstance(op, (ast.Is, ast.IsNot)):
+            if value is not None:
+                raise ValueError("only `is None` / `is not None` are supported")
+        elif type(op) not in _CMP:
+            raise ValueError(f"unsupported operator - {type(op).__name__}")
+
+    def _build(self, node: ast.AST, column: Callable[[str], Any], is_null: Callable[[Any], Any],
+               compare: Callable[[Any, str, Any], Any]) -> Any:
+        if isinstance(node, ast.BoolOp):
+            parts = [self._build(v, column, is_null, compare) for v in node.values]
+            out = parts[0]
+            for part in parts[1:]:
+                out = (out & part) if isinstance(node.op, ast.And) else (out | part)
+            return out
+
+        if isinstance(node, ast.UnaryOp):
+            return ~self._build(node.operand, column, is_null, compare)
+
+        # _check пропускает только сравнения с колонкой слева
+        assert isinstance(node, ast.Compare)
+        name = self._column(node.left)
+        assert name is not None
+        col = column(name)
+        op = node.ops[0]
+        value = ast.literal_eval(node.comparators[0])
+        if isinstance(op, ast.Is):
+            return is_null(col)
+        if isinstance(op, ast.IsNot):
+            return ~is_null(col)
+        if isinstance(op, ast.In):
+            return col.isin(list(value))
+        if isinstance(op, ast.NotIn):
+            return ~col.isin(list(value))
+        return compare(col, _CMP[type(op)], value)
+
+    def arrow_expression(self) -> pc.Expression:
+        return self._build(self.tree, pc.field, lambda e: e.is_null(),
+                           lambda e, op, value: getattr(e, op)(value))
+
+    def pandas_mask(self, df: pd.DataFrame) -> pd.Series:
+        # как в Arrow: сравнение с пропуском даёт NA, которое проходит через
+        # not/and/or по трёхзначной логике и отбрасывается только в конце
+        def column(name: str) -> pd.Series:
+            return df[name]
+
+        def compare(s: pd.Series, op: str, value: Any) -> pd.Series:
+            out: pd.Series = getattr(s, op)(value).astype("boolean")
+            return out.mask(s.isna())
+
+        mask = self._build(self.tree, column, lambda s: s.isna(), compare)
+        return pd.Series(mask, index=df.index).astype("boolean").fillna(False).astype(bool)
@@ -0,0 +1,40 @@
+import zlib
+from typing import Literal
+
+import numpy as np
+import numpy.typing as npt
+
+
+class Sampler:
+    """Per-file sampling decisions for `iter_frames`.
+
+    mode="block" keeps or drops whole read units before they are decoded:
+    parquet row groups or line-aligned CSV byte ranges. mode="row" is a
+    Bernoulli draw per row after decoding. Draws come from one generator
+    seeded by (seed, file name) and are consumed in file order, so a file
+    gets the same sample whatever the chunk size, worker count or engine.
+
+    `total` / `kept` count the units seen and kept (rows, or bytes for CSV
+    blocks); kept / total is the effective sampling rate.
+    """
+
+    def __init__(self, rate: float, mode: Literal["block", "row"] = "block",
+                 seed: int = 0, key: str = "") -> None:
+        self.rate = rate
+        self.mode = mode
+        self.rng = np.random.default_rng([seed, zlib.crc32(key.encode("utf8"))])
+        self.total = 0
+        self.kept = 0
+
+    def keep_block(self, size: int) -> bool:
+        self.total += size
+        keep = self.rate >= 1 or bool(self.rng.random() < self.rate)
+        if keep:
+            self.kept += size
+        return keep
+
+    def row_mask(self, n: int) -> npt.NDArray[np.bool_]:
+        mask = self.rng.random(n) < self.rate
+        self.total += n
+        self.kept += int(mask.sum())
+        return mask
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any
+
+from .atomic import atomic_write_bytes
+from .hashing import file_digest
+
+
+class StateCache:
+    """On-disk cache of per-file partial profile state.
+
+    One entry per (settings, file path). An entry is valid while the
+    file's size and mtime are unchanged; with `strong=True` a changed
+    mtime falls back to comparing a content digest, so touched-but-equal
+    files are still hits. Hits refresh the entry's mtime, and `evict`
+    drops least recently used entries until the cache fits `max_bytes`
+    and `max_entries`.
+
+    Entries are pickles and loading one can run arbitrary code, so `root`
+    must be a trusted directory writable only by the current user.
+    """
+
+    SUFFIX = ".state"
+
+    def __init__(self, root: Path, settings_key: str, strong: bool = False,
+                 max_bytes: int = 1 << 30, max_entries: int = 100_000) -> None:
+        self.root = root
+        self.settings_key = settings_key
+        self.strong = strong
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        root.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, path: Path) -> Path:
+        key = hashlib.sha256(f"{self.settings_key}\0{path.resolve()}".encode("utf8")).hexdigest()
+        return self.root / f"{key}{self.SUFFIX}"
+
+    def get(self, path: Path) -> Any | None:
+        entry = self._entry(path)
+        try:
+            with open(entry, "rb") as f:
+                fingerprint, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        st = path.stat()
+        if (st.st_size, st.st_mtime_ns) != fingerprint["stat"]:
+            if not (self.strong and st.st_size == fingerprint["stat"][0]
+                    and fingerprint.get("digest") == file_digest(path)):
+                self.misses += 1
+                return None
+            # содержимое то же - запоминаем новый mtime
+            fingerprint["stat"] = (st.st_size, st.st_mtime_ns)
+            self._write(entry, fingerprint, value)
+
+        os.utime(entry)
+        self.hits += 1
+        return value
+
+    def put(self, path: Path, value: Any) -> None:
+        st = path.stat()
+        fingerprint: dict[str, Any] = {"stat": (st.st_size, st.st_mtime_ns)}
+        if self.strong:
+            fingerprint["digest"] = file_digest(path)
+        self._write(self._entry(path), fingerprint, value)
+
+    def _write(self, entry: Path, fingerprint: dict[str, Any], value: Any) -> None:
+        # потерянная запись - просто промах, fsync не нужен
+        atomic_write_bytes(entry, pickle.dumps((fingerprint, value), protocol=pickle.HIGHEST_PROTOCOL),
+                           fsync=False)
+
+    def evict(self) -> int:
+        entries = []
+        for entry in self.root.glob(f"*{self.SUFFIX}"):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry))
+        entries.sort(reverse=True)
+
+        kept = 0
+        kept_bytes = 0
+        evicted = 0
+        for _, size, entry in entries:
+            if kept < self.max_entries and kept_bytes + size <= self.max_bytes:
+                kept += 1
+                kept_bytes += size
+                continue
+            entry.unlink(missing_ok=True)
+            evicted += 1
+        return evicted
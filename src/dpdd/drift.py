@@ -0,0 +1,209 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pyarrow.compute as pc
+
+from .core_utils.atomic import atomic_write_text
+from .log_json import Emit
+from .state_file import STATE_NAME, kll_quantile, open_state
+
+
+METRICS = ("null_rate", "mean", "p95")
+ALERT_NAMES = ("null_rate_exceeds_{}", "mean_shift_gt_{}", "p95_shift_gt_{}")
+
+
+@dataclass
+class CompareArgs:
+    left: Path
+    right: tuple[Path, ...]
+    dst: Path
+    null_delta: float = 0.05
+    mean_delta: float = 2.0
+    p95_delta: float = 3.0
+
+    @property
+    def thresholds(self) -> npt.NDArray[np.float64]:
+        return np.array([self.null_delta, self.mean_delta, self.p95_delta])
+
+    def params(self) -> dict[str, float]:
+        return {"null_delta": self.null_delta,
+                "mean_delta": self.mean_delta,
+                "p95_delta": self.p95_delta}
+
+
+@dataclass
+class ProfileMetrics:
+    """Drift metrics of one profile: column names and a (columns x METRICS)
+    float matrix, NaN where a metric is absent. Read from profile.json or,
+    for `.arrow` paths, from the binary state file."""
+
+    columns: pd.Index
+    values: npt.NDArray[np.float64]
+
+    @classmethod
+    def load(cls, path: Path) -> "ProfileMetrics":
+        if path.suffix == ".arrow":
+            return cls.load_state(path)
+        with open(path, "rb") as f:
+            columns = json.load(f)["columns"]
+        names = list(columns)
+        stats = list(columns.values())
+        # None -> NaN при приведении к float
+        null = np.array([c.get("null") for c in stats], dtype=np.float64)
+        non_null = np.array([c.get("non_null") for c in stats], dtype=np.float64)
+        numeric = [c.get("numeric") or {} for c in stats]
+        mean = np.array([n.get("mean") for n in numeric], dtype=np.float64)
+        p95 = np.array([n.get("p95") for n in numeric], dtype=np.float64)
+        return cls._build(names, null, non_null, mean, p95)
+
+    @classmethod
+    def load_state(cls, path: Path) -> "ProfileMetrics":
+        # из бинарного состояния читаются только нужные поля, p95 - прямо из элементов KLL
+        table, _ = open_state(path, fields=("name", "null", "non_null", "numeric"))
+        numeric = table["numeric"].combine_chunks()
+        null = table["null"].to_numpy().astype(np.float64)
+        non_null = table["non_null"].to_numpy().astype(np.float64)
+        s = pc.struct_field(numeric, "s").to_numpy(zero_copy_only=False)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(non_null > 0, s / non_null, np.nan)
+        p95 = kll_quantile(numeric, 0.95)
+        return cls._build(table["name"].to_pylist(), null, non_null, mean, p95)
+
+    @classmethod
+    def _build(cls, names: list[str],
+               null: npt.NDArray[np.float64], non_null: npt.NDArray[np.float64],
+               mean: npt.NDArray[np.float64], p95: npt.NDArray[np.float64]) -> "ProfileMetrics":
+        total = null + non_null
+        with np.errstate(divide="ignore", invalid="ignore"):
+            null_rate = np.where(total > 0, null / total, np.nan)
+        return cls(pd.Index(names, dtype=object), np.column_stack([null_rate, mean, p95]))
+
+    def align(self, columns: pd.Index) -> npt.NDArray[np.float64]:
+        # строки матрицы в порядке columns, отсутствующие колонки - NaN
+        idx = self.columns.get_indexer(columns)
+        if len(self.values) == 0:
+            return np.full((len(columns), len(METRICS)), np.nan)
+        out = self.values[idx]
+        out[idx < 0] = np.nan
+        return out
+
+
+@dataclass
+class Drift:
+    columns: pd.Index
+    left: npt.NDArray[np.float64]
+    right: npt.NDArray[np.float64]
+    delta: npt.NDArray[np.float64]
+    alerts: npt.NDArray[np.bool_]
+
+    @property
+    def alerts_total(self) -> int:
+        return int(self.alerts.sum())
+
+
+def compute_drift(left: ProfileMetrics, right: ProfileMetrics,
+                  thresholds: npt.NDArray[np.float64]) -> Drift:
+    """Deltas right - left of every metric of every column in one pass.
+
+    Columns present in only one profile get NaN deltas and never alert.
+    """
+    columns = left.columns.append(right.columns.difference(left.columns, sort=False))
+    lv = left.align(columns)
+    rv = right.align(columns)
+    delta = rv - lv
+    with np.errstate(invalid="ignore"):
+        alerts = np.abs(delta) > thresholds
+    return Drift(columns, lv, rv, delta, alerts)
+
+
+def _json_matrix(values: npt.NDArray[np.float64]) -> list[list[Any]]:
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    rows: list[list[Any]] = out.tolist()
+    return rows
+
+
+def drift_to_dict(drift: Drift, args: CompareArgs) -> dict[str, Any]:
+    names = [fmt.format(t) for fmt, t in zip(ALERT_NAMES, args.thresholds.tolist())]
+    keys = [f"{m}_{side}" for m in METRICS for side in ("left", "right", "delta")]
+    # left/right/delta по каждой метрике подряд, в порядке keys
+    values = np.stack([drift.left, drift.right, drift.delta], axis=2).reshape(len(drift.columns), -1)
+
+    columns = {}
+    for name, row, fired in zip(drift.columns.tolist(), _json_matrix(values), drift.alerts.tolist()):
+        col = dict(zip(keys, row))
+        col["alerts"] = [n for n, f in zip(names, fired) if f]
+        columns[name] = col
+
+    return {"params": args.params(),
+            "columns": columns,
+            "summary": {"alerts_total": drift.alerts_total}}
+
+
+def drift_out_path(args: CompareArgs, right: Path) -> Path:
+    if len(args.right) == 1:
+        return args.dst / "drift.json"
+    # пакетный режим: <dst>/<имя каталога профиля>.drift.json
+    name = right.parent.name if right.name in ("profile.json", STATE_NAME) else right.stem
+    return args.dst / f"{name}.drift.json"
+
+
+def _emit_alerts(drift: Drift, args: CompareArgs, right: Path, emit: Emit) -> None:
+    thresholds = args.thresholds
+    for i, m in zip(*np.nonzero(drift.alerts)):
+        emit(level="WARN",
+             event="compare_alert",
+             right_path=str(right),
+             column=drift.columns[i],
+             kind=METRICS[m],
+             value=float(drift.delta[i, m]),
+             threshold=float(thresholds[m]))
+
+
+def run_compare(args: CompareArgs, emit: Emit) -> int:
+    thresholds = args.thresholds
+    try:
+        left = ProfileMetrics.load(args.left)
+    except Exception as e:
+        emit(level="ERROR",
+             event="compare_failed",
+             left_path=str(args.left),
+             exception_type=type(e).__name__,
+             exception_msg=str(e))
+        return 4
+
+    failed = 0
+    for right_path in args.right:
+        emit(level="INFO",
+             event="compare_started",
+             left_path=str(args.left),
+             right_path=str(right_path),
+             thresholds=args.params())
+        try:
+            drift = compute_drift(left, ProfileMetrics.load(right_path), thresholds)
+            _emit_alerts(drift, args, right_path, emit)
+            out = drift_out_path(args, right_path)
+            atomic_write_text(out, json.dumps(drift_to_dict(drift, args), ensure_ascii=False,
+                                              sort_keys=True, separators=(",", ":")))
+        except Exception as e:
+            # в пакетном режиме один битый профиль не останавливает остальные
+            failed += 1
+            emit(level="ERROR",
+                 event="compare_failed",
+                 right_path=str(right_path),
+                 exception_type=type(e).__name__,
+                 exception_msg=str(e))
+            continue
+
+        emit(level="INFO",
+             event="compare_completed",
+             right_path=str(right_path),
+             alerts_total=drift.alerts_total,
+             out_path=str(out))
+
+    return 4 if failed else 0
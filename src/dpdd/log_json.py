@@ -1,12 +1,16 @@
 import logging
 import json
+import queue
 import sys
 import os
+import threading
+import time as _time
+from collections.abc import Callable, Iterable
 from pathlib import Path
 from uuid import UUID
 from decimal import Decimal
 from datetime import datetime, timezone, date, time
-from typing import Any
+from typing import Any, TextIO
 
 
 LOG_MAP = {"DEBUG": logging.DEBUG,
@@ -19,6 +23,12 @@ LOG_MAP = {"DEBUG": logging.DEBUG,
 type JSONScalar = str | int | float | bool | None
 type JSON = JSONScalar | list[JSON] | dict[str, JSON]
 
+# emit(level=..., event=..., **payload) из make_emit
+type Emit = Callable[..., None]
+
+# типы, которые json.dumps пишет как есть - такой payload не нужно приводить
+_FLAT_TYPES = frozenset({str, int, float, bool, type(None)})
+
 
 def time_now_iso() -> str:
     return (datetime.now(timezone.utc)
@@ -26,6 +36,12 @@ def time_now_iso() -> str:
             .replace("+00:00", "Z"))
 
 
+def _iso_from_ts(ts: float) -> str:
+    return (datetime.fromtimestamp(ts, timezone.utc)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", "Z"))
+
+
 def coerce_val(val: Any) -> JSON:
     if isinstance(val, (tuple, set)):
         return coerce_val(list(val))
@@ -43,10 +59,9 @@ def coerce_val(val: Any) -> JSON:
         dt = val
         if val.tzinfo is None:
             dt = val.replace(tzinfo=timezone.utc)
-        dt = (dt.astimezone(timezone.utc)
+        return (dt.astimezone(timezone.utc)
                 .isoformat(timespec="milliseconds")
                 .replace("+00:00", "Z"))
-        return dt
     if isinstance(val, (date, time)):
         return val.isoformat()
 
@@ -59,8 +74,23 @@ class JsonFormatter(logging.Formatter):
 
     def format(self, rec: logging.LogRecord) -> str:
         level = self.LEVEL_MAP.get(rec.levelname, rec.levelname)
-        obj: dict[str, JSON] = {"ts": time_now_iso(),
-                               "level": level}
+        # время события, а не записи: в очереди запись может отстать
+        ts = _iso_from_ts(rec.created)
+        payload = getattr(rec, "payload", None)
+        if (isinstance(rec.msg, dict) and not rec.msg and isinstance(payload, dict)
+                and "event" in payload
+                and all(type(v) in _FLAT_TYPES for v in payload.values())):
+            # быстрый путь emit: плоский payload без вложенных/особых значений
+            obj: dict[str, JSON] = {"ts": ts, "level": level, "event": payload["event"]}
+            run_id = getattr(rec, "run_id", None)
+            component = getattr(rec, "component", None)
+            if run_id:    obj["run_id"] = run_id
+            if component: obj["component"] = component
+            obj.update(payload)
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+        obj = {"ts": ts,
+               "level": level}
         if isinstance(rec.msg, dict):
             if rec.msg:
                 obj.update(rec.msg)
@@ -69,24 +99,94 @@ class JsonFormatter(logging.Formatter):
                     obj["message"] = "<payload-without-event>"
             else:
                 obj["event"] = "message"
-                obj["message"] = "<dict-without-event>"
+                if not (isinstance(payload, dict) and "event" in payload):
+                    obj["message"] = "<dict-without-event>"
         else:
             obj["event"] = "message"
             obj["message"] = rec.getMessage()
 
         run_id = getattr(rec, "run_id", None)
         component = getattr(rec, "component", None)
-        payload = getattr(rec, "payload", None)
         if run_id:    obj["run_id"] = run_id
         if component: obj["component"] = component
         if isinstance(payload, dict):
             obj.update(payload)
 
-        obj = coerce_val(obj)
-        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(coerce_val(obj), ensure_ascii=False, separators=(",", ":"))
+
+
+class QueueJsonHandler(logging.Handler):
+    """Handler that only puts records on a queue; a writer thread formats
+    them and writes whole batches to `stream` with one write and flush each.
+
+    Records keep emit order. `flush` waits until everything queued so far
+    is written, `close` (also run by logging.shutdown at exit) drains the
+    queue and stops the thread. In a forked child the thread does not
+    exist, so there records are written synchronously.
+    """
 
+    _STOP = object()
 
-def get_json_logger(name: str, level: str | None = None) -> logging.Logger:
+    def __init__(self, stream: TextIO, batch: int = 1024) -> None:
+        super().__init__()
+        self.stream = stream
+        self.batch = batch
+        # SimpleQueue: put без блокировок Python-уровня, дешевле queue.Queue
+        self.queue: queue.SimpleQueue[object] = queue.SimpleQueue()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="json-log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if os.getpid() != self._pid:
+            self._write([record])
+            return
+        self.queue.put(record)
+
+    def _write(self, records: list[logging.LogRecord]) -> None:
+        lines = []
+        for rec in records:
+            try:
+                lines.append(self.format(rec))
+            except Exception:
+                self.handleError(rec)
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[0])
+
+    def _run(self) -> None:
+        q = self.queue
+        while True:
+            items = [q.get()]
+            while len(items) < self.batch and not q.empty():
+                items.append(q.get())
+            records = [item for item in items if isinstance(item, logging.LogRecord)]
+            self._write(records)
+            # маркеры flush/close - после записи всего, что было до них
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is self._STOP for item in items):
+                return
+
+    def flush(self) -> None:
+        if self._thread.is_alive() and os.getpid() == self._pid:
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self) -> None:
+        if self._thread.is_alive() and os.getpid() == self._pid:
+            self.queue.put(self._STOP)
+            self._thread.join()
+        super().close()
+
+
+def get_json_logger(name: str, level: str | None = None, queued: bool = True) -> logging.Logger:
     logger = logging.getLogger(name)
     env_lvl = os.getenv("LOG_LEVEL", "INFO").upper()
     if level is None:
@@ -106,25 +206,66 @@ def get_json_logger(name: str, level: str | None = None) -> logging.Logger:
     if not any(isinstance(h, logging.StreamHandler)
                and getattr(h, "_is_json_stdout", False)
                for h in logger.handlers):
-        h = logging.StreamHandler(sys.stdout)
+        h = QueueJsonHandler(sys.stdout) if queued else logging.StreamHandler(sys.stdout)
         h.setLevel(lvl)
         h.setFormatter(JsonFormatter())
-        h._is_json_stdout = True
+        setattr(h, "_is_json_stdout", True)
         logger.addHandler(h)
-    logger._json_inited = True
+    setattr(logger, "_json_inited", True)
 
     return logger
 
 
-def make_emit(logger: logging.Logger, run_id: str, component: str):
-    def emit(level: str = "INFO", event: str = "message", **payload) -> None:
+def make_emit(logger: logging.Logger, run_id: str, component: str) -> Emit:
+    def emit(level: str = "INFO", event: str = "message", **payload: Any) -> None:
         lvl = LOG_MAP.get(level.upper(), logging.INFO)
+        if not logger.isEnabledFor(lvl):
+            return
         event = event if event.strip() else "message"
         extra = {
                        "run_id": run_id,
                        "component": component,
                        "payload": {"event": event, **payload}
                 }
-        logger.log(lvl, {}, extra=extra)
+        # makeRecord напрямую: logger.log ещё и ищет вызывающего по стеку
+        logger.handle(logger.makeRecord(logger.name, lvl, "(emit)", 0, {}, (), None, extra=extra))
 
     return emit
+
+
+def throttle_emit(emit: Emit,
+                  events: Iterable[str] = ("profile_chunk_scanned",),
+                  every: int = 1,
+                  seconds: float = 0.0) -> Emit:
+    """Thin out high-volume INFO `events`; everything else passes as is.
+
+    Counted per (event, path): the first event always passes, later ones
+    only once `every` of them have arrived and `seconds` have passed since
+    the last one let through. A passed event carries `suppressed`, the
+    number dropped before it, so totals can still be reconstructed.
+    """
+    if every <= 1 and seconds <= 0:
+        return emit
+    events = frozenset(events)
+    # (event, path) -> [событий с последнего пропущенного, его время]
+    state: dict[tuple[str, Any], list[float]] = {}
+
+    def throttled(level: str = "INFO", event: str = "message", **payload: Any) -> None:
+        if event not in events or level.upper() != "INFO":
+            emit(level=level, event=event, **payload)
+            return
+        key = (event, payload.get("path"))
+        now = _time.monotonic()
+        st = state.get(key)
+        if st is None:
+            state[key] = [0, now]
+            emit(level=level, event=event, suppressed=0, **payload)
+            return
+        st[0] += 1
+        if st[0] < every or now - st[1] < seconds:
+            return
+        suppressed = st[0] - 1
+        st[0], st[1] = 0, now
+        emit(level=level, event=event, suppressed=suppressed, **payload)
+
+    return throttled
@@ -1,24 +1,52 @@
-from datetime import datetime, timezone
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
 import json
 import os
+import pickle
+import time
 
-from collections import Counter
-from collections.abc import Hashable
-from typing import Any
+from typing import Any, Literal, cast
 from pandas._typing import DtypeObj
-from dataclasses import dataclass
-from math import sqrt
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from collections.abc import Callable, Iterator
 
-from .core_utils.io_helpers import (delete_overhead,
-                                    iter_frames,
+from .core_utils.atomic import atomic_write_bytes, atomic_write_text
+from .core_utils.io_helpers import (iter_frames,
+                                    plan_chunks,
+                                    warm_file,
+                                    CSV_BLOCK_BYTES,
+                                    list_files,
+                                    list_partitions,
+                                    ReadPosition,
+                                    HIVE_DEFAULT_PARTITION,
+                                    parquet_footer_stats,
                                     is_bool_series,
-                                    is_datetime_series,
-                                    is_string_series_numeric, normalize_numeric_strings, TRUE, FALSE)
-from dpdd.log_json import time_now_iso
+                                    detect_datetime_format,
+                                    parse_datetimes,
+                                    is_string_series_numeric, parse_numeric_strings, TRUE)
+from .core_utils.row_filter import RowFilter, column_selector
+from .core_utils.perf import PerfRecorder
+from .core_utils.prefetch import prefetch
+from .core_utils.sampling import Sampler
+from .core_utils.state_cache import StateCache
+from .state_file import STATE_NAME, open_state, read_correlations, read_state, write_state
+from dpdd.log_json import Emit, time_now_iso
+from dpdd.accumulators import (BoolAcc, ColumnState, CoercionAcc, CorrelationAcc, DatetimeAcc,
+                               NumericAcc, StringAcc)
+from dpdd.sketches import HyperLogLog
 
 THRESHOLD = 0.95
+QUANTILE_K = 200
+TOPK_CAPACITY = 1024
+EXACT_TOPK = False
+HLL_PRECISION = 12
+DETECT_SAMPLE = 1_000
 
 @dataclass
 class ProfileArgs:
@@ -29,295 +57,1019 @@ class ProfileArgs:
     chunksize: int
     topk: int
     threshold: float
+    percentiles: tuple[float, ...] = (50.0, 95.0, 99.0)
+    quantile_k: int = QUANTILE_K
+    topk_capacity: int = TOPK_CAPACITY
+    exact_topk: bool = EXACT_TOPK
+    hll_precision: int = HLL_PRECISION
+    workers: int = 1
+    engine: str = "pandas"
+    stats_only: bool = False
+    columns: tuple[str, ...] = ()
+    exclude_columns: tuple[str, ...] = ()
+    row_filter: str | None = None
+    detect_sample: int = DETECT_SAMPLE
+    sample_mode: str = "block"
+    seed: int = 0
+    csv_reader: str = "pandas"
+    cache: bool = True
+    cache_dir: Path | None = None
+    cache_hash: bool = False
+    cache_max_mb: int = 1024
+    resume: bool = False
+    checkpoint_rows: int = 0
+    checkpoint_seconds: float = 300.0
+    perf: bool = False
+    trace: Path | None = None
+    max_memory: int | None = None
+    prefetch: int = 2
+    partitioning: str | None = None
+    partition_filter: str | None = None
+    per_partition: str | None = None
+    correlations: bool = False
 
 
-type StatDTypeScalar = float | int | str | datetime | Counter[Hashable]
-type StatDict   = dict[str, "Stat"]
-type Stat       = StatDTypeScalar | StatDict
+def _new_numeric() -> NumericAcc:
+    return NumericAcc(QUANTILE_K)
 
 
-def _init_column_state(name: str, dt: DtypeObj, s: pd.Series) -> StatDict:
-    stat: StatDict = {}
-    extra: Stat = {}
-    stat["original_dtype"] = str(dt)
-    stat["non_null"] = 0
-    stat["null"] = 0
+def _new_string() -> StringAcc:
+    return StringAcc(TOPK_CAPACITY, exact=EXACT_TOPK)
+
+
+def _init_column_state(name: str, dt: DtypeObj, s: pd.Series) -> ColumnState:
+    # тип решается один раз по ограниченной выборке и пересматривается,
+    # только если у следующего чанка меняется семейство dtype
+    s = s.dropna().head(DETECT_SAMPLE)
+    if isinstance(dt, pd.CategoricalDtype):
+        # словарная колонка решается как колонка её значений
+        dt = dt.categories.dtype
+        s = s.astype(dt)
+    stat = ColumnState(str(dt), "string", HyperLogLog(HLL_PRECISION),
+                       dtype_family(dt) if not s.empty else None)
 
     if pd.api.types.is_bool_dtype(dt) or is_bool_series(s, THRESHOLD):
         # булевая колонка
-        stat["type"] = "bool"
-        extra["true_count"] = 0
-        extra["false_count"] = 0
-        extra["true_rate"] = -1.0
+        stat.type = "bool"
+        stat.bool = BoolAcc()
 
     elif pd.api.types.is_numeric_dtype(dt):
         # числовая колонка
-        stat["type"] = "numeric"
-        extra["s"] = 0.0
-        extra["s2"] = 0.0
-        extra["min"] = float("inf")
-        extra["max"] = float("-inf")
+        stat.type = "numeric"
+        stat.numeric = _new_numeric()
 
     elif pd.api.types.is_string_dtype(dt) or dt == object:
         # строковая колонка
 
-        if is_datetime_series(s, THRESHOLD):
-            stat["type"] = "datetime"
-            extra["min_dt"] = datetime.max.replace(tzinfo=timezone.utc)
-            extra["max_dt"] = datetime.min.replace(tzinfo=timezone.utc)
+        # формат определяется один раз и дальше разбирает чанки без угадывания
+        fmt = detect_datetime_format(s, THRESHOLD)
+        if fmt is not None:
+            stat.type = "datetime"
+            stat.datetime = DatetimeAcc(fmt)
 
         elif is_bool_series(s, THRESHOLD):
-            stat["type"] = "bool"
-            extra["true_count"] = 0
-            extra["false_count"] = 0
-            extra["true_rate"] = -1.0
+            stat.type = "bool"
+            stat.bool = BoolAcc()
 
         elif is_string_series_numeric(s, THRESHOLD):
-            stat["type"] = "numeric"
-            stat["dirty"] = True
-            extra["s"] = 0.0
-            extra["s2"] = 0.0
-            extra["min"] = float("inf")
-            extra["max"] = float("-inf")
+            stat.type = "numeric"
+            stat.dirty = True
+            stat.coercion = CoercionAcc()
+            stat.numeric = _new_numeric()
 
         else:
-            stat["type"] = "string"
-            extra["sum_len"] = 0
-            extra["min_len"] = float("inf")
-            extra["max_len"] = float("-inf")
-            extra["counter"] = Counter()
+            stat.string = _new_string()
 
-    elif pd.api.types.is_datetime64_any_dtype(dt) or is_datetime_series(s, THRESHOLD):
+    elif pd.api.types.is_datetime64_any_dtype(dt):
         # datetime колонка
-        stat["type"] = "datetime"
-        extra["min_dt"] = datetime.max.replace(tzinfo=timezone.utc)
-        extra["max_dt"] = datetime.min.replace(tzinfo=timezone.utc)
+        stat.type = "datetime"
+        stat.datetime = DatetimeAcc()
 
-    else:
-        extra = {"msg": "unexpected column dtype"}
+    elif (isinstance(dt, pd.CategoricalDtype)
+          and (fmt := detect_datetime_format(s, THRESHOLD)) is not None):
+        # словарная колонка дат (parquet read_dictionary)
+        stat.type = "datetime"
+        stat.datetime = DatetimeAcc(fmt)
 
-    if stat["type"] == "int" or stat["type"] == "float":
-        stat["numeric"] = extra
     else:
-        stat[stat["type"]] = extra
+        # прочие dtype (category, timedelta, ...) профилируем как строки
+        stat.string = _new_string()
 
     return stat
 
 
-def _init_df_profile_state(df: pd.DataFrame) -> dict[str, StatDict]:
-    profile: dict[str, StatDict] = {}
+def _init_footer_state(typ: pa.DataType, rows: int, footer: dict[str, Any]) -> ColumnState:
+    # состояние колонки только из статистик футера parquet: без моментов,
+    # квантилей и HLL, которые требуют чтения данных
+    nulls = footer["null"]
+    if pa.types.is_timestamp(typ):
+        stat = ColumnState(f"datetime64[ns, {typ.tz}]" if typ.tz else "datetime64[ns]", "datetime")
+        stat.datetime = DatetimeAcc()
+        if footer["min"] is not None:
+            stat.datetime.update(_utc_timestamp(footer["min"]), _utc_timestamp(footer["max"]))
+    else:
+        # тип - по схеме Arrow: int-колонка с пропусками при сканировании бывает int или
+        # float в зависимости от чанка, поэтому остаётся общим numeric
+        is_float = pa.types.is_floating(typ)
+        typ_name = "float" if is_float else "int" if nulls == 0 else "numeric"
+        stat = ColumnState(str(typ.to_pandas_dtype().__name__), typ_name)
+        stat.numeric = NumericAcc(None)
+        if footer["min"] is not None:
+            # + 0.0: футер хранит -0.0 как min и 0.0 как max
+            stat.numeric.min = float(footer["min"]) + 0.0 if is_float else footer["min"]
+            stat.numeric.max = float(footer["max"]) + 0.0 if is_float else footer["max"]
+    stat.non_null = rows - nulls
+    stat.null = nulls
+    return stat
+
+
+def _utc_timestamp(value: Any) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _init_df_profile_state(df: pd.DataFrame) -> dict[str, ColumnState]:
+    profile: dict[str, ColumnState] = {}
     for col in df.columns:
         profile[col] = _init_column_state(col, df[col].dtype, df[col])
 
     return profile
 
 
-def update_profile(profile: dict[str, Any], df: pd.DataFrame, emit) -> None:
+NUMERIC_TYPES = ("numeric", "int", "float")
+
+
+def dtype_family(dt: DtypeObj) -> str:
+    if isinstance(dt, pd.CategoricalDtype):
+        dt = dt.categories.dtype
+    if pd.api.types.is_bool_dtype(dt):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dt):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dt):
+        return "datetime"
+    return "object"
+
+
+def _refresh_plan(profile: dict[str, ColumnState], col: str, s: pd.Series, family: str) -> ColumnState:
+    stat = profile[col]
+    sample = s.dropna().head(DETECT_SAMPLE)
+    if sample.empty:
+        return stat
+
+    if stat.non_null == 0:
+        # до сих пор были одни пропуски - решаем заново по живым данным
+        fresh = _init_column_state(col, s.dtype, s)
+        fresh.null = stat.null
+        fresh.coerce_seen = stat.coerce_seen
+        profile[col] = fresh
+        return fresh
+
+    if is_string_series_numeric(sample, THRESHOLD):
+        _mark_numeric(stat)
+    stat.dtype_family = family
+    return stat
+
+
+def _mark_numeric(stat: ColumnState) -> None:
+    if stat.original_dtype == "object":
+        stat.dirty = True
+        if stat.coercion is None:
+            stat.coercion = CoercionAcc()
+    stat.type = "numeric"
+    if stat.numeric is None:
+        stat.numeric = _new_numeric()
+
+
+def _update_phase(stat: ColumnState) -> str:
+    if stat.type in NUMERIC_TYPES:
+        return "update.numeric_coerced" if stat.dirty else "update.numeric"
+    return f"update.{stat.type}"
+
+
+def update_profile(profile: dict[str, ColumnState], df: pd.DataFrame, emit: Emit,
+                   perf: PerfRecorder | None = None,
+                   numeric_out: dict[str, npt.NDArray[np.float64]] | None = None) -> None:
+    # numeric_out: сюда кладутся значения числовых колонок, выровненные по строкам
+    # чанка (NaN - пропуск или неразобранная строка) - для --correlations
     for col in df.columns:
         s = df[col]
         stat = profile[col]
-        dirty_numeric_string: bool = is_string_series_numeric(s, THRESHOLD)
-        dirty = stat.get("dirty", False)
+        family = dtype_family(s.dtype)
+        if family != stat.dtype_family:
+            t = time.perf_counter()
+            stat = _refresh_plan(profile, col, s, family)
+            if perf is not None:
+                perf.add("detect", time.perf_counter() - t)
+        t = time.perf_counter()
+        phase = _update_phase(stat) if perf is not None else None
         non_null_inc = int(s.notna().sum())
-        stat["non_null"] += non_null_inc
-        stat["null"] += len(s) - non_null_inc
-        # extra = stat["extra"]
-
-        s_clean = s.copy().dropna()
-
-        if dirty_numeric_string:
-            if "dirty" not in stat and stat["original_dtype"] == "object":
-                stat["dirty"] = True
-            stat["type"] = "numeric"
-            if "numeric" not in stat:
-                extra = {}
-                extra["s"] = 0.0
-                extra["s2"] = 0.0
-                extra["min"] = float("inf")
-                extra["max"] = float("-inf")
-                stat["numeric"] = extra
-            if "coercion" not in stat and stat["original_dtype"] == "object":
-                extra = {}
-                extra["kind"] = "numeric"
-                extra["coerced_nulls"] = 0
-                extra["total"] = 0
-                extra["rate"] = 0.0
-                stat["coercion"] = extra
-
-        # ------------- ЧАСТЬ С ДОБАВЛЕНИЕМ МЕТРИКИ STRING НА MIXED КОЛОНКУ -------------
-        # if dirty and not dirty_numeric_string:
-        #     stat["type"] = "string"
-        #     if "string" not in stat:
-        #         extra = {}
-        #         extra["sum_len"] = 0
-        #         extra["min_len"] = float("inf")
-        #         extra["max_len"] = float("-inf")
-        #         extra["counter"] = Counter()
-        #         stat["string"] = extra
-
-        if stat["type"] == "numeric":
+        stat.non_null += non_null_inc
+        stat.null += len(s) - non_null_inc
+
+        s_clean = s.dropna()
+
+        if stat.type in NUMERIC_TYPES:
             # числовая колонка
-            extra = stat["numeric"]
-            if "int" in stat["original_dtype"]:
-                stat["type"] = "int"
-            elif "float" in stat["original_dtype"]:
-                stat["type"] = "float"
-            if dirty:
-                s_clean = normalize_numeric_strings(s_clean)
-                non_null_coerce = pd.to_numeric(s_clean, errors="coerce").notna().sum()
+            if "int" in stat.original_dtype:
+                stat.type = "int"
+            elif "float" in stat.original_dtype:
+                stat.type = "float"
+            if stat.dirty:
+                # один проход: значения и маска неразобранных строк
+                values, failed = parse_numeric_strings(s_clean)
                 total = len(s_clean)
-                nulls_coerced = int(total - non_null_coerce)
-                rate = non_null_coerce / total
-                if not stat.get("coerce_seen", False):
+                nulls_coerced = int(failed.sum())
+                if not stat.coerce_seen:
                     emit(level="WARN",
                         event="profile_column_coercion",
                         column=col,
-                        kind=stat["type"],
+                        kind=stat.type,
                         coerced_nulls=nulls_coerced,
                         total=total,
-                        rate=rate)
-                    stat["coerce_seen"] = True
-                coercion = stat["coercion"]
-                coercion["total"] += total
-                coercion["coerced_nulls"] += nulls_coerced
-                stat["non_null"] -= nulls_coerced
-                stat["null"] += nulls_coerced
-                if coercion["total"] > 0:
-                    coercion["rate"] = non_null_coerce / coercion["total"]
-                s_clean = pd.to_numeric(s_clean, errors="coerce").dropna()
-                stat["type"] = "float"
-                # del stat["detected_from_string"]
-            extra["s"] += s_clean.sum()
-            extra["s2"] += (s_clean ** 2).sum()
-            extra["min"] = min(extra["min"], s_clean.min())
-            extra["max"] = max(extra["max"], s_clean.max())
-
-        elif stat["type"] == "string":
+                        rate=(total - nulls_coerced) / total if total else 1.0)
+                    stat.coerce_seen = True
+                assert stat.coercion is not None
+                stat.coercion.update(nulls_coerced, total)
+                stat.non_null -= nulls_coerced
+                stat.null += nulls_coerced
+                if numeric_out is not None:
+                    aligned = np.full(len(s), np.nan)
+                    aligned[s.notna().to_numpy()] = values
+                    numeric_out[col] = aligned
+                values = values[~failed]
+                stat.type = "float"
+            else:
+                values = s_clean.to_numpy()
+                if numeric_out is not None:
+                    numeric_out[col] = s.to_numpy(dtype=np.float64, na_value=np.nan)
+            assert stat.numeric is not None and stat.hll is not None
+            stat.numeric.update(values)
+            stat.hll.update(values.astype("float64"))
+
+        elif stat.type == "string" and isinstance(s_clean.dtype, pd.CategoricalDtype):
+            # словарная строковая колонка: работа по различным значениям, а не по строкам
+            vc, lengths = _dictionary_counts(s_clean.cat.codes.to_numpy(), s_clean.cat.categories)
+            assert stat.string is not None and stat.hll is not None
+            stat.string.update_distinct(vc, lengths)
+            stat.hll.update(vc.index.to_numpy())
+
+        elif stat.type == "string":
             # строковая колонка
-            extra = stat["string"]
             s_clean = s_clean.astype(str)
-            vc = s_clean.value_counts().to_dict()
-            s_clean = s_clean.str.len()
+            vc = s_clean.value_counts()
+            assert stat.string is not None and stat.hll is not None
+            stat.string.update(vc, s_clean.str.len().to_numpy())
+            stat.hll.update(vc.index.to_numpy())
+
+        elif stat.type == "datetime":
+            # datetime колонка
+            assert stat.datetime is not None and stat.hll is not None
+            sc, fallback = parse_datetimes(s_clean, stat.datetime.fmt)
+            if fallback and not stat.datetime.fallback:
+                emit(level="WARN",
+                     event="profile_datetime_fallback",
+                     column=col,
+                     format=stat.datetime.fmt,
+                     fallback_rows=fallback,
+                     total=len(s_clean))
+            stat.datetime.fallback += fallback
+            sc = sc.dropna()
+            stat.datetime.update(sc.min(), sc.max())
+            stat.hll.update(sc.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]"))
+
+        elif stat.type == "bool":
+            # булевая колонка
+            if pd.api.types.is_bool_dtype(s_clean.dtype):
+                true_count_inc = int(s_clean.sum())
+            else:
+                true_count_inc = int(s_clean.astype(str).str.strip().str.lower().isin(TRUE).sum())
+            assert stat.bool is not None and stat.hll is not None
+            stat.bool.update(true_count_inc, len(s_clean))
+            stat.hll.update(s_clean.to_numpy())
+
+        if perf is not None and phase is not None:
+            perf.add(phase, time.perf_counter() - t)
+
+
+def _dictionary_counts(codes: npt.NDArray[np.integer[Any]],
+                       values: pd.Index) -> tuple[pd.Series, npt.NDArray[np.int64]]:
+    # value_counts по кодам словаря (bincount) и длины значений - по одной на значение
+    counts = np.bincount(codes, minlength=len(values))
+    used = np.flatnonzero(counts)
+    vc = pd.Series(counts[used], index=values[used].astype(str))
+    if not vc.index.is_unique:
+        # разные значения словаря, совпавшие после приведения к строке
+        vc = vc.groupby(level=0, sort=False).sum()
+    vc = vc.sort_values(ascending=False, kind="stable")
+    return vc, vc.index.str.len().to_numpy()
+
+
+def _arrow_dtype_family(arr: pa.Array) -> str:
+    # то же семейство, что dtype_family у результата to_pandas()
+    typ = arr.type
+    if pa.types.is_boolean(typ):
+        return "object" if arr.null_count else "bool"
+    if pa.types.is_integer(typ) or pa.types.is_floating(typ):
+        return "numeric"
+    if pa.types.is_timestamp(typ):
+        return "datetime"
+    return "object"
+
+
+def _arrow_timestamp(scalar: pa.TimestampScalar, unit: str) -> pd.Timestamp:
+    return pd.Timestamp(scalar.value, unit=unit, tz="UTC")
+
+
+def update_profile_arrow(profile: dict[str, ColumnState], batch: pa.RecordBatch, emit: Emit,
+                         perf: PerfRecorder | None = None,
+                         numeric_out: dict[str, npt.NDArray[np.float64]] | None = None) -> None:
+    # те же метрики, что и update_profile, но прямо по Arrow-массивам;
+    # всё, что не покрыто быстрым путём, уходит в pandas-ветку по одной колонке
+    for i, col in enumerate(batch.schema.names):
+        arr = batch.column(i)
+        stat = profile[col]
+        typ = arr.type
+        family = _arrow_dtype_family(arr)
+        if family != stat.dtype_family:
+            t = time.perf_counter()
+            stat = _refresh_plan(profile, col, batch.select([i]).to_pandas()[col], family)
+            if perf is not None:
+                perf.add("detect", time.perf_counter() - t)
+        t = time.perf_counter()
+
+        if pa.types.is_floating(typ):
+            null_mask = pc.is_null(arr, nan_is_null=True)
+            nulls = pc.sum(null_mask).as_py() or 0
+        else:
+            null_mask = None
+            nulls = arr.null_count
+
+        is_numeric = pa.types.is_integer(typ) or pa.types.is_floating(typ)
+        is_string = pa.types.is_string(typ) or pa.types.is_large_string(typ)
+        is_dictionary = pa.types.is_dictionary(typ) and (pa.types.is_string(typ.value_type)
+                                                         or pa.types.is_large_string(typ.value_type))
+        clean = arr
+        if nulls:
+            clean = pc.filter(arr, pc.invert(null_mask)) if null_mask is not None else pc.drop_null(arr)
 
-            extra["sum_len"] += s_clean.sum()
-            extra["min_len"] = min(extra["min_len"], s_clean.min())
-            extra["max_len"] = max(extra["max_len"], s_clean.max())
-            extra["counter"].update(vc)
+        if nulls == len(arr):
+            fast = False
+        elif is_numeric:
+            fast = stat.type in NUMERIC_TYPES and not stat.dirty
+        elif is_string or is_dictionary:
+            fast = stat.type == "string"
+        elif pa.types.is_timestamp(typ):
+            fast = stat.type == "datetime"
+        elif pa.types.is_boolean(typ):
+            fast = stat.type == "bool" and nulls == 0
+        else:
+            fast = False
+
+        if not fast:
+            frame = batch.select([i]).to_pandas()
+            if perf is not None:
+                perf.add("convert", time.perf_counter() - t)
+            update_profile(profile, frame, emit, perf, numeric_out)
+            continue
+
+        phase = _update_phase(stat) if perf is not None else None
+        stat.non_null += len(arr) - nulls
+        stat.null += nulls
+
+        if is_numeric:
+            # числовая колонка
+            if "int" in stat.original_dtype:
+                stat.type = "int"
+            elif "float" in stat.original_dtype:
+                stat.type = "float"
+            if pa.types.is_integer(typ) and nulls:
+                # to_pandas превращает int-колонку с пропусками во float64
+                clean = pc.cast(clean, pa.float64())
+            values = clean.to_numpy(zero_copy_only=False)
+            assert stat.numeric is not None and stat.hll is not None
+            stat.numeric.update(values)
+            stat.hll.update(values.astype("float64"))
+            if numeric_out is not None:
+                numeric_out[col] = pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+        elif is_dictionary:
+            # словарная строковая колонка
+            if isinstance(clean, pa.ChunkedArray):
+                clean = clean.combine_chunks()
+            vc, lengths = _dictionary_counts(clean.indices.to_numpy(zero_copy_only=False),
+                                             pd.Index(clean.dictionary.to_pandas()))
+            assert stat.string is not None and stat.hll is not None
+            stat.string.update_distinct(vc, lengths)
+            stat.hll.update(vc.index.to_numpy())
 
-        elif stat["type"] == "datetime":
+        elif is_string:
+            # строковая колонка
+            counted = pc.value_counts(clean)
+            vc = pd.Series(counted.field("counts").to_numpy(),
+                           index=counted.field("values").to_pandas())
+            vc = vc.sort_values(ascending=False)
+            assert stat.string is not None and stat.hll is not None
+            stat.string.update(vc, pc.utf8_length(clean).to_numpy())
+            stat.hll.update(vc.index.to_numpy())
+
+        elif pa.types.is_timestamp(typ):
             # datetime колонка
-            extra = stat["datetime"]
-            sc = pd.to_datetime(s_clean, errors="coerce", utc=True).dropna()
-            extra["min_dt"] = min(extra["min_dt"], sc.min())
-            extra["max_dt"] = max(extra["max_dt"], sc.max())
+            assert stat.datetime is not None and stat.hll is not None
+            mm = pc.min_max(clean)
+            stat.datetime.update(_arrow_timestamp(mm["min"], typ.unit),
+                                 _arrow_timestamp(mm["max"], typ.unit))
+            ns = pc.cast(pc.cast(clean, pa.timestamp("ns", tz=typ.tz)), pa.int64())
+            stat.hll.update(ns.to_numpy().view("datetime64[ns]"))
 
-        elif stat["type"] == "bool":
+        else:
             # булевая колонка
-            extra = stat["bool"]
-            if not pd.api.types.is_bool_dtype(s_clean.dtype):
-                true_count_inc = int(s_clean.str.lower().isin(TRUE | FALSE).sum())
-            true_count_inc = int(s_clean.sum())
-            extra["true_count"] += true_count_inc
-            extra["false_count"] += len(s_clean) - true_count_inc
+            assert stat.bool is not None and stat.hll is not None
+            stat.bool.update(pc.sum(clean).as_py() or 0, len(clean))
+            stat.hll.update(clean.to_numpy(zero_copy_only=False))
+
+        if perf is not None and phase is not None:
+            perf.add(phase, time.perf_counter() - t)
+
 
+def _column_series(frame: pd.DataFrame | pa.RecordBatch, col: str) -> pd.Series:
+    if isinstance(frame, pd.DataFrame):
+        return frame[col]
+    s: pd.Series = frame.select([col]).to_pandas()[col]
+    return s
 
-def get_advanced_metrics(profile: dict[str, Any], k: int) -> None:
-    def _to_iso(dt: datetime | None) -> str | None:
-        if dt is None:
+
+def _frame_columns(frame: pd.DataFrame | pa.RecordBatch) -> list[str]:
+    if isinstance(frame, pd.DataFrame):
+        return list(frame.columns)
+    return list(frame.schema.names)
+
+
+def _blank_profile(profile: dict[str, ColumnState]) -> dict[str, ColumnState]:
+    return {col: stat.blank() for col, stat in profile.items()}
+
+
+def merge_profile(dst: dict[str, ColumnState], src: dict[str, ColumnState]) -> None:
+    for col, stat in src.items():
+        if col not in dst:
+            dst[col] = stat.blank()
+        dst[col].merge(stat)
+
+
+@dataclass
+class FileProfile:
+    path: Path
+    state: dict[str, ColumnState]
+    kinds: dict[str, tuple[str, str, tuple[str, ...], bool]]
+    rows: int
+    columns: int
+    events: list[dict[str, Any]] | None = None
+    sample_total: int = 0
+    sample_kept: int = 0
+    perf: PerfRecorder | None = None
+    correlations: CorrelationAcc | None = None
+    # колонки, типы которых взяты из шаблона предыдущих файлов
+    seeded: tuple[str, ...] = ()
+
+
+@dataclass
+class RunState:
+    """Everything `run_profile` accumulates; pickled as a checkpoint."""
+    settings: str
+    profile: dict[str, ColumnState] = field(default_factory=dict)
+    done: dict[str, tuple[int, int]] = field(default_factory=dict)
+    rows: int = 0
+    columns: int = 0
+    sample_total: int = 0
+    sample_kept: int = 0
+    # недочитанный файл: последний учтённый chunk_idx, позиция чтения за ним
+    # и частичное состояние
+    cursor: tuple[str, int, ReadPosition] | None = None
+    partial: FileProfile | None = None
+    # --per-partition: состояние каждого значения ключа ("key=value")
+    partitions: dict[str, "RunState"] = field(default_factory=dict)
+    correlations: CorrelationAcc | None = None
+
+    def add(self, fp: FileProfile, partition: str | None = None) -> None:
+        merge_profile(self.profile, fp.state)
+        self.rows += fp.rows
+        self.columns = max(self.columns, fp.columns)
+        self.sample_total += fp.sample_total
+        self.sample_kept += fp.sample_kept
+        self.done[str(fp.path)] = _fingerprint(fp.path)
+        if fp.correlations is not None:
+            if self.correlations is None:
+                self.correlations = fp.correlations.blank()
+            self.correlations.merge(fp.correlations)
+        if partition is not None:
+            self.partitions.setdefault(partition, RunState(self.settings)).add(fp)
+
+
+def _fingerprint(path: Path) -> tuple[int, int]:
+    st = path.stat()
+    return st.st_size, st.st_mtime_ns
+
+
+class Checkpointer:
+    """Writes `RunState` snapshots for --resume.
+
+    A snapshot is taken after every `every_rows` rows or `every_seconds`
+    seconds, whichever comes first, at a chunk boundary (sequential runs)
+    or a file boundary (--workers). The time spent writing is tracked in
+    `saves` / `seconds`.
+    """
+
+    def __init__(self, path: Path, run: RunState, emit: Emit,
+                 every_rows: int = 0, every_seconds: float = 0.0, per_chunk: bool = True) -> None:
+        self.path = path
+        self.run = run
+        self.emit = emit
+        self.every_rows = every_rows
+        self.every_seconds = every_seconds
+        self.per_chunk = per_chunk
+        self.rows_since = 0
+        self.last = time.monotonic()
+        self.saves = 0
+        self.seconds = 0.0
+
+    def due(self, rows: int) -> bool:
+        self.rows_since += rows
+        if self.every_rows and self.rows_since >= self.every_rows:
+            return True
+        return bool(self.every_seconds) and time.monotonic() - self.last >= self.every_seconds
+
+    def chunk_done(self, partial: FileProfile, chunk_idx: int, rows: int, position: ReadPosition) -> None:
+        if self.per_chunk and self.due(rows):
+            self.save((str(partial.path), chunk_idx, position), partial)
+
+    def file_done(self, fp: FileProfile) -> None:
+        if self.due(0 if self.per_chunk else fp.rows):
+            self.save(None, None)
+
+    def save(self, cursor: tuple[str, int, ReadPosition] | None, partial: FileProfile | None) -> None:
+        started = time.perf_counter()
+        self.run.cursor, self.run.partial = cursor, partial
+        data = pickle.dumps(self.run, protocol=pickle.HIGHEST_PROTOCOL)
+        self.run.cursor = self.run.partial = None
+        atomic_write_bytes(self.path, data)
+        elapsed = time.perf_counter() - started
+
+        self.saves += 1
+        self.seconds += elapsed
+        self.rows_since = 0
+        self.last = time.monotonic()
+        self.emit(level="INFO",
+                  event="profile_checkpoint",
+                  path=cursor[0] if cursor else None,
+                  chunk_idx=cursor[1] if cursor else None,
+                  files_done=len(self.run.done),
+                  bytes=len(data),
+                  elapsed_ms=round(elapsed * 1000, 3))
+
+    @staticmethod
+    def load(path: Path, settings: str) -> RunState | None:
+        # снимок годится, только если настройки те же и готовые файлы не менялись
+        try:
+            run = pickle.loads(path.read_bytes())
+        except (OSError, EOFError, pickle.UnpicklingError):
             return None
-        if dt.tzinfo is None:
-            dt.replace(tzinfo=timezone.utc)
-        return (dt
-                .astimezone(timezone.utc)
-                .isoformat(timespec="milliseconds")
-                .replace("+00:00", "Z")
-                )
-
-    for col in profile:
-        stat = profile[col]
-        # if stat["type"] == "int" or stat["type"] == "float":
-        #     extra = stat["numeric"]
-        # else:
-            # extra = stat[stat["type"]]
-        extra = stat.get(stat["type"], None)
-        non_null = stat["non_null"]
-
-        # if stat["type"] == "float" or stat["type"] == "int":
-        if "numeric" in stat:
-            extra = stat["numeric"]
-            mean = None
-            std = None
-            if non_null > 0:
-                mean = extra["s"] / non_null
-                std = sqrt(max(extra["s2"] / non_null - mean**2, 0.0))
-            extra["mean"] = mean
-            extra["std"] = std
-            del extra["s"], extra["s2"]
-
-        # if stat["type"] == "string":
-        if "string" in stat:
-            extra = stat["string"]
-            avg_len = None
-            if non_null > 0:
-                avg_len = extra["sum_len"] / non_null
-            extra["avg_len"] = avg_len
-            top_k = extra["counter"].most_common(k)
-            extra["top_k"] = top_k if top_k else None
-            del extra["sum_len"], extra["counter"]
-
-        if stat["type"] == "bool":
-            true_rate = None
-            if non_null > 0:
-                true_rate = extra["true_count"] / non_null
-            extra["true_rate"] = true_rate
-
-        if stat["type"] == "datetime":
-            extra["min"] = _to_iso(extra["min_dt"])
-            extra["max"] = _to_iso(extra["max_dt"])
-            del extra["min_dt"], extra["max_dt"]
-
-
-def run_profile(args: ProfileArgs, emit) -> int:
+        if not isinstance(run, RunState) or run.settings != settings:
+            return None
+        for done, fingerprint in run.done.items():
+            if not Path(done).is_file() or _fingerprint(Path(done)) != fingerprint:
+                return None
+        return run
+
+
+def profile_file(path: Path, args: ProfileArgs,
+                 template: dict[str, ColumnState], emit: Emit,
+                 checkpointer: Checkpointer | None = None,
+                 resume: tuple[int, ReadPosition, FileProfile] | None = None) -> FileProfile:
+    perf = PerfRecorder(trace=args.trace is not None)
+    file_start = perf.now_us()
+    state = _blank_profile(template)
+    kinds = {col: stat.kind() for col, stat in state.items()}
+    rows = 0
+    columns = 0
+    from_footer = False
+    last = -1
+    start = None
+    corr = CorrelationAcc() if args.correlations else None
+    seen: set[str] = set()
+    if resume is not None:
+        # чанки до last включительно уже учтены в частичном состоянии, чтение продолжается с start
+        last, start, partial = resume
+        state, kinds, rows, columns = partial.state, partial.kinds, partial.rows, partial.columns
+        corr = partial.correlations
+        seen.update(state)
+
+    def result(**extra: Any) -> FileProfile:
+        # пустые колонки шаблона, которых нет в файле, в состояние файла не попадают
+        own = [col for col in state if col in seen or col not in template]
+        return FileProfile(path=path, state={col: state[col] for col in own},
+                           kinds={col: kinds[col] for col in own}, rows=rows, columns=columns,
+                           perf=perf, seeded=tuple(col for col in template if col in seen), **extra)
+
+    # движок и режим сэмпла уже проверены validate_profile_args
+    fmt = _file_format(args)
+    engine = cast(Literal["pandas", "arrow"], args.engine)
+    csv_reader = cast(Literal["pandas", "arrow"], args.csv_reader)
+    selected = column_selector(args.columns, args.exclude_columns)
+    row_filter = RowFilter(args.row_filter) if args.row_filter else None
+    read_columns: list[str] | Callable[[str], bool] | None = selected
+    sampler = None
+    if args.sample < 1:
+        sampler = Sampler(args.sample, cast(Literal["block", "row"], args.sample_mode), args.seed,
+                          key=path.name)
+
+    # статистики футера описывают файл целиком, с фильтром строк или сэмплом они неверны
+    if (args.stats_only and row_filter is None and sampler is None
+            and fmt == "parquet" and path.stat().st_size > 0):
+        t = time.perf_counter()
+        num_rows, schema, footer = parquet_footer_stats(path)
+        perf.add("footer", time.perf_counter() - t)
+        if num_rows == 0:
+            return result(correlations=corr)
+        emit(level="INFO",
+             event="profile_file_started",
+             path=str(path))
+        from_footer = True
+        names = [col for col in schema.names if selected is None or selected(col)]
+        seen.update(names)
+        for col in names:
+            if col in footer:
+                state[col] = _init_footer_state(schema.field(col).type, num_rows, footer[col])
+                kinds[col] = state[col].kind()
+        rows = num_rows
+        columns = len(names)
+        read_columns = [col for col in names if col not in footer]
+        if not read_columns:
+            perf.span(path.name, file_start, "file", path=str(path), rows=rows)
+            return result()
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    chunksize, block_bytes, bytes_per_row = args.chunksize, CSV_BLOCK_BYTES, None
+    prefetch_bytes = None
+    if args.max_memory is not None and path.stat().st_size > 0:
+        t = time.perf_counter()
+        plan = plan_chunks(path, fmt, _chunk_budget(args), engine=engine,
+                           columns=set(read_columns).__contains__ if isinstance(read_columns, list) else read_columns,
+                           csv_reader=csv_reader, threads=threads, prefetch=args.prefetch)
+        perf.add("plan", time.perf_counter() - t)
+        chunksize, block_bytes, bytes_per_row = plan.rows, plan.block_bytes, plan.bytes_per_row
+        # очередь упреждающего чтения - часть бюджета
+        prefetch_bytes = int(plan.rows * plan.bytes_per_row * args.prefetch)
+
+    positions: dict[int, ReadPosition] | None = (
+        {} if checkpointer is not None and checkpointer.per_chunk else None)
+    frames = iter_frames(path, fmt, chunksize,
+                         engine=engine, columns=read_columns, row_filter=row_filter,
+                         sampler=sampler, block_bytes=block_bytes, csv_reader=csv_reader,
+                         threads=threads, start=start, positions=positions)
+    # чтение и декодирование следующего чанка идёт в фоне, пока профилируется текущий
+    frames = prefetch(frames, args.prefetch, prefetch_bytes)
+    chunk_start = perf.now_us()
+    for _, read_idx, frame in perf.timed(frames, "read"):
+        chunk_idx = last + 1 + read_idx
+        if chunk_idx == 0 and not from_footer:
+            emit(level="INFO",
+                 event="profile_file_started",
+                 path=str(path))
+
+        names = _frame_columns(frame)
+        seen.update(names)
+        for col in names:
+            if col not in state:
+                t = time.perf_counter()
+                s = _column_series(frame, col)
+                state[col] = _init_column_state(col, s.dtype, s)
+                kinds[col] = state[col].kind()
+                perf.add("detect", time.perf_counter() - t)
+
+        if not from_footer:
+            rows += len(frame)
+            columns = max(columns, len(names))
+
+        numeric: dict[str, npt.NDArray[np.float64]] | None = {} if corr is not None else None
+        if isinstance(frame, pd.DataFrame):
+            update_profile(state, frame, emit, perf, numeric)
+        else:
+            update_profile_arrow(state, frame, emit, perf, numeric)
+        if corr is not None and numeric is not None:
+            t = time.perf_counter()
+            corr.update(numeric)
+            perf.add("update.correlations", time.perf_counter() - t)
+
+        emit(level="INFO",
+             event="profile_chunk_scanned",
+             path=str(path),
+             chunk_idx=chunk_idx,
+             rows=len(frame),
+             chunksize=chunksize,
+             bytes_per_row=bytes_per_row)
+
+        if positions is not None and checkpointer is not None:
+            t = time.perf_counter()
+            checkpointer.chunk_done(FileProfile(path=path, state=state, kinds=kinds, rows=rows, columns=columns,
+                                                correlations=corr),
+                                    chunk_idx, len(frame), positions.pop(read_idx))
+            perf.add("checkpoint", time.perf_counter() - t)
+        perf.span(path.name, chunk_start, "chunk", path=str(path), chunk_idx=chunk_idx, rows=len(frame))
+        chunk_start = perf.now_us()
+
+    fp = result(correlations=corr)
+    if sampler is not None:
+        fp.sample_total, fp.sample_kept = sampler.total, sampler.kept
+    # с блочным сэмплом csv читаются только оставленные диапазоны байт
+    if sampler is not None and sampler.mode == "block" and fmt == "csv":
+        perf.bytes_scanned += sampler.kept
+    else:
+        perf.bytes_scanned += path.stat().st_size
+    perf.span(path.name, file_start, "file", path=str(path), rows=rows)
+    return fp
+
+
+def _apply_settings(args: ProfileArgs) -> None:
+    global THRESHOLD, QUANTILE_K, TOPK_CAPACITY, EXACT_TOPK, HLL_PRECISION, DETECT_SAMPLE
+    THRESHOLD = args.threshold
+    QUANTILE_K = args.quantile_k
+    TOPK_CAPACITY = args.topk_capacity
+    EXACT_TOPK = args.exact_topk
+    HLL_PRECISION = args.hll_precision
+    DETECT_SAMPLE = args.detect_sample
+
+
+def _profile_file_worker(path: Path, args: ProfileArgs,
+                         checkpointer: Checkpointer | None = None,
+                         resume: tuple[int, ReadPosition, FileProfile] | None = None) -> FileProfile:
+    # события копятся и переигрываются родителем в порядке файлов
+    events: list[dict[str, Any]] = []
+
+    def emit(**event: Any) -> None:
+        events.append(event)
+
+    fp = profile_file(path, args, {}, emit, checkpointer, resume)
+    fp.events = events
+    return fp
+
+
+# меняется при несовместимом изменении состояния колонок
+CACHE_VERSION = 2
+# меняется при несовместимом изменении снимка --resume
+CHECKPOINT_VERSION = 2
+# параметры, от которых не зависит состояние файла
+_CACHE_IGNORED = ("src", "dst", "topk", "percentiles", "workers",
+                  "cache", "cache_dir", "cache_hash", "cache_max_mb",
+                  "resume", "checkpoint_rows", "checkpoint_seconds", "perf", "trace",
+                  "prefetch", "partitioning", "partition_filter", "per_partition")
+
+
+def _file_format(args: ProfileArgs) -> Literal["csv", "parquet"]:
+    # формат уже определён и проверен validate_profile_args
+    return cast(Literal["csv", "parquet"], args.fmt)
+
+
+def _chunk_budget(args: ProfileArgs) -> int:
+    # бюджет памяти делится между процессами-воркерами
+    assert args.max_memory is not None
+    return args.max_memory // max(args.workers, 1)
+
+
+def _settings_key(args: ProfileArgs) -> str:
+    settings = {k: v for k, v in vars(args).items() if k not in _CACHE_IGNORED}
+    if args.max_memory is not None:
+        # от числа воркеров и глубины очереди зависят границы чанков, а с ними и --resume
+        settings["chunk_budget"] = _chunk_budget(args)
+        settings["prefetch"] = args.prefetch
+    return json.dumps([CACHE_VERSION, settings], sort_keys=True, default=str)
+
+
+def _open_cache(args: ProfileArgs) -> StateCache | None:
+    if not args.cache:
+        return None
+    root = args.cache_dir if args.cache_dir is not None else args.dst / ".dprof-cache"
+    return StateCache(root, _settings_key(args), strong=args.cache_hash,
+                      max_bytes=args.cache_max_mb << 20)
+
+
+def _fits(fp: FileProfile, profile: dict[str, ColumnState]) -> bool:
+    # состояние файла годится, если последовательный прогон начал бы его с теми же типами:
+    # колонки из шаблона должны быть в профиле, остальные - не противоречить ему
+    for col, kind in fp.kinds.items():
+        stat = profile.get(col)
+        if stat is None:
+            if col in fp.seeded:
+                return False
+        elif stat.kind() != kind:
+            return False
+    return True
+
+
+def _cache_put(cache: StateCache, fp: FileProfile) -> None:
+    t = time.perf_counter()
+    cache.put(fp.path, replace(fp, events=None, perf=None))
+    if fp.perf is not None:
+        fp.perf.add("cache", time.perf_counter() - t)
+
+
+def _cached_event(fp: FileProfile) -> dict[str, Any]:
+    return {"level": "INFO", "event": "profile_file_cached", "path": str(fp.path), "rows": fp.rows}
+
+
+def _iter_file_profiles(args: ProfileArgs, files: list[Path],
+                        profile: dict[str, ColumnState], emit: Emit,
+                        cache: StateCache | None = None,
+                        checkpointer: Checkpointer | None = None,
+                        resume: tuple[str, int, ReadPosition, FileProfile] | None = None) -> Iterator[FileProfile]:
+    def resume_for(path: Path) -> tuple[int, ReadPosition, FileProfile] | None:
+        if resume is not None and resume[0] == str(path):
+            return resume[1], resume[2], resume[3]
+        return None
+
+    if args.workers <= 1:
+        # кэш только подменяет уже посчитанные файлы, остальные идут с шаблоном и живыми событиями
+        warm = ThreadPoolExecutor(max_workers=1) if args.prefetch > 0 else None
+        try:
+            for i, path in enumerate(files):
+                fp = cache.get(path) if cache is not None and resume_for(path) is None else None
+                if fp is not None and _fits(fp, profile):
+                    emit(**_cached_event(fp))
+                    yield fp
+                    continue
+                if warm is not None and i + 1 < len(files):
+                    # футер следующего файла читается, пока профилируется текущий
+                    warm.submit(warm_file, files[i + 1], _file_format(args))
+                fp = profile_file(path, args, profile, emit, checkpointer, resume_for(path))
+                if cache is not None and resume_for(path) is None:
+                    _cache_put(cache, fp)
+                yield fp
+        finally:
+            if warm is not None:
+                warm.shutdown(wait=False, cancel_futures=True)
+        return
+
+    # файлы из кэша и из воркеров профилируются без шаблона накопленных колонок
+    cached = {path: cache.get(path) for path in files} if cache is not None else {}
+    todo = [path for path in files if cached.get(path) is None]
+    pool = None
+    if len(todo) > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers,
+                                   initializer=_apply_settings,
+                                   initargs=(args,))
+        fresh = pool.map(_profile_file_worker, todo, repeat(args))
+    else:
+        fresh = (_profile_file_worker(path, args, checkpointer, resume_for(path)) for path in todo)
+
+    try:
+        for path in files:
+            fp = cached.get(path)
+            if fp is None:
+                fp = next(fresh)
+                if cache is not None:
+                    _cache_put(cache, fp)
+                events = fp.events or []
+            else:
+                events = [_cached_event(fp)]
+            # файл начат без учёта решений о типах из предыдущих файлов;
+            # если последовательный прогон решил бы иначе - пересчитываем здесь
+            if not _fits(fp, profile):
+                yield profile_file(fp.path, args, profile, emit, checkpointer)
+                continue
+            for event in events:
+                emit(**event)
+            yield fp
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+def serialize_profile(profile: dict[str, ColumnState],
+                      k: int,
+                      percentiles: tuple[float, ...] = (50.0, 95.0, 99.0)) -> dict[str, Any]:
+    return {col: stat.to_dict(k, percentiles) for col, stat in profile.items()}
+
+
+def write_profile(dst: Path,
+                  dataset: dict[str, Any],
+                  profile: dict[str, ColumnState],
+                  topk: int,
+                  percentiles: tuple[float, ...],
+                  correlations: CorrelationAcc | None = None) -> Path:
+    # profile.json - итоговые метрики, profile.state.arrow - состояние для слияния/сравнения
+    metrics = {"dataset": dataset, "columns": serialize_profile(profile, topk, percentiles)}
+    if correlations is not None:
+        metrics["correlations"] = correlations.finalize()
+    final = dst / "profile.json"
+    atomic_write_text(final, json.dumps(metrics, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+    write_state(dst / STATE_NAME, profile,
+                {"dataset": dataset, "topk": topk, "percentiles": percentiles}, correlations)
+    return final
+
+
+def _partition_name(key: str, raw: str | None) -> str:
+    # значение как в пути (01, a%20b); файл без этого ключа - пустое значение Hive
+    return f"{key}={HIVE_DEFAULT_PARTITION if raw is None else raw}"
+
+
+def _dataset_meta(args: ProfileArgs, run: RunState) -> dict[str, Any]:
+    return {
+            "src": str(args.src),
+            "format": args.fmt,
+            "rows": run.rows,
+            "stats_only": args.stats_only,
+            "row_filter": args.row_filter,
+            "sample": {
+                "rate": args.sample,
+                "mode": args.sample_mode,
+                "seed": args.seed,
+                # доля реально прочитанных строк (для csv-блоков - байт);
+                # счётчики делятся на неё, чтобы оценить полный датасет
+                "effective_rate": run.sample_kept / run.sample_total if run.sample_total else args.sample,
+            },
+            "generated_at": time_now_iso()
+        }
+
+
+def run_profile(args: ProfileArgs, emit: Emit) -> int:
     emit(level="INFO",
          event="profile_started",
          src=str(args.src),
          format=args.fmt,
          sample=args.sample,
+         sample_mode=args.sample_mode,
          chunksize=args.chunksize,
+         max_memory=args.max_memory,
+         partitioning=args.partitioning,
          topk=args.topk
          )
 
-    global THRESHOLD
-    THRESHOLD = args.threshold
+    _apply_settings(args)
+    perf = PerfRecorder(trace=args.trace is not None)
+    started = time.perf_counter()
+    started_us = perf.now_us()
 
-    rows_total = 0
-    columns_max = 0
-    profile: dict[str, Any] = {}
+    # от --per-partition зависит состав чекпоинта, но не состояние файлов в кэше
+    run = RunState(settings=json.dumps([CHECKPOINT_VERSION, _settings_key(args), str(args.src.resolve()),
+                                        args.per_partition]))
+    ckpt_path = args.dst / "profile.ckpt"
+    resume = None
+    partition_of: dict[Path, str] = {}
+    keys: tuple[str, ...] = ()
     try:
-        frames = iter_frames(args.src, args.fmt, args.chunksize)
-        for path, chunk_idx, df in frames:
-            if chunk_idx == 0:
-                emit(level="INFO",
-                     event="profile_file_started",
-                     path=str(path))
-
-            if not profile:
-                profile = _init_df_profile_state(df)
-
-            for col in df.columns:
-                if col not in profile:
-                    profile[col] = _init_column_state(col, df[col].dtype, df[col])
-
-            rows_total += len(df)
-            columns_max = max(columns_max, df.shape[1])
-
-            update_profile(profile, df, emit)
+        if args.partitioning == "hive":
+            found = list_partitions(args.src, _file_format(args),
+                                    RowFilter(args.partition_filter) if args.partition_filter else None)
+            keys = found.keys
+            if args.per_partition is not None:
+                if args.per_partition not in keys:
+                    raise ValueError(f"per-partition key not found, partition keys {list(keys)} - {args.per_partition}")
+                partition_of = {path: _partition_name(args.per_partition, values.get(args.per_partition))
+                                for path, values in found.files}
+            files = [path for path, _ in found.files]
+            emit(level="INFO",
+                 event="profile_partitions",
+                 keys=list(keys),
+                 files=len(files),
+                 pruned=found.pruned)
+        else:
+            files = list_files(args.src, _file_format(args))
+        if args.resume:
+            restored = Checkpointer.load(ckpt_path, run.settings)
+            if restored is not None:
+                run = restored
+                if run.cursor is not None and run.partial is not None:
+                    resume = (*run.cursor, run.partial)
+                run.cursor = run.partial = None
+                files = [path for path in files if str(path) not in run.done]
+            emit(level="INFO" if restored is not None else "WARN",
+                 event="profile_resumed",
+                 checkpoint=str(ckpt_path),
+                 restored=restored is not None,
+                 files_done=len(run.done),
+                 cursor=list(resume[:2]) if resume else None)
 
+        checkpointer = None
+        if args.checkpoint_rows or args.checkpoint_seconds:
+            checkpointer = Checkpointer(ckpt_path, run, emit,
+                                        every_rows=args.checkpoint_rows,
+                                        every_seconds=args.checkpoint_seconds,
+                                        per_chunk=args.workers <= 1)
+        cache = _open_cache(args)
+        for fp in _iter_file_profiles(args, files, run.profile, emit, cache, checkpointer, resume):
+            t = time.perf_counter()
+            run.add(fp, partition_of.get(fp.path) if partition_of else None)
+            perf.add("merge", time.perf_counter() - t)
+            if fp.perf is not None:
+                perf.merge(fp.perf)
+            if checkpointer is not None:
+                checkpointer.file_done(fp)
+        if cache is not None:
+            evicted = cache.evict()
             emit(level="INFO",
-                 event="profile_chunk_scanned",
-                 path=str(path),
-                 chunk_idx=chunk_idx,
-                 rows=len(df))
+                 event="profile_cache",
+                 hits=cache.hits,
+                 misses=cache.misses,
+                 evicted=evicted)
 
     except Exception as e:
         emit(level="ERROR",
@@ -326,27 +1078,43 @@ def run_profile(args: ProfileArgs, emit) -> int:
              exception_msg=str(e))
         return 4
 
-    get_advanced_metrics(profile, args.topk)
-    delete_overhead(profile)
-
-    metrics = {
-            "dataset": {
-                "src": str(args.src),
-                "format": args.fmt,
-                "rows": rows_total,
-                "generated_at": time_now_iso()
-            },
-            "columns": profile
-            }
-
-    tmp = args.dst / "profile.json.tmp"
-    final = args.dst / "profile.json"
-    metrics_json = json.dumps(metrics, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    profile = run.profile
+    rows_total = run.rows
+    columns_max = run.columns
+    dataset = _dataset_meta(args, run)
+    if args.partitioning is not None:
+        dataset["partitioning"] = {"flavor": args.partitioning,
+                                   "keys": list(keys),
+                                   "filter": args.partition_filter,
+                                   "per_partition": args.per_partition,
+                                   "partitions": sorted(run.partitions)}
+    if args.perf:
+        # без времени записи самого profile.json - оно есть только в profile_perf
+        dataset["perf"] = perf.summary(time.perf_counter() - started, rows_total)
 
     try:
-        tmp.write_text(metrics_json)
-        os.replace(tmp, final)
-    except OSError as e:
+        t = time.perf_counter()
+        final = write_profile(args.dst, dataset, profile, args.topk, args.percentiles, run.correlations)
+        # профили значений ключа собраны в том же проходе, что и общий
+        for name, part in sorted(run.partitions.items()):
+            part_dst = args.dst / "partitions" / name
+            part_dst.mkdir(parents=True, exist_ok=True)
+            part_meta = _dataset_meta(args, part)
+            key, _, value = name.partition("=")
+            part_meta["partition"] = {key: value}
+            out = write_profile(part_dst, part_meta, part.profile, args.topk, args.percentiles, part.correlations)
+            emit(level="INFO",
+                 event="profile_partition_written",
+                 partition=name,
+                 rows=part.rows,
+                 columns=part.columns,
+                 out_path=str(out))
+        perf.add("finalize", time.perf_counter() - t)
+        ckpt_path.unlink(missing_ok=True)
+        if args.trace is not None:
+            perf.span("profile", started_us, "run", src=str(args.src), rows=rows_total)
+            perf.write_trace(args.trace)
+    except (OSError, pa.ArrowException) as e:
         emit(level="ERROR",
              event="profile_failed",
              exception_type=type(e).__name__,
@@ -354,10 +1122,81 @@ def run_profile(args: ProfileArgs, emit) -> int:
 
         return 3
 
+    summary = perf.summary(time.perf_counter() - started, rows_total)
+    phases = summary.pop("phases")
+    emit(level="INFO",
+         event="profile_perf",
+         rows=rows_total,
+         **summary,
+         **{f"{phase.replace('.', '_')}_s": v["seconds"] for phase, v in phases.items()},
+         trace=str(args.trace) if args.trace is not None else None)
+
     emit(level="INFO",
          event="profile_completed",
          rows_total=rows_total,
          columns=columns_max,
-         out_path=str(final))
+         out_path=str(final),
+         checkpoints=checkpointer.saves if checkpointer else 0,
+         checkpoint_seconds=round(checkpointer.seconds, 6) if checkpointer else 0.0)
+
+    return 0
 
+
+@dataclass
+class MergeArgs:
+    src: tuple[Path, ...]
+    dst: Path
+    columns: tuple[str, ...] = ()
+    exclude_columns: tuple[str, ...] = ()
+
+
+def _merged_dataset(datasets: list[dict[str, Any]]) -> dict[str, Any]:
+    # поля, одинаковые во всех профилях, сохраняются, различающиеся - null
+    out = {key: value if all(d.get(key) == value for d in datasets) else None
+           for key, value in datasets[0].items()}
+    out["src"] = [d.get("src") for d in datasets]
+    out["rows"] = sum(d.get("rows") or 0 for d in datasets)
+    out["generated_at"] = time_now_iso()
+    return out
+
+
+def run_merge(args: MergeArgs, emit: Emit) -> int:
+    emit(level="INFO",
+         event="merge_started",
+         src=[str(p) for p in args.src],
+         dst=str(args.dst))
+
+    selected = column_selector(args.columns, args.exclude_columns)
+    profile: dict[str, ColumnState] = {}
+    correlations: CorrelationAcc | None = None
+    datasets: list[dict[str, Any]] = []
+    try:
+        for path in args.src:
+            names = None
+            if selected is not None:
+                table, _ = open_state(path, fields=("name",))
+                names = [name for name in table["name"].to_pylist() if selected(name)]
+            state, meta = read_state(path, columns=names)
+            if not datasets:
+                topk, percentiles = meta["topk"], tuple(meta["percentiles"])
+            merge_profile(profile, state)
+            corr = read_correlations(path, columns=names)
+            if corr is not None:
+                if correlations is None:
+                    correlations = corr.blank()
+                correlations.merge(corr)
+            datasets.append(meta["dataset"])
+        final = write_profile(args.dst, _merged_dataset(datasets), profile, topk, percentiles, correlations)
+    except Exception as e:
+        emit(level="ERROR",
+             event="merge_failed",
+             exception_type=type(e).__name__,
+             exception_msg=str(e))
+        return 4
+
+    emit(level="INFO",
+         event="merge_completed",
+         rows_total=sum(d.get("rows") or 0 for d in datasets),
+         columns=len(profile),
+         out_path=str(final))
     return 0
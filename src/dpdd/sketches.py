@@ -0,0 +1,209 @@
+import heapq
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+
+from dpdd.core_utils.hashing import hash_array
+
+
+class KLLSketch:
+    """Mergeable streaming quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Holds at most ~3*k values. For a sketch of n items the rank error of
+    `quantile` is about 1.65/k of n (k=200 -> ~0.8%), independent of n.
+    Compaction offsets alternate instead of being random, so the same
+    sequence of updates and merges always gives the same answer.
+    """
+
+    C = 2 / 3
+    MIN_CAPACITY = 8
+
+    def __init__(self, k: int = 200) -> None:
+        self.k = k
+        self.n = 0
+        self.levels: list[npt.NDArray[np.float64]] = [np.empty(0, dtype=np.float64)]
+        self._coin = 0
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(self.MIN_CAPACITY, int(np.ceil(self.k * self.C ** depth)))
+
+    def _size(self) -> int:
+        return sum(len(lvl) for lvl in self.levels)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        while self._size() > self._max_size():
+            for h in range(len(self.levels)):
+                if len(self.levels[h]) <= self._capacity(h):
+                    continue
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                buf = np.sort(self.levels[h])
+                keep = buf[-1:] if len(buf) % 2 else buf[:0]
+                pairs = buf[:len(buf) - len(keep)]
+                promoted = pairs[self._coin::2]
+                self._coin ^= 1
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                break
+
+    def update(self, values: npt.ArrayLike) -> None:
+        arr = np.asarray(values, dtype=np.float64)
+        arr = arr[~np.isnan(arr)]
+        if arr.size == 0:
+            return
+        self.n += int(arr.size)
+        self.levels[0] = np.concatenate([self.levels[0], arr])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        if other.n == 0:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for h, lvl in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], lvl])
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs: Sequence[float]) -> list[float | None]:
+        if self.n == 0:
+            return [None for _ in qs]
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(lvl), 2 ** h, dtype=np.int64) for h, lvl in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        values = values[order]
+        cum = np.cumsum(weights[order])
+        total = cum[-1]
+        out: list[float | None] = []
+        for q in qs:
+            idx = int(np.searchsorted(cum, q * total, side="left"))
+            out.append(float(values[min(idx, len(values) - 1)]))
+        return out
+
+    def quantile(self, q: float) -> float | None:
+        return self.quantiles([q])[0]
+
+
+class SpaceSaving:
+    """Mergeable heavy-hitters summary (Space-Saving, Metwally et al. 2005).
+
+    Keeps at most `capacity` (value, count, error) triples. With n the
+    total weight seen and m the capacity, every reported count c satisfies
+    f <= c <= f + n/m for the true frequency f, `error` bounds c - f per
+    value, and every value with f > n/m is guaranteed to be kept. While
+    fewer than m distinct values have been seen the summary is exact.
+    Merging follows Cafaro et al. 2016, so the bound holds across chunks,
+    files and workers.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.capacity = capacity
+        self.n = 0
+        self.keys = np.empty(0, dtype=object)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.errors = np.empty(0, dtype=np.int64)
+
+    def _floor(self) -> int:
+        # счётчик отсутствующего значения не больше минимума заполненной сводки
+        if len(self.keys) < self.capacity:
+            return 0
+        return int(self.counts.min())
+
+    def _merge_arrays(self, keys: npt.NDArray[np.object_], counts: npt.NDArray[np.int64],
+                      errors: npt.NDArray[np.int64], other_floor: int) -> None:
+        floor = self._floor()
+        left = pd.Index(self.keys)
+        right = pd.Index(keys)
+        idx = left.append(right.difference(left, sort=False))
+        c = (pd.Series(self.counts, index=left).reindex(idx, fill_value=floor).to_numpy()
+             + pd.Series(counts, index=right).reindex(idx, fill_value=other_floor).to_numpy())
+        e = (pd.Series(self.errors, index=left).reindex(idx, fill_value=floor).to_numpy()
+             + pd.Series(errors, index=right).reindex(idx, fill_value=other_floor).to_numpy())
+        order = np.argsort(-c, kind="stable")[:self.capacity]
+        self.keys = idx.to_numpy(dtype=object)[order]
+        self.counts = c[order].astype(np.int64)
+        self.errors = e[order].astype(np.int64)
+
+    def update(self, value_counts: pd.Series) -> None:
+        if value_counts.empty:
+            return
+        counts = value_counts.to_numpy(dtype=np.int64)
+        self.n += int(counts.sum())
+        self._merge_arrays(value_counts.index.to_numpy(dtype=object),
+                           counts,
+                           np.zeros(len(counts), dtype=np.int64),
+                           0)
+
+    def merge(self, other: "SpaceSaving") -> None:
+        if other.n == 0:
+            return
+        self.n += other.n
+        self._merge_arrays(other.keys, other.counts, other.errors, other._floor())
+
+    def most_common(self, k: int) -> list[tuple[Any, int]]:
+        return top_k_items(zip(self.keys.tolist(), self.counts.tolist()), k)
+
+    def max_error(self, k: int) -> int:
+        top = {key for key, _ in self.most_common(k)}
+        errs = [e for key, e in zip(self.keys.tolist(), self.errors.tolist()) if key in top]
+        return max(errs, default=0)
+
+
+def top_k_items(items: Iterable[tuple[Any, int]], k: int) -> list[tuple[Any, int]]:
+    # при равных счётчиках порядок по значению, чтобы результат не зависел от порядка чанков
+    return heapq.nsmallest(k, items, key=lambda kv: (-kv[1], str(kv[0])))
+
+
+class HyperLogLog:
+    """Mergeable distinct-count estimator (Flajolet et al. 2007).
+
+    Uses 2**p one-byte registers fed with 64-bit hashes from
+    `core_utils.hashing.hash_array`. Relative standard error is about
+    1.04 / sqrt(2**p) (p=12 -> ~1.6%); small cardinalities fall back to
+    linear counting and are close to exact.
+    """
+
+    RHO_BITS = 53  # сколько бит хэша помещается в float64 без округления
+
+    def __init__(self, p: int = 12) -> None:
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update_hashes(self, hashes: npt.NDArray[np.uint64]) -> None:
+        if len(hashes) == 0:
+            return
+        h = np.asarray(hashes, dtype=np.uint64)
+        bits = 64 - self.p
+        idx = (h >> np.uint64(bits)).astype(np.intp)
+        rest = h & np.uint64((1 << bits) - 1)
+        if bits > self.RHO_BITS:
+            rest >>= np.uint64(bits - self.RHO_BITS)
+            bits = self.RHO_BITS
+        # frexp даёт число значащих бит: rho = позиция первой единицы
+        _, exp = np.frexp(rest.astype(np.float64))
+        rho = (bits - exp + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rho)
+
+    def update(self, values: npt.ArrayLike) -> None:
+        self.update_hashes(hash_array(values))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
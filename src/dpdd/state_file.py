@@ -0,0 +1,330 @@
+import json
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .accumulators import (BoolAcc, CoercionAcc, ColumnState, CorrelationAcc, DatetimeAcc,
+                           NumericAcc, StringAcc)
+from .core_utils.atomic import atomic_write_bytes
+from .sketches import HyperLogLog, KLLSketch, SpaceSaving
+
+
+STATE_VERSION = 3
+STATE_NAME = "profile.state.arrow"
+META_KEY = b"dprof.state"
+
+_TS = pa.timestamp("ns", tz="UTC")
+
+SCHEMA = pa.schema([
+    ("name", pa.string()),
+    ("original_dtype", pa.string()),
+    ("type", pa.string()),
+    ("dtype_family", pa.string()),
+    ("non_null", pa.int64()),
+    ("null", pa.int64()),
+    ("dirty", pa.bool_()),
+    ("coerce_seen", pa.bool_()),
+    # регистры HLL, p = log2(длины)
+    ("hll", pa.binary()),
+    ("numeric", pa.struct([
+        ("s", pa.float64()),
+        ("s2", pa.float64()),
+        ("min", pa.float64()),
+        ("max", pa.float64()),
+        # точные min/max целочисленных колонок
+        ("min_int", pa.int64()),
+        ("max_int", pa.int64()),
+        ("k", pa.int32()),
+        ("n", pa.int64()),
+        ("coin", pa.int8()),
+        # элементы KLL всех уровней по возрастанию и уровень каждого -
+        # квантили считаются без сортировки
+        ("depth", pa.int8()),
+        ("values", pa.list_(pa.float64())),
+        ("heights", pa.list_(pa.int8())),
+    ])),
+    ("string", pa.struct([
+        ("sum_len", pa.int64()),
+        ("min_len", pa.int64()),
+        ("max_len", pa.int64()),
+        ("exact", pa.bool_()),
+        ("capacity", pa.int32()),
+        ("n", pa.int64()),
+        ("keys", pa.list_(pa.string())),
+        ("counts", pa.list_(pa.int64())),
+        ("errors", pa.list_(pa.int64())),
+    ])),
+    ("datetime", pa.struct([("min", _TS), ("max", _TS), ("format", pa.string()), ("fallback", pa.int64())])),
+    ("bool", pa.struct([("true_count", pa.int64()), ("false_count", pa.int64())])),
+    ("coercion", pa.struct([("coerced_nulls", pa.int64()), ("total", pa.int64())])),
+    # строка матриц --correlations; порядок колонок матриц - meta["correlations"]
+    ("correlation", pa.struct([
+        ("shift", pa.float64()),
+        ("n", pa.list_(pa.int64())),
+        ("sx", pa.list_(pa.float64())),
+        ("sxx", pa.list_(pa.float64())),
+        ("sxy", pa.list_(pa.float64())),
+    ])),
+])
+
+
+def _exact_int(v: Any) -> int | None:
+    if isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)):
+        exact = int(v)
+        if -(1 << 63) <= exact < (1 << 63):
+            return exact
+    return None
+
+
+def _finite_int(v: Any) -> int | None:
+    return None if v in (float("inf"), float("-inf")) else int(v)
+
+
+def _numeric_row(acc: NumericAcc) -> dict[str, Any]:
+    row: dict[str, Any] = {"s": acc.s, "s2": acc.s2,
+           "min": float(acc.min), "max": float(acc.max),
+           "min_int": _exact_int(acc.min), "max_int": _exact_int(acc.max)}
+    sk = acc.sketch
+    if sk is not None:
+        # порядок внутри уровня KLL не важен: сжатие и квантили всё равно сортируют
+        values = np.concatenate(sk.levels)
+        heights = np.repeat(np.arange(len(sk.levels), dtype=np.int8), [len(lvl) for lvl in sk.levels])
+        order = np.argsort(values, kind="stable")
+        row.update(k=sk.k, n=sk.n, coin=sk._coin, depth=len(sk.levels),
+                   values=values[order], heights=heights[order])
+    return row
+
+
+def _string_row(acc: StringAcc) -> dict[str, Any]:
+    counter = acc.counter
+    keys: list[Any] | npt.NDArray[np.object_]
+    counts: list[int] | npt.NDArray[np.int64]
+    if isinstance(counter, Counter):
+        keys, counts = list(counter), list(counter.values())
+        errors, capacity, n = None, None, None
+    else:
+        keys, counts, errors = counter.keys, counter.counts, counter.errors
+        capacity, n = counter.capacity, counter.n
+    # ключи top-k храним строками
+    return {"sum_len": int(acc.sum_len),
+            "min_len": _finite_int(acc.min_len), "max_len": _finite_int(acc.max_len),
+            "exact": isinstance(counter, Counter), "capacity": capacity, "n": n,
+            "keys": [k if isinstance(k, str) else str(k) for k in keys],
+            "counts": counts, "errors": errors}
+
+
+def _datetime_row(acc: DatetimeAcc) -> dict[str, Any]:
+    empty = acc.min_dt > acc.max_dt
+    return {"min": None if empty else acc.min_dt, "max": None if empty else acc.max_dt,
+            "format": acc.fmt, "fallback": acc.fallback}
+
+
+def _correlation_row(acc: CorrelationAcc | None, name: str) -> dict[str, Any] | None:
+    if acc is None or name not in acc.index:
+        return None
+    i = acc.index[name]
+    return {"shift": float(acc.shift[i]), "n": acc.n[i], "sx": acc.sx[i], "sxx": acc.sxx[i], "sxy": acc.sxy[i]}
+
+
+def _row(name: str, stat: ColumnState, correlations: CorrelationAcc | None = None) -> dict[str, Any]:
+    return {"name": name,
+            "original_dtype": stat.original_dtype,
+            "type": stat.type,
+            "dtype_family": stat.dtype_family,
+            "non_null": int(stat.non_null),
+            "null": int(stat.null),
+            "dirty": stat.dirty,
+            "coerce_seen": stat.coerce_seen,
+            "hll": stat.hll.registers.tobytes() if stat.hll is not None else None,
+            "numeric": _numeric_row(stat.numeric) if stat.numeric is not None else None,
+            "string": _string_row(stat.string) if stat.string is not None else None,
+            "datetime": _datetime_row(stat.datetime) if stat.datetime is not None else None,
+            "bool": ({"true_count": stat.bool.true_count, "false_count": stat.bool.false_count}
+                     if stat.bool is not None else None),
+            "coercion": ({"coerced_nulls": stat.coercion.coerced_nulls, "total": stat.coercion.total}
+                         if stat.coercion is not None else None),
+            "correlation": _correlation_row(correlations, name)}
+
+
+def write_state(path: Path, profile: dict[str, ColumnState], meta: dict[str, Any],
+                correlations: CorrelationAcc | None = None) -> None:
+    """Write the mergeable state of every column as an Arrow IPC file.
+
+    One row per column; `meta` (dataset section, topk, percentiles) goes
+    to the schema metadata together with the format version. Rows of the
+    `correlations` matrices are stored with their columns.
+    """
+    meta = {"version": STATE_VERSION, **meta}
+    if correlations is not None:
+        meta["correlations"] = correlations.names
+    schema = SCHEMA.with_metadata({META_KEY: json.dumps(meta, ensure_ascii=False)})
+    table = pa.Table.from_pylist([_row(name, stat, correlations) for name, stat in profile.items()],
+                                 schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, schema) as writer:
+        writer.write_table(table)
+    atomic_write_bytes(path, sink.getvalue().to_pybytes())
+
+
+def open_state(path: Path,
+               fields: Iterable[str] | None = None,
+               columns: Iterable[str] | None = None) -> tuple[pa.Table, dict[str, Any]]:
+    """Memory-map a state file.
+
+    `fields` limits the table to these schema fields, `columns` to these
+    profile columns. Fields are selected first, so pages of other fields
+    are never touched; filtering by `columns` copies only the selected
+    fields (plus `name`).
+    """
+    reader = pa.ipc.open_file(pa.memory_map(str(path)))
+    meta = json.loads(reader.schema.metadata[META_KEY])
+    if meta.get("version") != STATE_VERSION:
+        raise ValueError(f"unsupported state version {meta.get('version')} in {path}")
+    table = reader.read_all()
+    names = list(fields) if fields is not None else table.column_names
+    if columns is None:
+        return table.select(names), meta
+    # по name фильтруем, даже если само поле не запрошено
+    table = table.select(names if "name" in names else [*names, "name"])
+    table = table.filter(pc.is_in(table["name"], value_set=pa.array(list(columns), pa.string())))
+    return table.select(names), meta
+
+
+def _numeric_acc(row: dict[str, Any]) -> NumericAcc:
+    acc = NumericAcc(None)
+    acc.s, acc.s2 = row["s"], row["s2"]
+    acc.min = row["min_int"] if row["min_int"] is not None else row["min"]
+    acc.max = row["max_int"] if row["max_int"] is not None else row["max"]
+    if row["k"] is not None:
+        sk = KLLSketch(row["k"])
+        sk.n = row["n"]
+        sk._coin = row["coin"]
+        values = np.asarray(row["values"], dtype=np.float64)
+        heights = np.asarray(row["heights"], dtype=np.int8)
+        sk.levels = [values[heights == h] for h in range(row["depth"])]
+        acc.sketch = sk
+    return acc
+
+
+def _string_acc(row: dict[str, Any]) -> StringAcc:
+    if row["exact"]:
+        acc = StringAcc(exact=True)
+        acc.counter = Counter(dict(zip(row["keys"], row["counts"])))
+    else:
+        acc = StringAcc(row["capacity"])
+        counter = SpaceSaving(row["capacity"])
+        counter.n = row["n"]
+        counter.keys = np.array(row["keys"], dtype=object)
+        counter.counts = np.array(row["counts"], dtype=np.int64)
+        counter.errors = np.array(row["errors"], dtype=np.int64)
+        acc.counter = counter
+    acc.sum_len = row["sum_len"]
+    if row["min_len"] is not None:
+        acc.min_len, acc.max_len = row["min_len"], row["max_len"]
+    return acc
+
+
+def _column_state(row: dict[str, Any], dt_min: Any, dt_max: Any) -> ColumnState:
+    hll = None
+    if row["hll"] is not None:
+        hll = HyperLogLog(len(row["hll"]).bit_length() - 1)
+        hll.registers = np.frombuffer(row["hll"], dtype=np.uint8).copy()
+    stat = ColumnState(row["original_dtype"], row["type"], hll, row["dtype_family"])
+    stat.non_null = row["non_null"]
+    stat.null = row["null"]
+    stat.dirty = row["dirty"]
+    stat.coerce_seen = row["coerce_seen"]
+    if row["numeric"] is not None:
+        stat.numeric = _numeric_acc(row["numeric"])
+    if row["string"] is not None:
+        stat.string = _string_acc(row["string"])
+    if row["datetime"] is not None:
+        stat.datetime = DatetimeAcc(row["datetime"]["format"])
+        stat.datetime.fallback = row["datetime"]["fallback"]
+        if dt_min is not None:
+            stat.datetime.update(dt_min, dt_max)
+    if row["bool"] is not None:
+        stat.bool = BoolAcc()
+        stat.bool.true_count = row["bool"]["true_count"]
+        stat.bool.false_count = row["bool"]["false_count"]
+    if row["coercion"] is not None:
+        stat.coercion = CoercionAcc()
+        stat.coercion.update(row["coercion"]["coerced_nulls"], row["coercion"]["total"])
+    return stat
+
+
+def read_state(path: Path,
+               columns: Iterable[str] | None = None) -> tuple[dict[str, ColumnState], dict[str, Any]]:
+    table, meta = open_state(path, columns=columns)
+    # as_py теряет наносекунды - метки времени берём через pandas
+    dt = table["datetime"].combine_chunks()
+    dt_min = dt.field("min").to_pandas().tolist()
+    dt_max = dt.field("max").to_pandas().tolist()
+    profile = {}
+    for row, lo, hi in zip(table.to_pylist(), dt_min, dt_max):
+        profile[row["name"]] = _column_state(row, None if pd.isna(lo) else lo, hi)
+    return profile, meta
+
+
+def read_correlations(path: Path, columns: Iterable[str] | None = None) -> CorrelationAcc | None:
+    """Restore the --correlations state, restricted to `columns` if given;
+    None when the profile was written without it."""
+    table, meta = open_state(path, fields=("name", "correlation"), columns=columns)
+    order = meta.get("correlations")
+    if order is None:
+        return None
+    corr = table["correlation"].combine_chunks()
+    table = table.filter(corr.is_valid())
+    corr = table["correlation"].combine_chunks()
+    names = table["name"].to_pylist()
+    # строки хранятся в порядке профиля, столбцы матриц - в порядке order
+    pos = {name: i for i, name in enumerate(order)}
+    keep = np.array([pos[name] for name in names], dtype=np.int64)
+
+    def matrix(field: str) -> npt.NDArray[Any]:
+        # n - целые, остальные поля - float64
+        flat: npt.NDArray[Any] = pc.list_flatten(pc.struct_field(corr, field)).to_numpy()
+        return flat.reshape(len(names), len(order))[:, keep]
+
+    acc = CorrelationAcc()
+    acc.names = names
+    acc.index = {name: i for i, name in enumerate(names)}
+    acc.shift = pc.struct_field(corr, "shift").to_numpy()
+    acc.n, acc.sx, acc.sxx, acc.sxy = (matrix(field) for field in ("n", "sx", "sxx", "sxy"))
+    return acc
+
+
+def kll_quantile(numeric: pa.Array | pa.ChunkedArray, q: float) -> npt.NDArray[np.float64]:
+    """`KLLSketch.quantile(q)` of every row of a `numeric` column at once;
+    NaN where there is no sketch or it is empty."""
+    if isinstance(numeric, pa.ChunkedArray):
+        numeric = numeric.combine_chunks()
+    n = len(numeric)
+    values_list = pc.struct_field(numeric, "values")
+    counts = pc.list_value_length(values_list).fill_null(0).to_numpy().astype(np.int64)
+    values = pc.list_flatten(values_list).to_numpy()
+    heights = pc.list_flatten(pc.struct_field(numeric, "heights")).to_numpy().astype(np.int64)
+    weight = np.left_shift(1, heights)
+
+    # значения уже отсортированы внутри колонки: накопленный вес от её начала
+    col = np.repeat(np.arange(n), counts)
+    has = counts > 0
+    start = np.cumsum(counts) - counts
+    cum = np.cumsum(weight)
+    cum -= np.repeat(cum[start[has]] - weight[start[has]], counts[has])
+    total = np.zeros(n, dtype=np.int64)
+    total[has] = cum[start[has] + counts[has] - 1]
+
+    # как searchsorted(cum, q * total, side="left") внутри каждой колонки
+    below = np.bincount(col, weights=cum < q * total[col], minlength=n).astype(np.int64)
+    idx = start + np.minimum(below, counts - 1)
+    out = np.full(n, np.nan)
+    out[has] = values[idx[has]]
+    return out
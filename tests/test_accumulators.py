@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from dpdd.accumulators import ColumnState, NumericAcc, StringAcc
+from dpdd.sketches import HyperLogLog
+
+
+def test_numeric_merge_matches_single_pass() -> None:
+    values = np.random.default_rng(0).normal(size=10_000)
+    whole = NumericAcc(200)
+    whole.update(values)
+    left, right = NumericAcc(200), NumericAcc(200)
+    left.update(values[:3_000])
+    right.update(values[3_000:])
+    left.merge(right)
+
+    a = whole.finalize(len(values), (50.0, 99.0))
+    b = left.finalize(len(values), (50.0, 99.0))
+    assert np.isclose(a["mean"], b["mean"]) and np.isclose(a["std"], b["std"])
+    assert (a["min"], a["max"]) == (b["min"], b["max"])
+    assert set(b) == {"mean", "std", "min", "max", "p50", "p99"}
+
+
+def test_footer_state_drops_moments_on_merge() -> None:
+    full = NumericAcc(200)
+    full.update(np.arange(10, dtype=np.int64))
+    footer = NumericAcc(None)
+    footer.min, footer.max = -5, 3
+    full.merge(footer)
+    out = full.finalize(12, (50.0,))
+    assert out == {"min": -5, "max": 9}
+
+
+def test_column_state_pickles_and_serializes() -> None:
+    stat = ColumnState("object", "string", HyperLogLog(8), "object")
+    stat.string = StringAcc(16)
+    stat.string.update(pd.Series({"b": 2, "a": 1}), np.array([1, 1, 1]))
+    stat.non_null = 3
+
+    copy = pickle.loads(pickle.dumps(stat))
+    assert copy.kind() == stat.kind()
+    out = copy.to_dict(k=5, percentiles=(50.0,))
+    assert out["string"]["top_k"] == [("b", 2), ("a", 1)]
+    assert out["string"]["avg_len"] == 1.0
+    assert "original_dtype" not in out and "dirty" not in out
@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from dpdd import profiler
+from dpdd.bench import (BenchCompareArgs, DatasetSpec, _slow_storage, compare_results,
+                        generate_dataset, run_bench_compare, run_benchmarks, write_results)
+
+from test_profile import make_emit
+
+
+def test_generate_dataset_is_deterministic(tmp_path: Path) -> None:
+    spec = DatasetSpec("t", rows=2_000, width=7, files=3, null_rate=0.2, bad_rate=0.1, cardinality=50)
+    a = generate_dataset(spec, tmp_path / "a")
+    b = generate_dataset(spec, tmp_path / "b")
+    names = sorted(p.name for p in a.glob("*.csv"))
+    assert names == ["part-0000.csv", "part-0001.csv", "part-0002.csv"]
+    assert all((a / n).read_bytes() == (b / n).read_bytes() for n in names)
+
+    df = pd.concat(pd.read_csv(a / n, dtype=str) for n in names)
+    assert len(df) == 2_000
+    assert list(df.columns) == ["int_0", "float_1", "string_2", "datetime_3", "bool_4", "dirty_5", "int_6"]
+    assert df["string_2"].nunique() <= 50
+    assert 0.15 < df["float_1"].isna().mean() < 0.25
+    assert (df["dirty_5"] == "unknown").any()
+    # уже сгенерированный набор не пишется повторно
+    mtime = (a / names[0]).stat().st_mtime_ns
+    assert generate_dataset(spec, tmp_path / "a") == a and (a / names[0]).stat().st_mtime_ns == mtime
+
+
+def test_run_and_compare_flags_regressions(tmp_path: Path) -> None:
+    events: list[dict] = []
+    spec = DatasetSpec("tiny", rows=500, width=4, files=1, fmt="parquet")
+    results = run_benchmarks([spec], {"pandas": {}}, tmp_path / "data", 1, make_emit(events))
+    [case] = results["results"]
+    assert (case["dataset"], case["config"], case["rows"]) == ("tiny", "pandas", 500)
+    assert case["rows_per_s"] > 0 and case["peak_rss_bytes"] > 0
+    assert events[-1]["event"] == "bench_case"
+
+    slower = json.loads(json.dumps(results))
+    slower["results"][0]["rows_per_s"] *= 0.5
+    slower["results"][0]["peak_rss_bytes"] *= 2
+    assert compare_results(results, results) == []
+    assert [r["metric"] for r in compare_results(results, slower)] == ["rows_per_s", "peak_rss_bytes"]
+    # в пределах допуска - не регрессия
+    assert compare_results(results, slower, tolerance=0.6, memory_tolerance=2.0) == []
+
+    write_results(tmp_path / "base.json", results)
+    write_results(tmp_path / "new.json", slower)
+    assert run_bench_compare(BenchCompareArgs(tmp_path / "base.json", tmp_path / "base.json"),
+                             make_emit(events)) == 0
+    assert run_bench_compare(BenchCompareArgs(tmp_path / "base.json", tmp_path / "new.json"),
+                             make_emit(events)) == 1
+    assert [e["event"] for e in events[-3:]] == ["bench_regression", "bench_regression",
+                                                 "bench_compare_completed"]
+
+
+def test_slow_storage_restores_reader(tmp_path: Path) -> None:
+    read = profiler.iter_frames
+    path = tmp_path / "a.csv"
+    path.write_text("x\n1\n2\n")
+    with pytest.raises(RuntimeError), _slow_storage(0.001):
+        assert profiler.iter_frames is not read
+        assert [len(f) for _, _, f in profiler.iter_frames(path, "csv", 1)] == [1, 1]
+        raise RuntimeError
+    # подмена снимается и при ошибке внутри замера
+    assert profiler.iter_frames is read
@@ -1,7 +1,7 @@
 import pytest
 from pathlib import Path
 
-from dpdd.cli import validate_profile_args, ProfileArgs, UXError
+from dpdd.cli import parse_size, validate_profile_args, ProfileArgs, UXError
 from utils import run_profile_cli
 
 
@@ -112,3 +112,20 @@ def test_profile_args_validation_bad_dir(tmp_path: Path, monkeypatch) -> None:
     args = ProfileArgs(src=src, dst=dst, fmt=None, sample=1, chunksize=10_000, topk=20)
     with pytest.raises(UXError):
         validate_profile_args(args)
+
+
+def test_size_and_prefetch_validation(tmp_path: Path) -> None:
+    assert parse_size("512M") == 512 << 20
+    assert parse_size("1.5g") == 3 << 29
+    assert parse_size("64") == 64 << 20
+    for raw in ("0", "0M", "-1G", "nan", "inf", "0.0000001K", "big"):
+        with pytest.raises(UXError):
+            parse_size(raw)
+
+    src = tmp_path / "input.csv"
+    src.write_text("a,b\n" + "1,2\n")
+    kwargs = dict(src=src, dst=tmp_path / "result", fmt=None, sample=1, chunksize=10_000, topk=20, threshold=0.95)
+    assert validate_profile_args(ProfileArgs(**kwargs, prefetch=0)) == "csv"
+    for bad in ({"prefetch": -1}, {"max_memory": 0}, {"max_memory": -(1 << 20)}):
+        with pytest.raises(UXError):
+            validate_profile_args(ProfileArgs(**kwargs, **bad))
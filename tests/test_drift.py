@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from dpdd.drift import CompareArgs, run_compare
+
+
+def make_emit(events: list[dict]):
+    def emit(level: str = "INFO", event: str = "message", **payload) -> None:
+        events.append({"level": level, "event": event, **payload})
+    return emit
+
+
+def write_profile(path: Path, columns: dict) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"dataset": {}, "columns": columns}))
+    return path
+
+
+def numeric(null: int, non_null: int, mean: float | None, p95: float | None) -> dict:
+    return {"type": "float", "null": null, "non_null": non_null,
+            "numeric": {"mean": mean, "p95": p95}}
+
+
+def test_compare_matches_artifact_layout(tmp_path: Path) -> None:
+    left = write_profile(tmp_path / "left.json", {
+        "age": numeric(3, 97, 34.1, 59.0),
+        "score": numeric(0, 100, 1.0, 2.0),
+        "name": {"type": "string", "null": 0, "non_null": 10, "string": {}},
+        "gone": numeric(0, 10, 1.0, 1.0),
+    })
+    right = write_profile(tmp_path / "right.json", {
+        "age": numeric(11, 89, 37.0, 64.0),
+        "score": numeric(0, 100, 1.5, 2.5),
+        "name": {"type": "string", "null": 5, "non_null": 5, "string": {}},
+        "new": numeric(0, 10, 1.0, 1.0),
+    })
+    events: list[dict] = []
+    args = CompareArgs(left=left, right=(right,), dst=tmp_path / "out")
+    args.dst.mkdir()
+    assert run_compare(args, make_emit(events)) == 0
+
+    drift = json.loads((args.dst / "drift.json").read_text())
+    assert drift["params"] == {"null_delta": 0.05, "mean_delta": 2.0, "p95_delta": 3.0}
+    age = drift["columns"]["age"]
+    assert np.isclose(age["null_rate_delta"], 0.08)
+    assert np.isclose(age["mean_delta"], 2.9) and age["p95_delta"] == 5.0
+    assert age["alerts"] == ["null_rate_exceeds_0.05", "mean_shift_gt_2.0", "p95_shift_gt_3.0"]
+    assert drift["columns"]["score"]["alerts"] == []
+    assert drift["columns"]["name"]["alerts"] == ["null_rate_exceeds_0.05"]
+    assert drift["columns"]["name"]["mean_left"] is None
+    assert drift["columns"]["gone"]["null_rate_right"] is None
+    assert drift["columns"]["new"]["alerts"] == []
+    assert drift["summary"] == {"alerts_total": 4}
+
+    alerts = [e for e in events if e["event"] == "compare_alert"]
+    assert len(alerts) == 4 and all(e["level"] == "WARN" for e in alerts)
+    assert {(e["column"], e["kind"]) for e in alerts} == {
+        ("age", "null_rate"), ("age", "mean"), ("age", "p95"), ("name", "null_rate")}
+    assert events[-1]["event"] == "compare_completed" and events[-1]["alerts_total"] == 4
+
+
+def test_compare_batch_against_one_baseline(tmp_path: Path) -> None:
+    cols = [f"c{i}" for i in range(2_000)]
+    left = write_profile(tmp_path / "base" / "profile.json",
+                         {c: numeric(0, 100, 0.0, 1.0) for c in cols})
+    rights = []
+    for day in range(5):
+        # в день `day` дрейфует только колонка c{day}
+        columns = {c: numeric(0, 100, 0.0, 1.0) for c in cols}
+        columns[f"c{day}"] = numeric(0, 100, 10.0, 1.0)
+        rights.append(write_profile(tmp_path / "daily" / f"2024-01-0{day + 1}" / "profile.json", columns))
+    rights.append(tmp_path / "daily" / "broken" / "profile.json")
+    rights[-1].parent.mkdir()
+    rights[-1].write_text("{")
+
+    events: list[dict] = []
+    args = CompareArgs(left=left, right=tuple(rights), dst=tmp_path / "out")
+    args.dst.mkdir()
+    assert run_compare(args, make_emit(events)) == 4
+
+    for day in range(5):
+        drift = json.loads((args.dst / f"2024-01-0{day + 1}.drift.json").read_text())
+        assert drift["summary"]["alerts_total"] == 1
+        assert drift["columns"][f"c{day}"]["alerts"] == ["mean_shift_gt_2.0"]
+    assert [e["event"] for e in events].count("compare_completed") == 5
+    failed = [e for e in events if e["event"] == "compare_failed"]
+    assert len(failed) == 1 and failed[0]["right_path"] == str(rights[-1])
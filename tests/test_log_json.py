@@ -0,0 +1,69 @@
+import io
+import json
+import logging
+from pathlib import Path
+
+from dpdd.log_json import JsonFormatter, QueueJsonHandler, make_emit, throttle_emit
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def test_queue_handler_writes_all_records_in_order() -> None:
+    out = io.StringIO()
+    handler = QueueJsonHandler(out, batch=7)
+    emit = make_emit(make_logger("test_queue", handler), "run", "profile")
+    for i in range(100):
+        emit(event="profile_chunk_scanned", path="a.csv", chunk_idx=i, rows=10)
+    emit(level="WARN", event="nested", value={"p": Path("x")}, items=(1, 2))
+    emit(level="DEBUG", event="hidden")
+    handler.flush()
+    handler.close()
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["chunk_idx"] for r in lines[:100]] == list(range(100))
+    first = lines[0]
+    assert list(first)[:5] == ["ts", "level", "event", "run_id", "component"]
+    assert first["ts"].endswith("Z") and "message" not in first
+    # не плоский payload идёт через coerce_val
+    assert (lines[100]["level"], lines[100]["event"]) == ("WARN", "nested")
+    assert lines[100]["value"] == {"p": "x"} and lines[100]["items"] == [1, 2]
+    assert len(lines) == 101
+
+
+def test_flat_fast_path_matches_coerced_output() -> None:
+    rec = logging.LogRecord("x", logging.INFO, "", 0, {}, None, None)
+    rec.run_id, rec.component = "run", "profile"
+    rec.payload = {"event": "profile_completed", "rows_total": 3, "ratio": 0.5, "out_path": "p", "flag": None}
+    fast = JsonFormatter().format(rec)
+    # тот же payload, но с вложенным значением - медленный путь
+    rec.payload = {**rec.payload, "extra": [1]}
+    slow = json.loads(JsonFormatter().format(rec))
+    slow.pop("extra")
+    assert json.loads(fast) == slow
+
+
+def test_throttle_emit_thins_chunk_events_only() -> None:
+    events: list[dict] = []
+
+    def emit(level: str = "INFO", event: str = "message", **payload) -> None:
+        events.append({"level": level, "event": event, **payload})
+
+    throttled = throttle_emit(emit, every=3)
+    for path in ("a", "b"):
+        throttled(event="profile_file_started", path=path)
+        for i in range(8):
+            throttled(event="profile_chunk_scanned", path=path, chunk_idx=i, rows=1)
+    throttled(event="profile_completed", rows_total=16)
+
+    chunks = [(e["path"], e["chunk_idx"], e["suppressed"]) for e in events if e["event"] == "profile_chunk_scanned"]
+    assert chunks == [("a", 0, 0), ("a", 3, 2), ("a", 6, 2), ("b", 0, 0), ("b", 3, 2), ("b", 6, 2)]
+    assert [e["event"] for e in events].count("profile_file_started") == 2
+    assert events[-1]["event"] == "profile_completed"
+    assert throttle_emit(emit) is emit
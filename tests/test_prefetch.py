@@ -0,0 +1,69 @@
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from dpdd.core_utils.prefetch import frame_nbytes, prefetch
+
+from test_profile import profile_json, write_dataset
+
+
+def test_prefetch_keeps_order_and_reads_ahead() -> None:
+    produced: list[int] = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    it = prefetch(items(), depth=3)
+    assert next(it) == 0
+    time.sleep(0.2)
+    # очередь на 3 элемента + один, ожидающий места
+    assert len(produced) <= 5 and len(produced) >= 4
+    assert [0, *it] == list(range(10))
+
+
+def test_prefetch_bounds_bytes_and_propagates_errors() -> None:
+    frame = pd.DataFrame({"x": range(1_000)})
+    produced: list[int] = []
+
+    def frames():
+        for i in range(6):
+            produced.append(i)
+            yield Path("a"), i, frame
+        raise ValueError("broken file")
+
+    it = prefetch(frames(), depth=10, max_bytes=frame_nbytes(frame) * 2)
+    next(it)
+    time.sleep(0.2)
+    # глубина 10, но в очереди не больше двух чанков по байтам
+    assert len(produced) <= 4
+    with pytest.raises(ValueError, match="broken file"):
+        list(it)
+
+
+def test_prefetch_close_stops_producer() -> None:
+    closed = threading.Event()
+
+    def endless():
+        try:
+            while True:
+                yield 1
+        finally:
+            closed.set()
+
+    it = prefetch(endless(), depth=2)
+    next(it)
+    it.close()
+    assert closed.wait(2)
+
+
+def test_profile_same_with_and_without_prefetch(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    plain = profile_json(src, tmp_path / "plain", cache=False, prefetch=0)
+    assert profile_json(src, tmp_path / "ahead", cache=False, prefetch=3) == plain
+    assert profile_json(src, tmp_path / "budget", cache=False, prefetch=2,
+                        max_memory=1 << 20)["columns"]["x"]["null"] == plain["columns"]["x"]["null"]
@@ -0,0 +1,678 @@
+import json
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dpdd.core_utils import io_helpers
+from dpdd.core_utils.io_helpers import (MIN_CHUNK_ROWS, csv_blocks, detect_datetime_format, dictionary_columns, iter_frames,
+                                        parse_datetimes, parse_numeric_strings, plan_chunks)
+from dpdd.core_utils.row_filter import RowFilter
+from dpdd.core_utils.sampling import Sampler
+from dpdd.core_utils.state_cache import StateCache
+from dpdd.profiler import ProfileArgs, run_profile
+
+
+def make_emit(events: list[dict]):
+    def emit(level: str = "INFO", event: str = "message", **payload) -> None:
+        events.append({"level": level, "event": event, **payload})
+    return emit
+
+
+def write_dataset(root: Path, files: int = 4, rows: int = 2_000) -> Path:
+    src = root / "input"
+    src.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(files):
+        df = pd.DataFrame({
+            "id": np.arange(rows) + i * rows,
+            "x": rng.normal(size=rows),
+            "s": rng.choice(["a", "bb", "ccc", None], rows),
+            "ts": pd.date_range("2024-01-01", periods=rows, freq="min").astype(str),
+        })
+        df.loc[::7, "x"] = np.nan
+        df.to_csv(src / f"part-{i}.csv", index=False)
+    return src
+
+
+def write_parquet_dataset(root: Path, files: int = 3, rows: int = 3_000) -> Path:
+    src = root / "input_parquet"
+    src.mkdir()
+    rng = np.random.default_rng(1)
+    for i in range(files):
+        df = pd.DataFrame({
+            "id": np.arange(rows) + i * rows,
+            "n": pd.array(rng.integers(0, 100, rows), dtype="Int64"),
+            "x": rng.normal(size=rows),
+            "s": rng.choice(["a", "bb", "ccc", None], rows),
+            "hi": [f"u{v}" for v in rng.integers(0, 2_000, rows)],
+            "ts": pd.date_range("2024-01-01", periods=rows, freq="min"),
+            "flag": rng.choice([True, False], rows),
+            "dirty": [f"{v:,.2f}".replace(",", " ") for v in rng.normal(1_000, 500, rows)],
+        })
+        df.loc[::7, "x"] = np.nan
+        df.loc[::11, "n"] = pd.NA
+        df.loc[::13, "ts"] = pd.NaT
+        df.to_parquet(src / f"part-{i}.parquet", row_group_size=1_000)
+    return src
+
+
+def write_multiline_csv(root: Path, rows: int = 30_000) -> Path:
+    # ~3 МБ: поле note в кавычках с переводами строк пересекает границы блоков
+    src = root / "input_notes"
+    src.mkdir()
+    rng = np.random.default_rng(2)
+    pd.DataFrame({
+        "id": np.arange(rows),
+        "note": [f'line {i}\nsaid "hi",\n{"x" * int(n)}' for i, n in enumerate(rng.integers(10, 80, rows))],
+        "x": rng.normal(size=rows),
+    }).to_csv(src / "notes.csv", index=False)
+    return src
+
+
+def profile_json(src: Path, dst: Path, fmt: str = "csv", sample: float = 1.0,
+                 events: list[dict] | None = None, **kwargs) -> dict:
+    args = ProfileArgs(src=src, dst=dst, fmt=fmt, sample=sample, chunksize=700,
+                       topk=5, threshold=0.95, **kwargs)
+    dst.mkdir(exist_ok=True)
+    assert run_profile(args, make_emit(events if events is not None else [])) == 0
+    out = json.loads((dst / "profile.json").read_text())
+    del out["dataset"]["generated_at"]
+    return out
+
+
+def test_profile_sections(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    out = profile_json(src, tmp_path / "out")
+
+    assert out["dataset"]["rows"] == 8_000
+    x = out["columns"]["x"]
+    assert x["type"] == "float"
+    assert x["null"] == 4 * len(range(0, 2_000, 7))
+    assert {"p50", "p95", "p99", "mean", "std"} <= set(x["numeric"])
+    s = out["columns"]["s"]["string"]
+    assert len(s["top_k"]) == 3
+    assert out["columns"]["s"]["approx_distinct"] == 3
+    assert out["columns"]["ts"]["type"] == "datetime"
+
+
+def test_parallel_matches_sequential(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    sequential = profile_json(src, tmp_path / "seq")
+    parallel = profile_json(src, tmp_path / "par", workers=3)
+    assert parallel == sequential
+
+
+def test_arrow_engine_matches_pandas(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    pandas_out = profile_json(src, tmp_path / "pd", fmt="parquet", topk_capacity=64)
+    arrow_out = profile_json(src, tmp_path / "pa", fmt="parquet", topk_capacity=64, engine="arrow")
+    assert arrow_out == pandas_out
+
+
+def test_stats_only_uses_parquet_footer(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    full = profile_json(src, tmp_path / "full", fmt="parquet")
+    fast = profile_json(src, tmp_path / "fast", fmt="parquet", stats_only=True)
+
+    assert fast["dataset"]["stats_only"] is True
+    assert fast["dataset"]["rows"] == full["dataset"]["rows"]
+    for col in ("id", "x", "n"):
+        assert fast["columns"][col]["null"] == full["columns"][col]["null"]
+        assert fast["columns"][col]["numeric"]["min"] == full["columns"][col]["numeric"]["min"]
+        assert fast["columns"][col]["numeric"]["max"] == full["columns"][col]["numeric"]["max"]
+        assert "mean" not in fast["columns"][col]["numeric"]
+    assert fast["columns"]["ts"]["datetime"] == full["columns"]["ts"]["datetime"]
+    assert fast["columns"]["s"] == full["columns"]["s"]
+
+
+def test_stats_only_matches_scan_types_and_signed_zero(tmp_path: Path) -> None:
+    src = tmp_path / "input"
+    src.mkdir()
+    n = 2_000
+    pq.write_table(pa.table({"z": pa.array([0.0, -0.0] * (n // 2)),
+                             "i": pa.array([None, *range(1, n)], pa.int64()),
+                             "j": pa.array(range(n), pa.int32())}), src / "part-0.parquet")
+    full = profile_json(src, tmp_path / "full", fmt="parquet")
+    fast = profile_json(src, tmp_path / "fast", fmt="parquet", stats_only=True)
+
+    # -0.0 из футера и из данных - один и тот же 0.0 (== не отличает -0.0)
+    for out in (full, fast):
+        numeric = out["columns"]["z"]["numeric"]
+        assert (str(numeric["min"]), str(numeric["max"])) == ("0.0", "0.0")
+    for col in ("z", "i", "j"):
+        assert fast["columns"][col]["null"] == full["columns"][col]["null"]
+        assert fast["columns"][col]["numeric"]["min"] == full["columns"][col]["numeric"]["min"]
+        assert fast["columns"][col]["numeric"]["max"] == full["columns"][col]["numeric"]["max"]
+    # тип - по схеме Arrow, а не по float64, в который pandas превращает int с пропусками
+    assert [fast["columns"][col]["type"] for col in ("z", "i", "j")] == ["float", "numeric", "int"]
+
+
+def test_column_projection_and_row_filter(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    out = profile_json(src, tmp_path / "pq", fmt="parquet",
+                       columns=("i*", "x", "s*"), exclude_columns=("s",),
+                       row_filter="flag == True and x > 0")
+    assert set(out["columns"]) == {"id", "x"}
+    assert out["columns"]["x"]["numeric"]["min"] > 0
+
+    frames = pd.concat(pd.read_parquet(p) for p in sorted(src.glob("*.parquet")))
+    assert out["dataset"]["rows"] == int(((frames["flag"]) & (frames["x"] > 0)).sum())
+
+    csv_src = write_dataset(tmp_path)
+    out = profile_json(csv_src, tmp_path / "csv", columns=("id",), row_filter="s in ['a', 'bb']")
+    assert set(out["columns"]) == {"id"}
+    frames = pd.concat(pd.read_csv(p) for p in sorted(csv_src.glob("*.csv")))
+    assert out["dataset"]["rows"] == int(frames["s"].isin(["a", "bb"]).sum())
+
+
+
+def test_row_filter_nulls_same_for_csv_and_parquet(tmp_path: Path) -> None:
+    df = pd.DataFrame({"x": [1.0, 5.0, np.nan, 7.0] * 50, "s": ["a", None, "b", "a"] * 50})
+    for fmt in ("csv", "parquet"):
+        (tmp_path / fmt).mkdir()
+    df.to_csv(tmp_path / "csv" / "part-0.csv", index=False)
+    df.to_parquet(tmp_path / "parquet" / "part-0.parquet")
+
+    # строка с пропуском в сравнении отбрасывается и после not / or
+    for expr, rows in [("x != 5", 100), ("not (x > 2)", 50), ("x not in [5]", 150),
+                       ("not (x > 2) or s == 'a'", 100), ("not (x != 5 and s == 'b')", 150)]:
+        counts = [profile_json(tmp_path / fmt, tmp_path / f"out-{fmt}", fmt=fmt, row_filter=expr,
+                               cache=False)["dataset"]["rows"]
+                  for fmt in ("csv", "parquet")]
+        assert counts == [rows, rows], expr
+
+
+def test_detection_plan_survives_leading_nulls(tmp_path: Path) -> None:
+    src = tmp_path / "input"
+    src.mkdir()
+    rows = 3_000
+    pd.DataFrame({
+        "late": [None] * 1_000 + list(range(rows - 1_000)),
+        "flag": ["yes", "no", "true"] * (rows // 3),
+        "code": [f"c{i % 50}" for i in range(rows)],
+    }).to_csv(src / "part-0.csv", index=False)
+
+    out = profile_json(src, tmp_path / "out", detect_sample=50)
+    late = out["columns"]["late"]
+    assert late["type"] == "float"
+    assert (late["null"], late["non_null"]) == (1_000, 2_000)
+    assert late["numeric"]["max"] == 1_999
+    assert out["columns"]["flag"]["bool"]["true_count"] == 2_000
+    assert out["columns"]["code"]["type"] == "string"
+
+
+def test_block_sampling_reads_whole_units(tmp_path: Path) -> None:
+    src = tmp_path / "input"
+    src.mkdir()
+    rows = 20_000
+    pd.DataFrame({"id": np.arange(rows), "s": ["x" * (i % 17) for i in range(rows)]}).to_csv(
+        src / "big.csv", index=False)
+
+    sampler = Sampler(0.3, "block", seed=7, key="big.csv")
+    frames = [f for _, _, f in iter_frames(src, "csv", 1_000, sampler=sampler, block_bytes=4_096)]
+    ids = pd.concat(frames)["id"]
+    # блоки выровнены по строкам: ни одна строка не порвана и не повторена
+    assert ids.dtype == np.int64 and ids.is_unique
+    assert 0.15 < len(ids) / rows < 0.45
+    assert abs(sampler.kept / sampler.total - len(ids) / rows) < 0.02
+
+    psrc = write_parquet_dataset(tmp_path)
+    full = profile_json(psrc, tmp_path / "full", fmt="parquet")
+    half = profile_json(psrc, tmp_path / "half", fmt="parquet", sample=0.5, seed=3)
+    again = profile_json(psrc, tmp_path / "again", fmt="parquet", sample=0.5, seed=3, workers=2)
+    assert half == again
+    assert half["dataset"]["rows"] % 1_000 == 0 and half["dataset"]["rows"] < full["dataset"]["rows"]
+    assert half["dataset"]["sample"]["effective_rate"] == half["dataset"]["rows"] / full["dataset"]["rows"]
+
+
+def test_row_sampling_is_seeded(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    a = profile_json(src, tmp_path / "a", sample=0.1, sample_mode="row", seed=1)
+    b = profile_json(src, tmp_path / "b", sample=0.1, sample_mode="row", seed=1, workers=2)
+    c = profile_json(src, tmp_path / "c", sample=0.1, sample_mode="row", seed=2)
+    assert a == b
+    assert a["columns"] != c["columns"]
+    assert a["dataset"]["sample"]["effective_rate"] == a["dataset"]["rows"] / 8_000
+    assert 0.07 < a["dataset"]["sample"]["effective_rate"] < 0.13
+
+
+def test_arrow_csv_reader_matches_pandas(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    frames = [(i, f) for _, i, f in iter_frames(src, "csv", 500, csv_reader="arrow",
+                                                 block_bytes=4_096, threads=4)]
+    got = pd.concat(f for _, f in frames)
+    expected = pd.concat(pd.read_csv(p) for p in sorted(src.glob("*.csv")))
+    assert got["id"].tolist() == expected["id"].tolist()
+    assert np.allclose(got["x"], expected["x"], equal_nan=True)
+    # типы колонок одинаковы во всех блоках
+    assert len({tuple(f.dtypes.astype(str)) for _, f in frames}) == 1
+
+    pandas_out = profile_json(src, tmp_path / "pd")
+    arrow_out = profile_json(src, tmp_path / "pa", csv_reader="arrow", workers=2)
+    assert arrow_out["dataset"]["rows"] == pandas_out["dataset"]["rows"]
+    for col, stat in pandas_out["columns"].items():
+        assert arrow_out["columns"][col]["type"] == stat["type"]
+        assert arrow_out["columns"][col]["null"] == stat["null"]
+    assert np.isclose(arrow_out["columns"]["x"]["numeric"]["mean"], pandas_out["columns"]["x"]["numeric"]["mean"])
+    assert arrow_out["columns"]["ts"]["datetime"] == pandas_out["columns"]["ts"]["datetime"]
+
+
+def test_parse_numeric_strings_and_coercion_stats(tmp_path: Path) -> None:
+    values, failed = parse_numeric_strings(pd.Series(["1 234,5", "1_000", "1,234,567", " 7 ", "abc", "nan"]))
+    assert values[:4].tolist() == [1234.5, 1000.0, 1234567.0, 7.0]
+    assert failed.tolist() == [False, False, False, False, True, True]
+
+    src = tmp_path / "input"
+    src.mkdir()
+    amounts = [f"{i:,}".replace(",", " ") + ",5" for i in range(2_000)]
+    amounts[::40] = ["unknown"] * len(amounts[::40])
+    pd.DataFrame({"amount": amounts}).to_csv(src / "part-0.csv", index=False)
+
+    col = profile_json(src, tmp_path / "out")["columns"]["amount"]
+    bad = len(amounts[::40])
+    assert col["type"] == "float"
+    coercion = col["coercion"]
+    assert (coercion["total"], coercion["coerced_nulls"]) == (2_000, bad)
+    assert coercion["rate"] == (2_000 - bad) / 2_000
+    assert (col["null"], col["non_null"]) == (bad, 2_000 - bad)
+    assert col["numeric"]["max"] == 1999.5
+
+
+def cache_stats(events: list[dict]) -> tuple[int, int]:
+    [stats] = [e for e in events if e["event"] == "profile_cache"]
+    return stats["hits"], stats["misses"]
+
+
+def test_cache_rescans_only_changed_files(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    dst = tmp_path / "out"
+    events: list[dict] = []
+    first = profile_json(src, dst, events=events)
+    assert cache_stats(events) == (0, 4)
+
+    events.clear()
+    assert profile_json(src, dst, events=events) == first
+    assert cache_stats(events) == (4, 0)
+    assert not any(e["event"] == "profile_chunk_scanned" for e in events)
+
+    extra = pd.read_csv(src / "part-0.csv").head(100)
+    extra.to_csv(src / "part-9.csv", index=False)
+    with open(src / "part-1.csv", "a") as f:
+        f.write("99999,1.5,a,2024-02-01 00:00:00\n")
+    events.clear()
+    updated = profile_json(src, dst, events=events)
+    assert cache_stats(events) == (3, 2)
+    assert updated == profile_json(src, tmp_path / "fresh", cache=False)
+    assert updated["dataset"]["rows"] == 8_000 + 100 + 1
+
+    # другие настройки - другие ключи кэша
+    events.clear()
+    profile_json(src, dst, events=events, quantile_k=64)
+    assert cache_stats(events) == (0, 5)
+
+
+def test_cache_keeps_sequential_path(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    plain: list[dict] = []
+    expected = profile_json(src, tmp_path / "plain", events=plain, cache=False)
+
+    # с кэшем промахи профилируются так же, как без него: те же события в том же порядке
+    events: list[dict] = []
+    assert profile_json(src, tmp_path / "out", events=events) == expected
+    def scans(log: list[dict]) -> list[tuple]:
+        return [(e["event"], e.get("path"), e.get("chunk_idx")) for e in log if e["event"] != "profile_cache"]
+
+    assert scans(events) == scans(plain)
+
+    # состояние part-1 начато с типами из part-0; без part-0 оно не годится
+    (src / "part-0.csv").unlink()
+    events.clear()
+    out = profile_json(src, tmp_path / "out", events=events)
+    assert out == profile_json(src, tmp_path / "fresh", cache=False)
+    cached = [e["path"] for e in events if e["event"] == "profile_file_cached"]
+    assert str(src / "part-1.csv") not in cached
+
+
+def test_iter_frames_resumes_from_read_position(tmp_path: Path) -> None:
+    src = write_multiline_csv(tmp_path, rows=6_000)
+    path = src / "notes.csv"
+    # пустые и пробельные строки pandas пропускает - смещения записей их тоже не считают
+    # (пробельные ломают arrow-ридер, они только в файле для pandas)
+    text = path.read_bytes().replace(b"\n900,", b"\n\n900,")
+    path.write_bytes(text)
+    spaced = tmp_path / "spaced.csv"
+    spaced.write_bytes(text.replace(b"\n10,", b"\n\n  \r\n10,"))
+    df = pd.read_csv(path)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path / "notes.parquet",
+                   row_group_size=1_000)
+
+    cases = {
+        "pandas": (spaced, "csv", {}),
+        "pandas_rows": (spaced, "csv", {"sample": ("row", 0.5)}),
+        "pandas_blocks": (spaced, "csv", {"sample": ("block", 0.7), "block_bytes": 64 << 10}),
+        "arrow": (path, "csv", {"csv_reader": "arrow", "block_bytes": 64 << 10}),
+        "parquet": (tmp_path / "notes.parquet", "parquet", {"sample": ("row", 0.5)}),
+        "parquet_blocks": (tmp_path / "notes.parquet", "parquet", {"sample": ("block", 0.7)}),
+        "parquet_filter": (tmp_path / "notes.parquet", "parquet", {"row_filter": RowFilter("x > 0")}),
+    }
+    for name, (file, fmt, kwargs) in cases.items():
+        def read(**more) -> list[pd.DataFrame]:
+            opts = dict(kwargs)
+            if "sample" in opts:
+                mode, rate = opts.pop("sample")
+                opts["sampler"] = Sampler(rate, mode, seed=3, key=file.name)
+            return [f.reset_index(drop=True) for _, _, f in iter_frames(file, fmt, 700, **opts, **more)]
+
+        positions: dict = {}
+        full = read(positions=positions)
+        assert len(full) > 4, name
+        for k in (0, len(full) // 2, len(full) - 2):
+            rest = read(start=positions[k])
+            assert len(rest) == len(full) - k - 1, (name, k)
+            for a, b in zip(rest, full[k + 1:]):
+                pd.testing.assert_frame_equal(a, b)
+
+
+def test_cache_strong_hash_and_eviction(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    dst = tmp_path / "out"
+    profile_json(src, dst, cache_hash=True)
+    for path in src.glob("*.csv"):
+        path.touch()
+
+    events: list[dict] = []
+    profile_json(src, dst, events=events, cache_hash=True)
+    assert cache_stats(events) == (4, 0)
+
+    entry_size = max(p.stat().st_size for p in (dst / ".dprof-cache").iterdir())
+    cache = StateCache(dst / ".dprof-cache", "unused", max_bytes=2 * entry_size)
+    assert cache.evict() == 2
+    assert len(list((dst / ".dprof-cache").iterdir())) == 2
+
+
+def test_resume_after_crash_matches_full_run(tmp_path: Path) -> None:
+    src = write_dataset(tmp_path)
+    expected = profile_json(src, tmp_path / "full", cache=False)
+
+    for name, kwargs in (("seq", {"cache": False}), ("cached", {}), ("par", {"workers": 2, "cache": False})):
+        dst = tmp_path / name
+        dst.mkdir()
+        args = ProfileArgs(src=src, dst=dst, fmt="csv", sample=1.0, chunksize=700, topk=5,
+                           threshold=0.95, checkpoint_rows=1_000, **kwargs)
+        saved = []
+
+        def crash(level: str = "INFO", event: str = "message", **payload) -> None:
+            if event == "profile_checkpoint":
+                saved.append(payload)
+                if len(saved) == 3:
+                    raise MemoryError("simulated crash")
+
+        assert run_profile(args, crash) == 4
+        assert (dst / "profile.ckpt").exists()
+
+        events: list[dict] = []
+        args.resume = True
+        assert run_profile(args, make_emit(events)) == 0
+        [resumed] = [e for e in events if e["event"] == "profile_resumed"]
+        assert resumed["restored"] and resumed["files_done"] >= 1
+        scanned = sum(e["rows"] for e in events if e["event"] == "profile_chunk_scanned")
+        assert scanned < 8_000
+        assert not (dst / "profile.ckpt").exists()
+
+        out = json.loads((dst / "profile.json").read_text())
+        del out["dataset"]["generated_at"]
+        assert out == expected, name
+
+
+def test_perf_event_and_trace(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    plain = profile_json(src, tmp_path / "plain", fmt="parquet", cache=False)
+    assert "perf" not in plain["dataset"]
+
+    events: list[dict] = []
+    trace = tmp_path / "trace.json"
+    out = profile_json(src, tmp_path / "out", fmt="parquet", events=events,
+                       workers=2, cache=False, perf=True, trace=trace)
+    perf = out["dataset"].pop("perf")
+    assert out["columns"] == plain["columns"]
+    assert perf["bytes_scanned"] == sum(p.stat().st_size for p in src.iterdir())
+    assert perf["rows_per_s"] > 0 and perf["peak_rss_bytes"] > 0
+    assert {"read", "detect", "update.numeric", "update.string", "update.datetime",
+            "update.bool", "update.numeric_coerced", "merge"} <= set(perf["phases"])
+
+    event = next(e for e in events if e["event"] == "profile_perf")
+    assert event["rows"] == 9_000 and event["finalize_s"] >= 0 and event["update_numeric_s"] > 0
+    assert all(not isinstance(v, (dict, list)) for v in event.values())
+
+    spans = json.loads(trace.read_text())["traceEvents"]
+    chunks = [e for e in spans if e.get("cat") == "chunk"]
+    # 3 файла по 3 row group'ы по 1000 строк, chunksize 700
+    assert sum(e["args"]["rows"] for e in chunks) == 9_000
+    assert {e["args"]["path"] for e in chunks} == {str(p) for p in src.iterdir()}
+    # файлы профилировали воркеры, их чанки - на своих дорожках
+    assert os.getpid() not in {e["pid"] for e in chunks} and all(e["dur"] >= 0 for e in chunks)
+    assert [e["name"] for e in spans if e.get("cat") == "run"] == ["profile"]
+
+
+def test_max_memory_sizes_chunks_per_file(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    csv_src = write_dataset(tmp_path)
+    path = sorted(src.iterdir())[0]
+    small = plan_chunks(path, "parquet", 1 << 20)
+    large = plan_chunks(path, "parquet", 64 << 20)
+    # вдвое меньше колонок - вдвое больше строк в том же бюджете
+    narrow = plan_chunks(path, "parquet", 64 << 20, columns={"id", "x", "n", "flag"}.__contains__)
+    assert MIN_CHUNK_ROWS <= small.rows < large.rows < narrow.rows
+    assert narrow.bytes_per_row < large.bytes_per_row
+    assert plan_chunks(path, "parquet", 64 << 20, engine="arrow").bytes_per_row < large.bytes_per_row
+    csv_plan = plan_chunks(sorted(csv_src.iterdir())[0], "csv", 1 << 20)
+    assert csv_plan.bytes_per_row > 0 and csv_plan.rows >= MIN_CHUNK_ROWS
+
+    expected = profile_json(src, tmp_path / "fixed", fmt="parquet", cache=False)
+    for name, kwargs in (("pandas", {}), ("arrow", {"engine": "arrow"}), ("par", {"workers": 2})):
+        events: list[dict] = []
+        out = profile_json(src, tmp_path / name, fmt="parquet", events=events, cache=False,
+                           max_memory=1 << 20, **kwargs)
+        chunks = [e for e in events if e["event"] == "profile_chunk_scanned"]
+        # размер чанка выбран по файлу и виден в событиях, а не взят из --chunksize
+        assert {e["chunksize"] for e in chunks} != {700}
+        assert all(e["rows"] <= e["chunksize"] and e["bytes_per_row"] > 0 for e in chunks)
+        assert sum(e["rows"] for e in chunks) == 9_000
+        assert out["dataset"]["rows"] == expected["dataset"]["rows"]
+        assert out["columns"]["x"]["null"] == expected["columns"]["x"]["null"]
+
+
+def test_datetime_format_detected_once_with_fallback(tmp_path: Path) -> None:
+    cases = {
+        "%Y-%m-%d %H:%M:%S": ["2024-01-02 03:04:05", "2024-12-31 23:59:59"],
+        "%Y-%m-%dT%H:%M:%SZ": ["2024-01-02T03:04:05Z", "2024-12-31T23:59:59Z"],
+        # день больше 12 - только день первым
+        "%d/%m/%Y %H:%M": ["13/01/2024 10:00", "02/03/2024 11:30"],
+        "%m/%d/%Y": ["01/02/2024", "03/04/2024"],
+        "ISO8601": ["2024-01-02T03:04:05.123+03:00", "2024-05-06T07:08:09.5+00:00"],
+        "epoch_ms": ["1704164645000", "1735689599000"],
+    }
+    for fmt, values in cases.items():
+        assert detect_datetime_format(pd.Series(values * 10, name="created_at")) == fmt
+    assert detect_datetime_format(pd.Series(["abc", "1.5"] * 10)) is None
+    # номера телефонов не похожи на epoch
+    assert detect_datetime_format(pd.Series(["9161234567", "9031112233"] * 10, name="ts")) is None
+    # id из диапазона epoch - не даты, пока имя колонки не говорит о времени
+    ids = ["1000000001", "1234567890", "2000000000"] * 10
+    for name in (None, "id", "user_id", "counts", "status"):
+        assert detect_datetime_format(pd.Series(ids, name=name)) is None
+    for name in ("ts", "eventTime", "updated_at", "epoch_s"):
+        assert detect_datetime_format(pd.Series(ids, name=name)) == "epoch_s"
+    # ни один формат не подходит целиком - разбор каждой строки, без угадывания формата
+    mixed = pd.Series(["2024-01-02", "01/03/2024 10:00", "Jan 4 2024"] * 10)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        assert detect_datetime_format(mixed) == "mixed"
+        parsed, fallback = parse_datetimes(mixed, "mixed")
+    assert fallback == len(mixed) and parsed.notna().all()
+
+    s = pd.Series(["13/01/2024 10:00", "2024-02-01 00:00:00", "junk", "02/03/2024 11:30"])
+    with warnings.catch_warnings():
+        # запись в результат tz_localize молча теряется
+        warnings.simplefilter("error", pd.errors.SettingWithCopyWarning)
+        parsed, fallback = parse_datetimes(s, "%d/%m/%Y %H:%M")
+    assert fallback == 2
+    assert parsed.tolist()[:2] == [pd.Timestamp("2024-01-13 10:00", tz="UTC"),
+                                   pd.Timestamp("2024-02-01", tz="UTC")]
+    assert pd.isna(parsed[2]) and parsed[3] == pd.Timestamp("2024-03-02 11:30", tz="UTC")
+
+    src = tmp_path / "input"
+    src.mkdir()
+    rows = 3_000
+    ts = pd.Series(pd.date_range("2024-01-01", periods=rows, freq="h").strftime("%d/%m/%Y %H:%M"))
+    # в последнем чанке несколько строк в другом формате
+    ts.iloc[-5:] = "2030-01-01 00:00:00"
+    pd.DataFrame({"ts": ts}).to_csv(src / "part-0.csv", index=False)
+    events: list[dict] = []
+    out = profile_json(src, tmp_path / "out", events=events, cache=False)
+    dt = out["columns"]["ts"]
+    assert dt["type"] == "datetime" and dt["non_null"] == rows
+    assert dt["datetime"] == {"min": "2024-01-01T00:00:00.000Z", "max": "2030-01-01T00:00:00.000Z",
+                              "fallback_rows": 5}
+    [warn] = [e for e in events if e["event"] == "profile_datetime_fallback"]
+    assert (warn["column"], warn["format"], warn["fallback_rows"]) == ("ts", "%d/%m/%Y %H:%M", 5)
+
+
+def test_low_cardinality_strings_read_as_dictionary(tmp_path: Path, monkeypatch) -> None:
+    src = write_parquet_dataset(tmp_path)
+    path = sorted(src.iterdir())[0]
+    # "hi" (2000 значений на 1000 строк) и "dirty" словарём не читаются
+    assert dictionary_columns(pq.ParquetFile(path)) == ["s"]
+    _, _, frame = next(iter_frames(path, "parquet", 700))
+    assert isinstance(frame["s"].dtype, pd.CategoricalDtype) and frame["hi"].dtype == object
+    _, _, batch = next(iter_frames(path, "parquet", 700, engine="arrow"))
+    assert pa.types.is_dictionary(batch.schema.field("s").type)
+
+    with_dict = {engine: profile_json(src, tmp_path / f"dict_{engine}", fmt="parquet", cache=False,
+                                      engine=engine, topk_capacity=64)
+                 for engine in ("pandas", "arrow")}
+    monkeypatch.setattr(io_helpers, "DICTIONARY_MAX_SHARE", -1.0)
+    plain = profile_json(src, tmp_path / "plain", fmt="parquet", cache=False, topk_capacity=64)
+    assert with_dict["pandas"] == plain
+    assert with_dict["arrow"] == plain
+    assert plain["columns"]["s"]["type"] == "string"
+
+
+def test_hive_partitions_pruned_and_profiled_per_partition(tmp_path: Path) -> None:
+    flat = write_parquet_dataset(tmp_path)
+    lake = tmp_path / "lake"
+    layout = ["date=2026-10-01/region=eu", "date=2026-10-01/region=us", "date=2026-10-02/region=eu"]
+    for i, part in enumerate(layout):
+        (lake / part).mkdir(parents=True)
+        (lake / part / f"part-{i}.parquet").write_bytes((flat / f"part-{i}.parquet").read_bytes())
+    (lake / "_SUCCESS.parquet").write_bytes(b"")
+    (lake / ".staging").mkdir()
+    (lake / ".staging" / "part-9.parquet").write_bytes((flat / "part-0.parquet").read_bytes())
+
+    events: list[dict] = []
+    total = profile_json(lake, tmp_path / "out", fmt="parquet", events=events, workers=2,
+                         partitioning="hive", per_partition="date", cache=False)
+    assert total["columns"] == profile_json(flat, tmp_path / "out_flat", fmt="parquet", cache=False)["columns"]
+    assert total["dataset"]["partitioning"]["keys"] == ["date", "region"]
+    assert total["dataset"]["partitioning"]["partitions"] == ["date=2026-10-01", "date=2026-10-02"]
+    assert [e["partition"] for e in events if e["event"] == "profile_partition_written"] \
+        == ["date=2026-10-01", "date=2026-10-02"]
+
+    day = json.loads((tmp_path / "out" / "partitions" / "date=2026-10-01" / "profile.json").read_text())
+    assert day["dataset"]["rows"] == 6_000
+    assert day["dataset"]["partition"] == {"date": "2026-10-01"}
+    assert (day["columns"]["id"]["numeric"]["min"], day["columns"]["id"]["numeric"]["max"]) == (0, 5_999)
+    assert (tmp_path / "out" / "partitions" / "date=2026-10-02" / "profile.state.arrow").exists()
+
+    events.clear()
+    eu = profile_json(lake, tmp_path / "out_eu", fmt="parquet", events=events,
+                      partitioning="hive", partition_filter="region == 'eu' and date >= '2026-10-01'")
+    assert eu["dataset"]["rows"] == 6_000
+    found = next(e for e in events if e["event"] == "profile_partitions")
+    assert (found["files"], found["pruned"]) == (2, 1)
+    assert [e["path"] for e in events if e["event"] == "profile_file_started"] \
+        == [str(lake / layout[0] / "part-0.parquet"), str(lake / layout[2] / "part-2.parquet")]
+
+    args = ProfileArgs(src=lake, dst=tmp_path / "out_bad", fmt="parquet", sample=1.0, chunksize=700,
+                       topk=5, threshold=0.95, partitioning="hive", partition_filter="id > 0")
+    events.clear()
+    assert run_profile(args, make_emit(events)) == 4
+    assert events[-1]["event"] == "profile_failed"
+
+
+def test_hive_partition_values_stay_strings(tmp_path: Path) -> None:
+    flat = write_parquet_dataset(tmp_path)
+    lake = tmp_path / "lake"
+    for i, month in enumerate(["01", "02", "10"]):
+        (lake / "year=2026" / f"month={month}").mkdir(parents=True)
+        (lake / "year=2026" / f"month={month}" / "part.parquet").write_bytes((flat / f"part-{i}.parquet").read_bytes())
+
+    events: list[dict] = []
+    out = profile_json(lake, tmp_path / "out", fmt="parquet", events=events, cache=False,
+                       partitioning="hive", per_partition="month", partition_filter="month in ['01', '10']")
+    assert out["dataset"]["partitioning"]["keys"] == ["year", "month"]
+    # ведущий ноль сохраняется и в фильтре, и в именах партиций
+    assert out["dataset"]["partitioning"]["partitions"] == ["month=01", "month=10"]
+    assert out["dataset"]["rows"] == 6_000
+    jan = json.loads((tmp_path / "out" / "partitions" / "month=01" / "profile.json").read_text())
+    assert jan["dataset"]["partition"] == {"month": "01"}
+
+
+def test_correlations_match_pandas_pairwise_complete(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    df = pd.concat([pd.read_parquet(path) for path in sorted(src.iterdir())], ignore_index=True)
+    df["dirty"] = parse_numeric_strings(df["dirty"])[0]
+    numeric = df[["id", "n", "x", "dirty"]].astype("float64")
+
+    for i, kwargs in enumerate([{}, {"engine": "arrow", "workers": 2}]):
+        out = profile_json(src, tmp_path / f"out{i}", fmt="parquet", correlations=True, **kwargs)
+        corr = out["correlations"]
+        assert sorted(corr["columns"]) == ["dirty", "id", "n", "x"]
+        order = corr["columns"]
+        want = numeric[order]
+        # пропуски в разных колонках: каждая пара считается по своим строкам
+        n = want.notna().astype(int)
+        assert corr["n"] == (n.T @ n).to_numpy().tolist()
+        np.testing.assert_allclose(np.array(corr["pearson"], dtype=float), want.corr().to_numpy(), atol=1e-9)
+        np.testing.assert_allclose(np.array(corr["covariance"], dtype=float), want.cov().to_numpy(), rtol=1e-9)
+
+    assert "correlations" not in profile_json(src, tmp_path / "plain", fmt="parquet")
+
+
+def test_csv_block_sampling_with_quoted_newlines(tmp_path: Path) -> None:
+    src = write_multiline_csv(tmp_path)
+    header, blocks, multiline = csv_blocks(src / "notes.csv")
+    assert multiline and len(blocks) >= 3
+    # ни один диапазон не начинается внутри поля в кавычках
+    parts = [pd.read_csv(io_helpers._read_block(src / "notes.csv", header, a, b)) for a, b in blocks]
+    assert pd.concat(parts)["id"].tolist() == list(range(30_000))
+
+    full = profile_json(src, tmp_path / "full", cache=False)
+    half = profile_json(src, tmp_path / "half", sample=0.5, cache=False)
+    assert 0 < half["dataset"]["rows"] < full["dataset"]["rows"] == 30_000
+    assert half["columns"]["id"]["type"] == "int"
+    assert half["columns"]["note"]["type"] == "string"
+
+
+def test_arrow_csv_reader_with_quoted_newlines(tmp_path: Path) -> None:
+    src = write_multiline_csv(tmp_path)
+    frames = [f for _, _, f in iter_frames(src, "csv", 5_000, csv_reader="arrow", threads=2)]
+    got = pd.concat(frames)
+    expected = pd.read_csv(src / "notes.csv")
+    assert got["id"].tolist() == expected["id"].tolist()
+    assert got["note"].tolist() == expected["note"].tolist()
+
+    want = profile_json(src, tmp_path / "pandas", cache=False)
+    for engine in ("pandas", "arrow"):
+        out = profile_json(src, tmp_path / f"arrow-{engine}", csv_reader="arrow", engine=engine, cache=False)
+        assert out["dataset"]["rows"] == 30_000
+        for col, stat in want["columns"].items():
+            assert (out["columns"][col]["type"], out["columns"][col]["null"]) == (stat["type"], stat["null"])
+        assert out["columns"]["id"]["numeric"]["mean"] == want["columns"]["id"]["numeric"]["mean"]
+        assert out["columns"]["note"]["string"]["max_len"] == want["columns"]["note"]["string"]["max_len"]
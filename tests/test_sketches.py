@@ -0,0 +1,94 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from dpdd.core_utils.hashing import hash_array
+from dpdd.sketches import HyperLogLog, KLLSketch, SpaceSaving, top_k_items
+
+
+def test_kll_small_input_is_exact() -> None:
+    sk = KLLSketch(k=200)
+    sk.update([5, 1, 4, 2, 3, float("nan")])
+    assert sk.n == 5
+    assert sk.quantiles([0.0, 0.5, 1.0]) == [1.0, 3.0, 5.0]
+
+
+def test_kll_rank_error_and_bounded_size() -> None:
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=200_000)
+    sk = KLLSketch(k=200)
+    for chunk in np.array_split(data, 40):
+        sk.update(chunk)
+
+    assert sum(len(lvl) for lvl in sk.levels) < 3 * 200 + 8 * len(sk.levels)
+    srt = np.sort(data)
+    for q in (0.01, 0.5, 0.95, 0.99):
+        rank = np.searchsorted(srt, sk.quantile(q)) / len(data)
+        assert abs(rank - q) < 0.02
+
+
+def test_kll_merge_matches_single_stream() -> None:
+    rng = np.random.default_rng(1)
+    parts = [rng.exponential(size=30_000) for _ in range(4)]
+    merged = KLLSketch(k=100)
+    for part in parts:
+        sk = KLLSketch(k=100)
+        sk.update(part)
+        merged.merge(sk)
+
+    assert merged.n == 120_000
+    srt = np.sort(np.concatenate(parts))
+    rank = np.searchsorted(srt, merged.quantile(0.95)) / len(srt)
+    assert abs(rank - 0.95) < 0.03
+
+
+def test_kll_empty() -> None:
+    assert KLLSketch().quantiles([0.5, 0.95]) == [None, None]
+
+
+def test_space_saving_exact_below_capacity() -> None:
+    values = pd.Series(["a", "b", "a", "c", "a", "b"])
+    ss = SpaceSaving(capacity=10)
+    ss.update(values.value_counts())
+    assert ss.most_common(2) == [("a", 3), ("b", 2)]
+    assert ss.max_error(3) == 0
+
+
+def test_space_saving_error_bound_and_merge() -> None:
+    rng = np.random.default_rng(2)
+    data = rng.zipf(1.3, size=100_000).astype(str)
+    exact = Counter(data.tolist())
+
+    left, right = SpaceSaving(capacity=200), SpaceSaving(capacity=200)
+    for i, chunk in enumerate(np.array_split(data, 20)):
+        (left if i % 2 else right).update(pd.Series(chunk).value_counts())
+    left.merge(right)
+
+    assert left.n == len(data)
+    assert len(left.keys) <= 200
+    bound = len(data) / 200
+    for key, count in zip(left.keys.tolist(), left.counts.tolist()):
+        assert exact[key] <= count <= exact[key] + bound
+    true_top = [k for k, _ in top_k_items(exact.items(), 5)]
+    assert [k for k, _ in left.most_common(5)] == true_top
+
+
+def test_hash_array_is_canonical_per_dtype() -> None:
+    a = hash_array(np.array([1.0, -0.0, 2.5]))
+    b = hash_array(np.array([1.0, 0.0, 2.5]))
+    assert (a == b).all()
+    s = hash_array(np.array(["x", "y", "x"], dtype=object))
+    assert s[0] == s[2] and s[0] != s[1]
+
+
+def test_hll_accuracy_and_merge() -> None:
+    small = HyperLogLog(p=12)
+    small.update(np.arange(100, dtype=np.float64))
+    assert abs(small.count() - 100) <= 3
+
+    left, right = HyperLogLog(p=12), HyperLogLog(p=12)
+    left.update(np.array([f"id-{i}" for i in range(0, 60_000)], dtype=object))
+    right.update(np.array([f"id-{i}" for i in range(40_000, 100_000)], dtype=object))
+    left.merge(right)
+    assert abs(left.count() - 100_000) / 100_000 < 0.05
@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from dpdd.accumulators import ColumnState, NumericAcc
+from dpdd.drift import ProfileMetrics
+from dpdd.profiler import MergeArgs, run_merge, serialize_profile
+from dpdd.state_file import STATE_NAME, kll_quantile, open_state, read_state, write_state
+
+from test_profile import make_emit, profile_json, write_parquet_dataset
+
+
+def test_state_round_trip_matches_profile_json(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    for kwargs in ({}, {"exact_topk": True}, {"stats_only": True}):
+        dst = tmp_path / f"out{len(kwargs)}{'stats_only' in kwargs}"
+        columns = profile_json(src, dst, fmt="parquet", **kwargs)["columns"]
+        profile, meta = read_state(dst / STATE_NAME)
+        restored = serialize_profile(profile, meta["topk"], tuple(meta["percentiles"]))
+        assert json.loads(json.dumps(restored)) == columns
+
+
+def test_merge_state_files_matches_single_run(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    whole = profile_json(src, tmp_path / "whole", fmt="parquet")
+
+    parts = []
+    for i, path in enumerate(sorted(src.iterdir())):
+        dst = tmp_path / f"part{i}"
+        profile_json(path, dst, fmt="parquet")
+        parts.append(dst / STATE_NAME)
+
+    events: list[dict] = []
+    for name in ("merged", "subset"):
+        (tmp_path / name).mkdir()
+    assert run_merge(MergeArgs(src=tuple(parts), dst=tmp_path / "merged"), make_emit(events)) == 0
+    merged = json.loads((tmp_path / "merged" / "profile.json").read_text())
+    assert merged["columns"] == whole["columns"]
+    assert merged["dataset"]["rows"] == whole["dataset"]["rows"]
+    assert events[-1]["event"] == "merge_completed"
+
+    # только выбранные колонки
+    assert run_merge(MergeArgs(src=tuple(parts), dst=tmp_path / "subset", columns=("x", "s*")),
+                     make_emit(events)) == 0
+    subset = json.loads((tmp_path / "subset" / "profile.json").read_text())
+    assert sorted(subset["columns"]) == ["s", "x"]
+    assert subset["columns"]["x"] == whole["columns"]["x"]
+
+
+def test_kll_quantile_matches_sketch(tmp_path: Path) -> None:
+    rng = np.random.default_rng(3)
+    profile = {}
+    for i, n in enumerate([0, 1, 10, 1_000, 50_000]):
+        acc = NumericAcc(32)
+        for part in np.array_split(rng.exponential(size=n), 7):
+            acc.update(part)
+        profile[f"c{i}"] = ColumnState("float64", "float")
+        profile[f"c{i}"].numeric = acc
+    profile["footer"] = ColumnState("float64", "float")
+    profile["footer"].numeric = NumericAcc(None)
+    profile["text"] = ColumnState("object", "string")
+    write_state(tmp_path / STATE_NAME, profile, {"dataset": {}, "topk": 5, "percentiles": [95.0]})
+
+    table, _ = open_state(tmp_path / STATE_NAME, fields=("name", "numeric"))
+    for q in (0.0, 0.5, 0.95, 1.0):
+        got = kll_quantile(table["numeric"], q)
+        want = [stat.numeric.sketch.quantile(q)
+                if stat.numeric is not None and stat.numeric.sketch is not None else None
+                for stat in profile.values()]
+        assert [None if np.isnan(v) else v for v in got] == want
+
+    # отбор колонок профиля без поля name в запросе
+    table, _ = open_state(tmp_path / STATE_NAME, fields=("numeric",), columns=("c3", "text"))
+    assert table.column_names == ["numeric"]
+    assert table.num_rows == 2
+    assert kll_quantile(table["numeric"], 1.0)[0] == profile["c3"].numeric.sketch.quantile(1.0)
+
+
+def test_compare_reads_state_file(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    profile_json(src, tmp_path / "out", fmt="parquet", percentiles=(50.0, 95.0))
+    from_json = ProfileMetrics.load(tmp_path / "out" / "profile.json")
+    from_state = ProfileMetrics.load(tmp_path / "out" / STATE_NAME)
+    order = from_state.columns.get_indexer(from_json.columns)
+    assert np.array_equal(from_json.values, from_state.values[order], equal_nan=True)
+
+
+def test_merge_state_files_merges_correlations(tmp_path: Path) -> None:
+    src = write_parquet_dataset(tmp_path)
+    whole = profile_json(src, tmp_path / "whole", fmt="parquet", correlations=True)
+
+    parts = []
+    for i, path in enumerate(sorted(src.iterdir())):
+        dst = tmp_path / f"part{i}"
+        profile_json(path, dst, fmt="parquet", correlations=True)
+        parts.append(dst / STATE_NAME)
+
+    for name in ("merged", "subset"):
+        (tmp_path / name).mkdir()
+    # файлы в обратном порядке: сдвиги колонок у состояний разные
+    assert run_merge(MergeArgs(src=tuple(parts[::-1]), dst=tmp_path / "merged"), make_emit([])) == 0
+    merged = json.loads((tmp_path / "merged" / "profile.json").read_text())["correlations"]
+    want = whole["correlations"]
+    assert merged["columns"] == want["columns"]
+    assert merged["n"] == want["n"]
+    np.testing.assert_allclose(np.array(merged["pearson"], dtype=float),
+                               np.array(want["pearson"], dtype=float), atol=1e-12)
+
+    assert run_merge(MergeArgs(src=tuple(parts), dst=tmp_path / "subset", columns=("x", "n")),
+                     make_emit([])) == 0
+    subset = json.loads((tmp_path / "subset" / "profile.json").read_text())["correlations"]
+    i, j = want["columns"].index("n"), want["columns"].index("x")
+    assert subset["columns"] == ["n", "x"]
+    assert subset["pearson"][0][1] == pytest.approx(want["pearson"][i][j], abs=1e-12)